@@ -24,8 +24,17 @@ CORS_ALLOW_CREDENTIALS = True
 DEBUG = True
 
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'menu.authentication.BearerTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
+    # IP для ограничения частоты (menu/throttling.py): 0 — REMOTE_ADDR,
+    # X-Forwarded-For не читается. За обратным прокси — число прокси,
+    # иначе клиент подставит любой адрес в заголовок и обойдёт лимит по IP.
+    'NUM_PROXIES': 0,
 }
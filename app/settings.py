@@ -1,5 +1,7 @@
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-dev-secret'
@@ -21,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'menu.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +66,25 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# Кэши, которые живут внутри одного процесса: при нескольких воркерах
+# каждый видит своё, и сброс в одном не доходит до остальных.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+AUTHENTICATION_BACKENDS = [
+    'menu.auth_cache.CachedModelBackend',
+]
+# Сколько секунд держать в кэше пользователя и его профиль (menu/auth_cache.py);
+# с кэшем из LOCAL_CACHE_BACKENDS не кэшируется вовсе.
+AUTH_CACHE_TIMEOUT = 60
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Asia/Irkutsk'
 USE_I18N = True
@@ -71,6 +93,96 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+
+# "optimized" — menu.media.serve_media (ETag/304, Range, вечный кэш для
+# файлов с хэшем в имени); "static" — прежний django.conf.urls.static.
+MEDIA_SERVING = "optimized"
+# None, "x-sendfile" или "x-accel-redirect"
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+
+# Уменьшенные копии Menu.picture / Customer.picture (menu/images.py)
+IMAGE_VARIANT_WIDTHS = [160, 320, 640]
+IMAGE_VARIANT_FORMATS = ["webp", "jpeg"]
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANTS_SYNC = False
+# Файл, который повторная загрузка тех же байтов только что переиспользовала,
+# не удаляется столько секунд (строка-владелец может быть ещё не закоммичена).
+# Оставшиеся сироты убирает manage.py dedupe_media --delete-orphans.
+PICTURE_RELEASE_GRACE = 600
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Профилирование API (menu/profiling.py). Метрики: /api/_metrics,
+# отчёт по худшим маршрутам: manage.py profile_report
+API_PROFILING = False
+API_PROFILING_DIR = BASE_DIR / "profiling"
+API_PROFILING_FLUSH_EVERY = 100
+API_PROFILING_DUPLICATE_THRESHOLD = 3
+INTERNAL_IPS = ["127.0.0.1"]
+
+# Сессии: "db" (как раньше), "cached_db" (чтение из кэша, запись в БД),
+# "cache" (без БД) или "signed_cookies" (всё в подписанной cookie, без
+# хранилища вовсе). "cached_db" и "cache" требуют общего кэша (Redis,
+# Memcached): с LocMemCache выход или смена ключа в одном воркере не видны
+# в другом, поэтому такая настройка не запустится.
+SESSION_MODE = "db"
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+# Сколько секунд действует вход по TOTP (флаг session["second"]).
+SECOND_FACTOR_TTL = 300
+
+# Токены без состояния (menu/tokens.py): /api/user/token/, token-refresh/, token-second/
+TOKEN_SECRET_KEY = SECRET_KEY
+TOKEN_ACCESS_TTL = 15 * 60
+TOKEN_REFRESH_TTL = 7 * 24 * 60 * 60
+
+# Ограничение частоты (menu/throttling.py). "memory" — в процессе,
+# "cache" — в общем кэше, общий лимит для всех узлов.
+# keys: по чему считать — "ip", "user" (id, для анонимов IP) или "username" из тела запроса.
+THROTTLE_BACKEND = "memory"
+THROTTLE_BUCKETS = {
+    "login": {"rate": "10/min", "burst": 5, "keys": ["ip", "username"]},
+    "totp": {"rate": "5/min", "burst": 5, "keys": ["user"]},
+    "export": {"rate": "6/min", "burst": 3, "keys": ["user"]},
+}
+
+# Журнал изменений (menu/changelog.py): /api/changes/?after=<seq>,
+# сжатие — manage.py compact_changelog
+CHANGELOG_PAGE_SIZE = 500
+CHANGELOG_MAX_PAGE_SIZE = 5000
+CHANGELOG_TOMBSTONE_DAYS = 30
+
+# Отчёты /api/reports/* (menu/reports.py): снимок продаж в памяти процесса
+# дочитывается из БД не чаще раза в столько секунд.
+REPORTS_REFRESH_SECONDS = 5
+# Топ позиций/клиентов (menu/counters.py) поддерживается в кэше на месте,
+# а целиком перечитывается из SalesCounter не реже раза в столько секунд.
+REPORTS_TOP_TIMEOUT = 300
+
+# manage.py archive_orders: DONE/CANCELLED заказы старше стольких дней
+# переносятся в архивные таблицы (?include_archived=1 в API).
+ARCHIVE_AFTER_DAYS = 365
+
+# Idempotency-Key на POST /api/orders/ и /api/order-items/ (menu/idempotency.py):
+# сколько секунд повтор с тем же ключом получает сохранённый ответ.
+# Истёкшие ключи — manage.py cleanup_idempotency_keys.
+IDEMPOTENCY_TTL = 24 * 3600
+
+# Главная страница (menu.views.ShowCafeView)
+SHOW_CAFE_SECTION_LIMIT = 50
+SHOW_CAFE_PAGE_SIZE = 20
+SHOW_CAFE_CACHE_TIMEOUT = 600
+
 from .local import *
+
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+if SESSION_MODE in ("cached_db", "cache") and CACHES["default"]["BACKEND"] in LOCAL_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"SESSION_MODE = {SESSION_MODE!r} требует общего кэша, а CACHES['default'] — {CACHES['default']['BACKEND']}"
+    )
@@ -1,9 +1,11 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.conf.urls.static import static
 from menu.views import ShowCafeView 
+from menu.media import serve_media
+from menu.profiling import metrics_view
 
 from menu.api import (
     CategoryViewSet,
@@ -12,6 +14,9 @@ from menu.api import (
     OrderViewSet,
     OrderItemViewSet,
     UserViewSet,
+    CatalogueViewSet,
+    ChangeLogViewSet,
+    ReportsViewSet,
 )
 
 router = DefaultRouter()
@@ -21,10 +26,20 @@ router.register("customers", CustomerViewSet, basename="customers")
 router.register("orders", OrderViewSet, basename="orders")
 router.register("order-items", OrderItemViewSet, basename="order-items")
 router.register("user", UserViewSet, basename="user")
+router.register("catalogue", CatalogueViewSet, basename="catalogue")
+router.register("changes", ChangeLogViewSet, basename="changes")
+router.register("reports", ReportsViewSet, basename="reports")
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("api/_metrics", metrics_view, name="api-metrics"),
     path('api/', include(router.urls)),
     path("", ShowCafeView.as_view(), name="show_cafe"),
+]
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.MEDIA_SERVING == "optimized":
+    urlpatterns += [
+        re_path(r"^%s(?P<path>.*)$" % settings.MEDIA_URL.lstrip("/"), serve_media, name="media"),
+    ]
+else:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,20 @@
+import axios from "axios";
+
+const RETRIES = 3;
+
+// POST с заголовком Idempotency-Key: ключ один на все попытки, поэтому
+// повтор после обрыва связи вернёт уже созданную запись, а не дубликат.
+export async function postIdempotent(url, data) {
+  const key = crypto.randomUUID();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await axios.post(url, data, { headers: { "Idempotency-Key": key } });
+    } catch (e) {
+      // повторяем только то, что могло не дойти: нет ответа или 5xx
+      const status = e.response?.status;
+      const retriable = !e.response || status >= 500 || status === 409;
+      if (!retriable || attempt >= RETRIES) throw e;
+      await new Promise((resolve) => setTimeout(resolve, 300 * 2 ** attempt));
+    }
+  }
+}
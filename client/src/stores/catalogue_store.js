@@ -0,0 +1,81 @@
+import { defineStore } from "pinia";
+import { ref } from "vue";
+import axios from "axios";
+
+const STORAGE_KEY = "catalogue";
+
+// {fields: [...], rows: [[...], ...]} -> [{...}, ...]
+function toObjects(part) {
+  return part.rows.map((row) => Object.fromEntries(part.fields.map((f, i) => [f, row[i]])));
+}
+
+function merge(list, part) {
+  const byId = new Map(list.map((x) => [x.id, x]));
+  for (const id of part.deleted || []) byId.delete(id);
+  for (const obj of toObjects(part)) byId.set(obj.id, obj);
+  return [...byId.values()].sort((a, b) => b.id - a.id);
+}
+
+export const useCatalogueStore = defineStore("catalogueStore", () => {
+  const seq = ref(null);
+  const categories = ref([]);
+  const menu = ref([]);
+
+  function load() {
+    try {
+      const saved = JSON.parse(localStorage.getItem(STORAGE_KEY) || "null");
+      if (saved) {
+        seq.value = saved.seq;
+        categories.value = saved.categories || [];
+        menu.value = saved.menu || [];
+      }
+    } catch (e) {
+      seq.value = null;
+    }
+  }
+
+  function save() {
+    try {
+      localStorage.setItem(
+        STORAGE_KEY,
+        JSON.stringify({ seq: seq.value, categories: categories.value, menu: menu.value })
+      );
+    } catch (e) {
+      // переполнение localStorage не критично: в следующий раз придёт снимок
+    }
+  }
+
+  // Первый раз — полный снимок, дальше только изменения после seq.
+  async function sync() {
+    if (seq.value === null) load();
+
+    const params = seq.value === null ? {} : { since: seq.value };
+    const r = await axios.get("/api/catalogue/", { params });
+
+    if (r.data.full) {
+      categories.value = toObjects(r.data.categories);
+      menu.value = toObjects(r.data.menu);
+    } else {
+      categories.value = merge(categories.value, r.data.categories);
+      menu.value = merge(menu.value, r.data.menu);
+    }
+    seq.value = r.data.seq;
+    save();
+  }
+
+  function reset() {
+    seq.value = null;
+    categories.value = [];
+    menu.value = [];
+    localStorage.removeItem(STORAGE_KEY);
+  }
+
+  return {
+    seq,
+    categories,
+    menu,
+
+    sync,
+    reset,
+  };
+});
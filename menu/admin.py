@@ -1,7 +1,92 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
 from .models import Category, Menu, Customer, Order, OrderItem
 
 
+# Ниже этого числа строк честный COUNT(*) дешевле, чем неточность оценки.
+ESTIMATE_THRESHOLD = 100_000
+
+
+def estimate_rows(connection, table):
+    """Оценка числа строк таблицы без её обхода или None."""
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return None
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                # stat: "<строк> <строк на значение>..." по каждому индексу таблицы
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            # MAX(rowid) — один спуск по B-дереву, а не проход по таблице
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для нефильтрованного списка берёт оценку числа строк вместо COUNT(*)
+    по всей таблице: на PostgreSQL — из статистики планировщика
+    (pg_class.reltuples), на SQLite — из sqlite_stat1 после ANALYZE или
+    MAX(rowid) (без ANALYZE; удалённые строки оценку завышают).
+    На других СУБД и при фильтрах/поиске считает как обычно.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimate_rows(connections[qs.db], qs.model._meta.db_table)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LabelledAutocompleteSelect(AutocompleteSelect):
+    """
+    AutocompleteSelect, которому подписи выбранных значений передали заранее.
+    Обычный виджет делает отдельный запрос на каждую строку inline.
+    """
+
+    def __init__(self, *args, labels=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = labels
+
+    def optgroups(self, name, value, attr=None):
+        # мусор из отправленной формы (не id) не выбран ни в каком варианте,
+        # а родительский filter(id__in=...) на нём падает с ValueError
+        selected = [str(v) for v in value if str(v).isdigit()]
+        if self.labels is None or any(int(v) not in self.labels for v in selected):
+            return super().optgroups(name, selected, attr)
+
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, "", "", False, 0))
+        for v in selected:
+            options.append(self.create_option(name, v, self.labels[int(v)], True, len(options)))
+        return [(None, options, 0)]
+
+
+def search_by_id(queryset, search_term, field="pk"):
+    """Число ищется точным совпадением по индексу, а не LIKE по CAST(id AS text)."""
+    term = search_term.strip().lstrip("#")
+    if term.isdigit():
+        return queryset.filter(**{field: int(term)}), False
+    return None
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ["id", "name"]
@@ -12,6 +97,7 @@ class CategoryAdmin(admin.ModelAdmin):
 class MenuAdmin(admin.ModelAdmin):
     list_display = ["id", "title", "group", "price"]
     list_filter = ["group"]
+    list_select_related = ["group"]
     search_fields = ["title", "group__name"]
     autocomplete_fields = ["group"]
 
@@ -27,24 +113,83 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     autocomplete_fields = ["menu"]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("menu")
+
+    def get_formset(self, request, obj=None, **kwargs):
+        # подписи всех позиций заказа одним запросом — для виджетов menu
+        # (change_view вызывает get_formset несколько раз — считаем один)
+        key = obj.pk if obj is not None else None
+        cached = getattr(request, "_order_menu_labels", None)
+        if cached is None or cached[0] != key:
+            labels = {}
+            if obj is not None:
+                labels = {m.pk: str(m) for m in Menu.objects.filter(order_items__order=obj).distinct()}
+            request._order_menu_labels = (key, labels)
+        return super().get_formset(request, obj, **kwargs)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "menu":
+            kwargs["widget"] = LabelledAutocompleteSelect(
+                db_field,
+                self.admin_site,
+                using=kwargs.get("using"),
+                labels=getattr(request, "_order_menu_labels", (None, None))[1],
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ["id", "user", "customer", "status", "created_at"]
+    list_display = ["id", "user", "customer", "status", "total", "created_at"]
     list_filter = ["status"]
+    list_select_related = ["user", "customer"]
     date_hierarchy = "created_at"
     autocomplete_fields = ["user", "customer"]
     inlines = [OrderItemInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # id ищется точным совпадением в get_search_results, имена — по префиксу
+    search_fields = ["^user__username", "^customer__name"]
+
+    def get_queryset(self, request):
+        # Сумма — подзапросом по строкам текущей страницы; COUNT для пагинации
+        # её не считает (неиспользуемые аннотации из него убираются).
+        money = DecimalField(max_digits=12, decimal_places=2)
+        totals = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .values("order")
+            .annotate(total=Sum(ExpressionWrapper(F("qty") * F("menu__price"), output_field=money)))
+            .values("total")
+        )
+        return super().get_queryset(request).annotate(
+            total=Coalesce(Subquery(totals, output_field=money), Value(0), output_field=money)
+        )
 
-  
-    search_fields = ["id", "user__username", "customer__name"]
+    @admin.display(description="Сумма", ordering="total")
+    def total(self, obj):
+        return obj.total
+
+    def get_search_results(self, request, queryset, search_term):
+        return search_by_id(queryset, search_term) or super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ["id", "order", "menu", "qty"]
-    list_filter = ["order"]
+    # фильтр по order выводил в боковую панель все заказы
+    list_filter = ["order__status"]
+    list_select_related = ["order", "menu"]
     autocomplete_fields = ["order", "menu"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # номер заказа ищется точным совпадением в get_search_results
+    search_fields = ["^menu__title"]
 
-   
-    search_fields = ["order__id", "menu__title"]
+    def get_search_results(self, request, queryset, search_term):
+        return (
+            search_by_id(queryset, search_term, field="order_id")
+            or super().get_search_results(request, queryset, search_term)
+        )
@@ -1,37 +1,46 @@
+import time
+from datetime import datetime, timedelta
+
 import pyotp
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponse
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.db.models import Count, Min, Max, Avg, Sum, F, DecimalField, ExpressionWrapper
+from django.db.models import Count, Min, Max, Avg, Sum, F, DecimalField, ExpressionWrapper, Value
+from django.db.models.functions import Coalesce, Trunc
 
-from rest_framework import permissions, serializers
+from rest_framework import permissions, serializers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 
-from .models import Category, Menu, Customer, Order, OrderItem, Profile
+from .models import ArchivedOrder, ArchivedOrderItem, Category, Menu, Customer, Order, OrderItem, Profile
 from .serializers import (
+    ArchivedOrderSerializer,
+    ArchivedOrderItemSerializer,
     CategorySerializer,
     MenuSerializer,
     CustomerSerializer,
     OrderSerializer,
     OrderItemSerializer,
+    ChangeLogSerializer,
 )
 
-from .permissions import OTPRequiredForDelete
-
-
-try:
-    from openpyxl import Workbook
-except Exception:
-    Workbook = None
-
-try:
-    from docx import Document
-except Exception:
-    Document = None
+from .permissions import OTPRequiredForDelete, grant_second_factor, has_second_factor
+from .concurrency import OptimisticLockMixin
+from .auth_cache import get_auth_context, get_cached_user
+from . import tokens
+from .throttling import ExportThrottle, LoginThrottle, SecondFactorThrottle
+from . import changelog, columnar, cooccurrence, counters, imports, reports
+from .archive import ArchiveMixin
+from .idempotency import IdempotentCreateMixin
+from .imports import ImportMixin
+from .exports import ExportMixin, CATEGORIES, MENU, CUSTOMERS, ORDERS, ORDER_ITEMS
 
 
 class LoginSerializer(serializers.Serializer):
@@ -43,6 +52,10 @@ class SecondLoginSerializer(serializers.Serializer):
     key = serializers.CharField()
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
 class UserViewSet(GenericViewSet):
     permission_classes = [permissions.AllowAny]
     serializer_class = LoginSerializer
@@ -53,21 +66,25 @@ class UserViewSet(GenericViewSet):
         return Response({"ok": True})
 
     def get_serializer_class(self):
-        if self.action == "second_login":
+        if self.action in ("second_login", "token_second"):
             return SecondLoginSerializer
+        if self.action == "token_refresh":
+            return TokenRefreshSerializer
         return LoginSerializer
 
     @action(detail=False, url_path="info", methods=["GET"])
     def info(self, request, *args, **kwargs):
+        context = get_auth_context(request.user)
         data = {
-            "username": request.user.username if request.user.is_authenticated else "",
+            "username": context["username"],
             "is_authenticated": request.user.is_authenticated,
-            "is_staff": request.user.is_staff if request.user.is_authenticated else False,
-            "second": request.session.get("second") or False,
+            "is_staff": context["is_staff"],
+            "role": context["role"],
+            "second": has_second_factor(request),
         }
         return Response(data)
 
-    @action(detail=False, url_path="login", methods=["POST"])
+    @action(detail=False, url_path="login", methods=["POST"], throttle_classes=[LoginThrottle])
     def login_user(self, request, *args, **kwargs):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -101,13 +118,16 @@ class UserViewSet(GenericViewSet):
         permission_classes=[permissions.IsAuthenticated],
     )
     def get_totp(self, request, *args, **kwargs):
-        profile, _ = Profile.objects.get_or_create(user=request.user)
-
-        if not profile.opt_key:
-            profile.opt_key = pyotp.random_base32()
-            profile.save()
-
-        totp = pyotp.TOTP(profile.opt_key)
+        if get_auth_context(request.user)["has_otp"]:
+            opt_key = Profile.objects.filter(user=request.user).values_list("opt_key", flat=True).first()
+        else:
+            profile, _ = Profile.objects.get_or_create(user=request.user)
+            if not profile.opt_key:
+                profile.opt_key = pyotp.random_base32()
+                profile.save()
+            opt_key = profile.opt_key
+
+        totp = pyotp.TOTP(opt_key)
         url = totp.provisioning_uri(
             name=request.user.username,
             issuer_name="CafeApp",
@@ -120,33 +140,262 @@ class UserViewSet(GenericViewSet):
         url_path="second-login",
         methods=["POST"],
         permission_classes=[permissions.IsAuthenticated],
+        throttle_classes=[SecondFactorThrottle],
     )
     def second_login(self, request, *args, **kwargs):
         serializer = SecondLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        profile = Profile.objects.filter(user=request.user).first()
-        if not profile:
+        # без ключа проверять нечего — и в БД не идём
+        if not get_auth_context(request.user)["has_otp"]:
             return Response({"success": False})
 
-        if not profile.opt_key:
+        opt_key = Profile.objects.filter(user=request.user).values_list("opt_key", flat=True).first()
+        if not opt_key:
             return Response({"success": False})
 
-        totp = pyotp.TOTP(profile.opt_key)
+        totp = pyotp.TOTP(opt_key)
         code = serializer.validated_data["key"].strip()
 
         if totp.verify(code):
-            request.session["second"] = True
-            request.session.set_expiry(300)
+            grant_second_factor(request)
+            request.session.set_expiry(settings.SECOND_FACTOR_TTL)
             return Response({"success": True})
 
         return Response({"success": False})
 
+    @action(detail=False, url_path="token", methods=["POST"], throttle_classes=[LoginThrottle])
+    def token(self, request, *args, **kwargs):
+        serializer = LoginSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = authenticate(
+            request,
+            username=serializer.validated_data["username"],
+            password=serializer.validated_data["password"],
+        )
+        if user is None:
+            return Response({"success": False}, status=401)
+
+        return Response(tokens.issue_tokens(user, get_auth_context(user)))
+
+    @action(detail=False, url_path="token-refresh", methods=["POST"])
+    def token_refresh(self, request, *args, **kwargs):
+        serializer = TokenRefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            claims = tokens.decode(serializer.validated_data["refresh"], typ="refresh")
+        except tokens.TokenError as e:
+            return Response({"success": False, "detail": str(e)}, status=401)
+
+        # is_staff и роль могли поменяться — берём свежие (из кэша)
+        user = get_cached_user(claims["sub"])
+        if user is None or not user.is_active:
+            return Response({"success": False}, status=401)
+
+        return Response(
+            tokens.issue_tokens(user, get_auth_context(user), second_until=claims.get("second_until"))
+        )
+
+    @action(
+        detail=False,
+        url_path="token-second",
+        methods=["POST"],
+        permission_classes=[permissions.IsAuthenticated],
+        throttle_classes=[SecondFactorThrottle],
+    )
+    def token_second(self, request, *args, **kwargs):
+        serializer = SecondLoginSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if tokens.token_claims(request) is None:
+            return Response({"success": False, "detail": "Нужен вход по токену"}, status=400)
+
+        opt_key = Profile.objects.filter(user_id=request.user.pk).values_list("opt_key", flat=True).first()
+        if not opt_key or not pyotp.TOTP(opt_key).verify(serializer.validated_data["key"].strip()):
+            return Response({"success": False})
+
+        user = get_cached_user(request.user.pk)
+        second_until = int(time.time()) + settings.SECOND_FACTOR_TTL
+        data = tokens.issue_tokens(user, get_auth_context(user), second_until=second_until)
+        data["success"] = True
+        return Response(data)
+
+
+class CatalogueViewSet(GenericViewSet):
+    """
+    Каталог (категории и меню) для клиентов с локальной копией.
+    Без параметров — полный снимок, с ?since=<seq> — только изменения после seq.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get("since")
+        if since in (None, ""):
+            return Response(changelog.snapshot(request))
+        if not since.isdigit():
+            return Response({"detail": "since должен быть неотрицательным целым"}, status=400)
+        return Response(changelog.delta(int(since), request))
+
+
+class ChangeLogViewSet(GenericViewSet):
+    """
+    Лента изменений всех моделей: ?after=<seq>&limit=<n>&model=order,orderitem.
+    Следующую страницу запрашивают с after из ответа, пока has_more.
+    410 с resync: true — after раньше границы сжатого журнала: таблицы нужно
+    перечитать целиком и продолжить с seq из ответа.
+    """
+
+    serializer_class = ChangeLogSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request, *args, **kwargs):
+        after = request.query_params.get("after") or "0"
+        limit = request.query_params.get("limit") or str(settings.CHANGELOG_PAGE_SIZE)
+        if not after.isdigit() or not limit.isdigit() or int(limit) < 1:
+            return Response({"detail": "after и limit должны быть целыми числами"}, status=400)
+
+        limit = min(int(limit), settings.CHANGELOG_MAX_PAGE_SIZE)
+        models = [m for m in request.query_params.get("model", "").split(",") if m]
+        try:
+            changelog.check_cursor(int(after))
+        except changelog.CursorExpired as e:
+            return Response({"detail": str(e), "resync": True, "seq": changelog.last_seq()}, status=410)
+        # на одну запись больше, чтобы узнать, есть ли следующая страница
+        changes = changelog.changes_after(int(after), limit + 1, models)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
 
-class CategoryViewSet(ModelViewSet):
+        return Response({
+            "results": self.get_serializer(changes, many=True).data,
+            "after": changes[-1].id if changes else int(after),
+            "has_more": has_more,
+        })
+
+
+class ServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис временно недоступен."
+    default_code = "service_unavailable"
+
+
+class ReportsViewSet(GenericViewSet):
+    """
+    Отчёты о продажах по снимку в памяти (menu/reports.py).
+    Общие параметры: ?status=DONE,NEW (по умолчанию все, кроме отменённых),
+    ?date_from=/?date_to= (ГГГГ-ММ-ДД, включительно).
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def report_params(self, request):
+        statuses = None
+        if request.query_params.get("status"):
+            statuses = request.query_params["status"].split(",")
+            unknown = set(statuses) - set(columnar.STATUS_CODES)
+            if unknown:
+                raise serializers.ValidationError({"status": f"Неизвестные статусы: {', '.join(sorted(unknown))}"})
+
+        dates = {}
+        for name in ("date_from", "date_to"):
+            value = request.query_params.get(name)
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:  # 2024-02-30
+                dates[name] = None
+            if value and dates[name] is None:
+                raise serializers.ValidationError({name: "Ожидается дата ГГГГ-ММ-ДД"})
+
+        if reports.numpy is None:
+            raise ServiceUnavailable("numpy не установлен в этом окружении")
+        snapshot = reports.get_snapshot()
+        return snapshot, reports.select(snapshot, statuses, **dates)
+
+    def int_param(self, request, name, default=None):
+        value = request.query_params.get(name)
+        if not value:
+            return default
+        if not value.isdigit():
+            raise serializers.ValidationError({name: "Ожидается целое число"})
+        return int(value)
+
+    @action(detail=False, url_path="revenue-by-hour", methods=["GET"])
+    def revenue_by_hour(self, request, *args, **kwargs):
+        bucket = request.query_params.get("bucket", "hour")
+        if bucket not in reports.MICROSECONDS:
+            raise serializers.ValidationError({"bucket": "hour или day"})
+        snapshot, mask = self.report_params(request)
+        menu = self.int_param(request, "menu")
+        return Response(reports.revenue_by_time(snapshot, mask, bucket, menu))
+
+    @action(detail=False, url_path="customer-spend", methods=["GET"])
+    def customer_spend(self, request, *args, **kwargs):
+        snapshot, mask = self.report_params(request)
+        limit = min(self.int_param(request, "limit", 10), 1000)
+        return Response(reports.customer_spend(snapshot, mask, limit))
+
+    @action(detail=False, url_path="basket-sizes", methods=["GET"])
+    def basket_sizes(self, request, *args, **kwargs):
+        snapshot, mask = self.report_params(request)
+        return Response(reports.basket_sizes(snapshot, mask))
+
+    @action(detail=False, url_path="summary", methods=["GET"])
+    def summary(self, request, *args, **kwargs):
+        snapshot, mask = self.report_params(request)
+        return Response(reports.summary(snapshot, mask))
+
+    def top_params(self, request):
+        """?period=day|week, ?date= (любой день периода, по умолчанию сегодня), ?limit="""
+        period = request.query_params.get("period", "day")
+        if period not in ("day", "week"):
+            raise serializers.ValidationError({"period": "day или week"})
+        value = request.query_params.get("date")
+        try:
+            day = parse_date(value) if value else timezone.localdate()
+        except ValueError:  # 2024-02-30
+            day = None
+        if day is None:
+            raise serializers.ValidationError({"date": "Ожидается дата ГГГГ-ММ-ДД"})
+        limit = min(self.int_param(request, "limit", 10), counters.TOP_CAPACITY)
+        start = day if period == "day" else day - timedelta(days=day.weekday())
+        return period, start, limit
+
+    @action(detail=False, url_path="top-items", methods=["GET"])
+    def top_items(self, request, *args, **kwargs):
+        period, start, limit = self.top_params(request)
+        rows = counters.top("menu", period, start, limit)
+        titles = dict(Menu.objects.filter(id__in=[key for key, *_ in rows]).values_list("id", "title"))
+        return Response({
+            "period": period,
+            "start": start,
+            "results": [
+                {"menu": key, "title": titles.get(key), "qty": qty, "revenue": str(revenue)}
+                for key, qty, revenue, _ in rows
+            ],
+        })
+
+    @action(detail=False, url_path="top-customers", methods=["GET"])
+    def top_customers(self, request, *args, **kwargs):
+        period, start, limit = self.top_params(request)
+        rows = counters.top("customer", period, start, limit)
+        names = dict(Customer.objects.filter(id__in=[key for key, *_ in rows]).values_list("id", "name"))
+        return Response({
+            "period": period,
+            "start": start,
+            "results": [
+                {"customer": key, "name": names.get(key), "orders": orders, "qty": qty, "spend": str(revenue)}
+                for key, qty, revenue, orders in rows
+            ],
+        })
+
+
+class CategoryViewSet(ExportMixin, ModelViewSet):
     queryset = Category.objects.all().order_by("-id")
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated, OTPRequiredForDelete]
+    export_report = CATEGORIES
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -162,58 +411,14 @@ class CategoryViewSet(ModelViewSet):
         )
         return Response({"total": d.get("total") or 0})
 
-    @action(detail=False, url_path="export-excel", methods=["GET"])
-    def export_excel(self, request, *args, **kwargs):
-        if Workbook is None:
-            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Категории"
-        ws.append(["id", "name"])
-
-        for c in qs:
-            ws.append([c.id, c.name])
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="categories.xlsx"'
-        wb.save(resp)
-        return resp
-
-    @action(detail=False, url_path="export-word", methods=["GET"])
-    def export_word(self, request, *args, **kwargs):
-        if Document is None:
-            return Response({"detail": "python-docx не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        doc = Document()
-        doc.add_heading("Категории", level=1)
 
-        table = doc.add_table(rows=1, cols=2)
-        hdr = table.rows[0].cells
-        hdr[0].text = "id"
-        hdr[1].text = "name"
 
-        for c in qs:
-            row = table.add_row().cells
-            row[0].text = str(c.id)
-            row[1].text = c.name
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="categories.docx"'
-        doc.save(resp)
-        return resp
-
-
-class MenuViewSet(ModelViewSet):
+class MenuViewSet(OptimisticLockMixin, ExportMixin, ImportMixin, ModelViewSet):
     queryset = Menu.objects.all().order_by("-id")
     serializer_class = MenuSerializer
     permission_classes = [permissions.IsAuthenticated, OTPRequiredForDelete]
+    export_report = MENU
+    import_spec = imports.MENU
 
     def get_queryset(self):
         qs = Menu.objects.all().order_by("-id")
@@ -249,64 +454,33 @@ class MenuViewSet(ModelViewSet):
             "max": d.get("max") or 0,
         })
 
-    @action(detail=False, url_path="export-excel", methods=["GET"])
-    def export_excel(self, request, *args, **kwargs):
-        if Workbook is None:
-            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Меню"
-        ws.append(["id", "title", "group", "price", "description"])
-
-        for m in qs:
-            ws.append([m.id, m.title, m.group_id, str(m.price), m.description or ""])
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="menu.xlsx"'
-        wb.save(resp)
-        return resp
-
-    @action(detail=False, url_path="export-word", methods=["GET"])
-    def export_word(self, request, *args, **kwargs):
-        if Document is None:
-            return Response({"detail": "python-docx не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        doc = Document()
-        doc.add_heading("Меню", level=1)
-
-        table = doc.add_table(rows=1, cols=5)
-        hdr = table.rows[0].cells
-        hdr[0].text = "id"
-        hdr[1].text = "title"
-        hdr[2].text = "group"
-        hdr[3].text = "price"
-        hdr[4].text = "description"
-
-        for m in qs:
-            row = table.add_row().cells
-            row[0].text = str(m.id)
-            row[1].text = m.title
-            row[2].text = str(m.group_id or "")
-            row[3].text = str(m.price)
-            row[4].text = m.description or ""
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="menu.docx"'
-        doc.save(resp)
-        return resp
-
-
-class CustomerViewSet(ModelViewSet):
+    @action(detail=True, url_path="related", methods=["GET"])
+    def related(self, request, *args, **kwargs):
+        menu = self.get_object()
+        limit = request.query_params.get("limit") or "5"
+        if not limit.isdigit():
+            return Response({"detail": "limit должен быть целым числом"}, status=400)
+
+        pairs = cooccurrence.related(menu.pk, min(int(limit), 50))
+        menus = Menu.objects.in_bulk([other for other, _, _ in pairs])
+        return Response([
+            {
+                "id": other,
+                "title": menus[other].title,
+                "price": str(menus[other].price),
+                "orders": count,
+                "confidence": confidence,
+            }
+            for other, count, confidence in pairs if other in menus
+        ])
+
+
+class CustomerViewSet(OptimisticLockMixin, ExportMixin, ImportMixin, ModelViewSet):
     queryset = Customer.objects.all().order_by("-id")
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAuthenticated, OTPRequiredForDelete]
+    export_report = CUSTOMERS
+    import_spec = imports.CUSTOMERS
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -325,71 +499,60 @@ class CustomerViewSet(ModelViewSet):
         d = self.get_queryset().aggregate(total=Count("id"))
         return Response({"total": d.get("total") or 0})
 
-    @action(detail=False, url_path="export-excel", methods=["GET"])
-    def export_excel(self, request, *args, **kwargs):
-        if Workbook is None:
-            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Клиенты"
-        ws.append(["id", "name", "phone"])
-
-        for c in qs:
-            ws.append([c.id, c.name, c.phone or ""])
 
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="customers.xlsx"'
-        wb.save(resp)
-        return resp
-
-    @action(detail=False, url_path="export-word", methods=["GET"])
-    def export_word(self, request, *args, **kwargs):
-        if Document is None:
-            return Response({"detail": "python-docx не установлен в этом окружении"}, status=500)
 
-        qs = self.get_queryset()
-        doc = Document()
-        doc.add_heading("Клиенты", level=1)
-
-        table = doc.add_table(rows=1, cols=3)
-        hdr = table.rows[0].cells
-        hdr[0].text = "id"
-        hdr[1].text = "name"
-        hdr[2].text = "phone"
-
-        for c in qs:
-            row = table.add_row().cells
-            row[0].text = str(c.id)
-            row[1].text = c.name
-            row[2].text = c.phone or ""
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="customers.docx"'
-        doc.save(resp)
-        return resp
-
-
-class OrderViewSet(ModelViewSet):
+def parse_moment(name, value, end=False):
+    """
+    Дата (ГГГГ-ММ-ДД) или дата-время ISO 8601 -> (aware datetime, была ли дата).
+    Дата — начало локального дня, для правой границы (end) — следующего.
+    """
+    try:
+        # похожие на дату, но несуществующие значения (2024-02-30) — ValueError, а не None
+        day = parse_date(value) if len(value) == 10 else None
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day:
+        if end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, datetime.min.time())
+    if moment is None:
+        raise serializers.ValidationError({name: "Ожидается дата ГГГГ-ММ-ДД или дата-время ISO 8601"})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, day is not None
+
+
+class OrderViewSet(ArchiveMixin, IdempotentCreateMixin, OptimisticLockMixin, ExportMixin, ModelViewSet):
     queryset = Order.objects.all().order_by("-id")
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, OTPRequiredForDelete]
+    export_report = ORDERS
+    archive_model = ArchivedOrder
+    archive_serializer_class = ArchivedOrderSerializer
 
-    def get_queryset(self):
-        qs = Order.objects.all().order_by("-id")
+    TIMELINE_BUCKETS = ("hour", "day", "week")
 
+    def apply_filters(self, qs):
         customer = self.request.query_params.get("customer")
         status = self.request.query_params.get("status")
+        created_from = self.request.query_params.get("created_from")
+        created_to = self.request.query_params.get("created_to")
 
         if customer:
             qs = qs.filter(customer_id=customer)
         if status:
             qs = qs.filter(status=status)
+        if created_from:
+            moment, _ = parse_moment("created_from", created_from)
+            qs = qs.filter(created_at__gte=moment)
+        if created_to:
+            # дата-время — включительно, дата — весь день до следующей полуночи
+            moment, is_date = parse_moment("created_to", created_to, end=True)
+            if is_date:
+                qs = qs.filter(created_at__lt=moment)
+            else:
+                qs = qs.filter(created_at__lte=moment)
 
         if not self.request.user.is_staff:
             qs = qs.filter(user=self.request.user)
@@ -420,64 +583,49 @@ class OrderViewSet(ModelViewSet):
             "revenue": revenue,
         })
 
-    @action(detail=False, url_path="export-excel", methods=["GET"])
-    def export_excel(self, request, *args, **kwargs):
-        if Workbook is None:
-            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Заказы"
-        ws.append(["id", "customer", "status"])
-
-        for o in qs:
-            ws.append([o.id, o.customer_id, o.status])
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    @action(detail=False, url_path="timeline", methods=["GET"])
+    def timeline(self, request, *args, **kwargs):
+        """
+        Заказы и выручка по корзинам ?bucket=hour|day|week одним GROUP BY.
+        Корзины — локальные (TIME_ZONE): неделя начинается в понедельник 00:00.
+        Пустые корзины не возвращаются.
+        """
+        bucket = request.query_params.get("bucket", "day")
+        if bucket not in self.TIMELINE_BUCKETS:
+            return Response({"detail": f"bucket: {', '.join(self.TIMELINE_BUCKETS)}"}, status=400)
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        rows = (
+            self.get_queryset()
+            .order_by()
+            .annotate(bucket=Trunc("created_at", bucket, tzinfo=timezone.get_current_timezone()))
+            .values("bucket")
+            .annotate(
+                # LEFT JOIN на позиции: заказ считается один раз, пустой — с нулевой суммой
+                orders=Count("id", distinct=True),
+                revenue=Coalesce(
+                    Sum(ExpressionWrapper(F("items__qty") * F("items__menu__price"), output_field=money)),
+                    Value(0),
+                    output_field=money,
+                ),
+            )
+            .order_by("bucket")
         )
-        resp["Content-Disposition"] = 'attachment; filename="orders.xlsx"'
-        wb.save(resp)
-        return resp
+        return Response([
+            {"bucket": row["bucket"].isoformat(), "orders": row["orders"], "revenue": f"{row['revenue']:.2f}"}
+            for row in rows
+        ])
 
-    @action(detail=False, url_path="export-word", methods=["GET"])
-    def export_word(self, request, *args, **kwargs):
-        if Document is None:
-            return Response({"detail": "python-docx не установлен в этом окружении"}, status=500)
 
-        qs = self.get_queryset()
-        doc = Document()
-        doc.add_heading("Заказы", level=1)
-
-        table = doc.add_table(rows=1, cols=3)
-        hdr = table.rows[0].cells
-        hdr[0].text = "id"
-        hdr[1].text = "customer"
-        hdr[2].text = "status"
-
-        for o in qs:
-            row = table.add_row().cells
-            row[0].text = str(o.id)
-            row[1].text = str(o.customer_id or "")
-            row[2].text = o.status
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="orders.docx"'
-        doc.save(resp)
-        return resp
-
-
-class OrderItemViewSet(ModelViewSet):
+class OrderItemViewSet(ArchiveMixin, IdempotentCreateMixin, OptimisticLockMixin, ExportMixin, ModelViewSet):
     queryset = OrderItem.objects.all().order_by("-id")
     serializer_class = OrderItemSerializer
     permission_classes = [permissions.IsAuthenticated, OTPRequiredForDelete]
+    export_report = ORDER_ITEMS
+    archive_model = ArchivedOrderItem
+    archive_serializer_class = ArchivedOrderItemSerializer
 
-    def get_queryset(self):
-        qs = OrderItem.objects.all().order_by("-id")
-
+    def apply_filters(self, qs):
         order = self.request.query_params.get("order")
         menu = self.request.query_params.get("menu")
         qty_min = self.request.query_params.get("qty_min")
@@ -512,53 +660,20 @@ class OrderItemViewSet(ModelViewSet):
             "avg_qty": d.get("avg_qty") or 0,
         })
 
-    @action(detail=False, url_path="export-excel", methods=["GET"])
-    def export_excel(self, request, *args, **kwargs):
-        if Workbook is None:
-            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Позиции заказов"
-        ws.append(["id", "order", "menu", "qty"])
-
-        for it in qs:
-            ws.append([it.id, it.order_id, it.menu_id, it.qty])
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = 'attachment; filename="order_items.xlsx"'
-        wb.save(resp)
-        return resp
-
-    @action(detail=False, url_path="export-word", methods=["GET"])
-    def export_word(self, request, *args, **kwargs):
-        if Document is None:
-            return Response({"detail": "python-docx не установлен в этом окружении"}, status=500)
-
-        qs = self.get_queryset()
-        doc = Document()
-        doc.add_heading("Позиции заказов", level=1)
-
-        table = doc.add_table(rows=1, cols=4)
-        hdr = table.rows[0].cells
-        hdr[0].text = "id"
-        hdr[1].text = "order"
-        hdr[2].text = "menu"
-        hdr[3].text = "qty"
-
-        for it in qs:
-            row = table.add_row().cells
-            row[0].text = str(it.id)
-            row[1].text = str(it.order_id or "")
-            row[2].text = str(it.menu_id or "")
-            row[3].text = str(it.qty)
-
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    @action(detail=False, url_path="export-analytics", methods=["GET"], throttle_classes=[ExportThrottle])
+    def export_analytics(self, request, *args, **kwargs):
+        fmt = request.query_params.get("type") or columnar.default_format()
+        if fmt not in columnar.FORMATS:
+            return Response({"detail": f"Неизвестный формат: {fmt}. Доступны: {', '.join(columnar.FORMATS)}"}, status=400)
+        if columnar.numpy is None:
+            return Response({"detail": "numpy не установлен в этом окружении"}, status=500)
+        if fmt != "npz" and columnar.pyarrow is None:
+            return Response({"detail": "pyarrow не установлен в этом окружении"}, status=500)
+
+        content_type, ext = columnar.FORMATS[fmt]
+        return FileResponse(
+            columnar.export_file(self.get_queryset(), fmt),
+            as_attachment=True,
+            filename=f"order_items_analytics.{ext}",
+            content_type=content_type,
         )
-        resp["Content-Disposition"] = 'attachment; filename="order_items.docx"'
-        doc.save(resp)
-        return resp
@@ -0,0 +1,151 @@
+"""
+Перенос старых завершённых заказов в холодные таблицы ArchivedOrder и
+ArchivedOrderItem (manage.py archive_orders).
+
+Заказы DONE/CANCELLED старше N дней переносятся пачками, каждая пачка —
+отдельная транзакция: копия в архив и удаление из рабочих таблиц
+проходят вместе или не проходят вовсе. id сохраняются.
+
+Накопительные счётчики (SalesCounter, MenuPair) при переносе не
+уменьшаются: на время переноса их сигналы выключены (archiving()),
+поэтому топы и «часто заказывают вместе» по-прежнему учитывают историю.
+Полный пересчёт (rebuild_counters, build_cooccurrence) тоже читает архив.
+Журнал изменений получает обычные записи об удалении — для клиентов
+синхронизации и снимка /api/reports/ (он строится по рабочим таблицам)
+заказ из архива выглядит удалённым.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+ARCHIVED_STATUSES = ("DONE", "CANCELLED")
+BATCH_SIZE = 500
+
+ORDER_FIELDS = ["id", "created_at", "status", "user_id", "customer_id", "version"]
+ITEM_FIELDS = ["id", "order_id", "menu_id", "qty", "version"]
+
+_state = threading.local()
+
+
+@contextmanager
+def archiving():
+    """Сигналы счётчиков пропускают удаления внутри этого блока."""
+    previous = is_archiving()
+    _state.active = True
+    try:
+        yield
+    finally:
+        _state.active = previous
+
+
+def is_archiving():
+    return getattr(_state, "active", False)
+
+
+def candidates(days, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Order.objects.filter(status__in=ARCHIVED_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(ids):
+    """Переносит заказы ids (и их позиции) одной транзакцией; -> (заказов, позиций)."""
+    with transaction.atomic(), archiving():
+        # статус перепроверяется внутри транзакции: заказ могли вернуть в работу
+        orders = list(Order.objects.filter(id__in=ids, status__in=ARCHIVED_STATUSES).values(*ORDER_FIELDS))
+        ids = [o["id"] for o in orders]
+        items = list(OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS))
+
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**o) for o in orders])
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**i) for i in items])
+        Order.objects.filter(id__in=ids).delete()
+    return len(orders), len(items)
+
+
+def archive_orders(days, batch_size=BATCH_SIZE, now=None):
+    """Переносит все подходящие заказы; -> (заказов, позиций)."""
+    qs = candidates(days, now).order_by("id").values_list("id", flat=True)
+    orders = items = 0
+    last = 0
+    while True:
+        ids = list(qs.filter(id__gt=last)[:batch_size])
+        if not ids:
+            return orders, items
+        last = ids[-1]
+        moved_orders, moved_items = archive_batch(ids)
+        orders += moved_orders
+        items += moved_items
+
+
+class ArchiveMixin:
+    """
+    ?include_archived=1 для списка и карточки: к рабочей таблице добавляется
+    архив. Без флага архивные таблицы не читаются. Фильтры вьюсета задаются
+    в apply_filters(qs) и применяются к обеим таблицам — поля у них общие.
+
+    Остальные действия (stats, timeline, export...) архив не читают и на
+    флаг отвечают 400, а не молча считают по одной рабочей таблице.
+    """
+
+    archive_model = None
+    archive_serializer_class = None
+    archive_actions = ("list", "retrieve")
+
+    def include_archived(self):
+        return self.request.query_params.get("include_archived") in ("1", "true")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action not in self.archive_actions and "include_archived" in request.query_params:
+            raise serializers.ValidationError({"include_archived": "Архив доступен только в списке и карточке"})
+
+    def apply_filters(self, qs):
+        return qs
+
+    def get_queryset(self):
+        return self.apply_filters(super().get_queryset())
+
+    def get_archive_queryset(self):
+        return self.apply_filters(self.archive_model.objects.order_by("-id"))
+
+    def archive_serializer(self, instance, many=False):
+        return self.archive_serializer_class(instance, many=many, context=self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+        # порядок и страница считаются в SQL по одним id (UNION ALL),
+        # а строки целиком читаются только для выбранной страницы
+        live = self.filter_queryset(self.get_queryset())
+        ids = (
+            live.order_by().values_list("id", flat=True)
+            .union(self.get_archive_queryset().order_by().values_list("id", flat=True), all=True)
+            .order_by("-id")
+        )
+        page = self.paginate_queryset(ids)
+        ids = list(ids if page is None else page)
+
+        objects = {obj.pk: self.get_serializer(obj) for obj in live.filter(id__in=ids)}
+        objects.update(
+            (obj.pk, self.archive_serializer(obj)) for obj in self.get_archive_queryset().filter(id__in=ids)
+        )
+        data = [objects[pk].data for pk in ids]
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+            obj = get_object_or_404(self.get_archive_queryset(), pk=kwargs[self.lookup_field])
+            return Response(self.archive_serializer(obj).data)
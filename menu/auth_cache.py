@@ -0,0 +1,104 @@
+"""
+Кэш пользователя и его профиля, чтобы не ходить в БД за request.user
+и Profile на каждом запросе. Сбрасывается сигналами при любом
+изменении User или Profile.
+
+Работает только с общим кэшем (см. LOCAL_CACHE_BACKENDS в настройках):
+сброс в LocMemCache не дошёл бы до других воркеров, и там до
+AUTH_CACHE_TIMEOUT жил бы снятый is_staff или удалённый пользователь.
+С локальным кэшем всё читается из БД, но профиль приходит вместе
+с пользователем сессии (select_related), без отдельного запроса.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Profile
+
+
+USER_KEY = "auth:user:{}"
+CONTEXT_KEY = "auth:context:{}"
+
+
+def enabled():
+    return bool(settings.AUTH_CACHE_TIMEOUT) and (
+        settings.CACHES["default"]["BACKEND"] not in settings.LOCAL_CACHE_BACKENDS
+    )
+
+
+def get_cached_user(user_id):
+    if not enabled():
+        # профиль тем же запросом: get_auth_context возьмёт его без похода в БД
+        return get_user_model()._default_manager.select_related("profile").filter(pk=user_id).first()
+    key = USER_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+        UserModel = get_user_model()
+        user = UserModel._default_manager.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def _profile(user):
+    """{"role", "opt_key"} или None; из уже загруженного user.profile, если он есть."""
+    if get_user_model().profile.is_cached(user):
+        profile = getattr(user, "profile", None)
+        return {"role": profile.role, "opt_key": profile.opt_key} if profile else None
+    return Profile.objects.filter(user_id=user.pk).values("role", "opt_key").first()
+
+
+def get_auth_context(user):
+    """
+    {"id", "username", "is_staff", "role", "has_otp"} для пользователя.
+    Сам OTP-ключ в кэш не кладётся — только признак, что он есть.
+    """
+    if not user or not user.is_authenticated:
+        return {"id": None, "username": "", "is_staff": False, "role": "", "has_otp": False}
+
+    claims = getattr(user, "token_claims", None)
+    if claims is not None:
+        # вход по токену: всё уже есть в подписанных claims
+        return {
+            "id": user.pk,
+            "username": claims.get("username", ""),
+            "is_staff": claims.get("is_staff", False),
+            "role": claims.get("role", ""),
+            "has_otp": claims.get("has_otp", False),
+        }
+
+    key = CONTEXT_KEY.format(user.pk)
+    context = cache.get(key) if enabled() else None
+    if context is None:
+        profile = _profile(user)
+        context = {
+            "id": user.pk,
+            "username": user.get_username(),
+            "is_staff": user.is_staff,
+            "role": profile["role"] if profile else "",
+            "has_otp": bool(profile and profile["opt_key"]),
+        }
+        if enabled():
+            cache.set(key, context, settings.AUTH_CACHE_TIMEOUT)
+    return context
+
+
+def invalidate_user(user_id):
+    keys = [USER_KEY.format(user_id), CONTEXT_KEY.format(user_id)]
+    cache.delete_many(keys)
+    # и ещё раз после коммита: параллельный запрос мог успеть
+    # закэшировать старые данные до конца транзакции
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который достаёт пользователя сессии из кэша."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None or not self.user_can_authenticate(user):
+            return None
+        return user
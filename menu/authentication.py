@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import tokens
+
+
+def user_from_claims(claims):
+    # Несохранённый экземпляр User с нужным pk: годится и для проверок прав,
+    # и для фильтров вида filter(user=request.user), но в БД не ходит.
+    UserModel = get_user_model()
+    user = UserModel(pk=claims["sub"], is_staff=claims.get("is_staff", False), is_active=True)
+    setattr(user, UserModel.USERNAME_FIELD, claims.get("username", ""))
+    user.token_claims = claims
+    return user
+
+
+class BearerTokenAuthentication(BaseAuthentication):
+    """Authorization: Bearer <access>. CSRF не нужен — cookie не используются."""
+
+    keyword = b"bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed("Неверный заголовок Authorization")
+
+        try:
+            claims = tokens.decode(auth[1].decode("ascii"), typ="access")
+        except (tokens.TokenError, UnicodeError) as e:
+            raise AuthenticationFailed(str(e))
+
+        return user_from_claims(claims), claims
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
@@ -0,0 +1,107 @@
+"""
+Общие помощники для бенчмарков (management-команды bench_*).
+
+Бенчмарки работают в отдельной тестовой базе, которая создаётся и
+удаляется вокруг замера, поэтому рабочая db.sqlite3 не трогается.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from random import Random
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .models import Category, Menu, Customer, Order, OrderItem
+
+
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def seed_dataset(orders, items_per_order=3, menus=50, categories=5, customers=1000, seed=42):
+    """
+    Воспроизводимый набор данных: при одном seed получаются одни и те же строки.
+    Пишет пачками через bulk_create.
+    """
+    rnd = Random(seed)
+
+    cats = Category.objects.bulk_create(
+        [Category(name=f"Категория {i}") for i in range(categories)]
+    )
+    menu_objs = Menu.objects.bulk_create([
+        Menu(
+            title=f"Позиция {i}",
+            group=rnd.choice(cats),
+            price=Decimal(rnd.randint(50, 500)),
+            description=f"Описание {i}",
+        )
+        for i in range(menus)
+    ])
+    customer_objs = Customer.objects.bulk_create(
+        [Customer(name=f"Клиент {i}", phone=f"+7-900-{i:07d}") for i in range(customers)],
+        batch_size=BATCH_SIZE,
+    )
+
+    statuses = [code for code, _ in Order.STATUS_CHOICES]
+    done = 0
+    while done < orders:
+        n = min(BATCH_SIZE, orders - done)
+        batch = Order.objects.bulk_create([
+            Order(customer=rnd.choice(customer_objs), status=rnd.choice(statuses))
+            for _ in range(n)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=o, menu=rnd.choice(menu_objs), qty=rnd.randint(1, 3))
+            for o in batch
+            for _ in range(items_per_order)
+        ], batch_size=BATCH_SIZE)
+        done += n
+
+
+class QueryCounter:
+    # CaptureQueriesContext упирается в лимит queries_log (9000 запросов),
+    # а на больших наборах N+1 даёт больше.
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Время (мс) и число SQL-запросов одного вызова fn."""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = counter.count
+
+    timings.sort()
+    return {
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "queries": queries,
+        "repeat": repeat,
+    }
@@ -0,0 +1,180 @@
+"""
+Журнал изменений (change data capture) и дельта-синхронизация каталога.
+
+Сигналы и массовые операции (ChangeLoggedQuerySet) пишут в ChangeLog в той же
+транзакции, что и само изменение. Кэши, сводки и индексы читают журнал
+через iter_changes() или /api/changes/?after=<seq>, не пересканируя таблицы.
+
+Журнал сжимается командой compact_changelog: для каждого объекта остаётся
+только последняя запись (дельте этого достаточно), а записи об удалении
+хранятся CHANGELOG_TOMBSTONE_DAYS дней. Наибольший seq удалённых записей
+запоминается в ChangeLogHorizon: потребитель, отставший сильнее,
+должен заново прочитать таблицы целиком — iter_changes() для него бросает
+CursorExpired, /api/changes/ отвечает 410.
+
+/api/catalogue/ отдаёт снимок каталога с номером последнего изменения (seq),
+а /api/catalogue/?since=<seq> — только созданное, изменённое и удалённое.
+Если since раньше границы журнала, вместо дельты приходит полный снимок.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Category, ChangeLog, ChangeLogHorizon, Customer, Menu, Order, OrderItem
+
+
+LOGGED_MODELS = [Category, Menu, Customer, Order, OrderItem]
+
+# имя в снимке -> (модель, поля в снимке)
+CATALOGUE = {
+    "categories": (Category, ["id", "name"]),
+    "menu": (Menu, ["id", "title", "group", "price", "description", "picture", "version"]),
+}
+
+
+def log_name(model):
+    return model._meta.model_name
+
+
+def record(model, object_id, action="save"):
+    ChangeLog.objects.create(model=log_name(model), object_id=object_id, action=action)
+
+
+def last_seq():
+    # хвост журнала тоже могли вычистить — seq не должен уменьшаться
+    last = ChangeLog.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    return max(last, horizon())
+
+
+class CursorExpired(Exception):
+    """after раньше границы журнала: часть записей об удалении уже вычищена."""
+
+    def __init__(self, after, horizon):
+        super().__init__(f"Журнал до seq {horizon} сжат, а курсор на {after}: нужна полная пересинхронизация")
+        self.after = after
+        self.horizon = horizon
+
+
+def check_cursor(after):
+    boundary = horizon()
+    if after < boundary:
+        raise CursorExpired(after, boundary)
+
+
+def changes_after(after, limit, models=None):
+    qs = ChangeLog.objects.filter(id__gt=after).order_by("id")
+    if models:
+        qs = qs.filter(model__in=models)
+    return list(qs[:limit])
+
+
+def iter_changes(after=0, models=None, batch_size=500, poll_interval=None):
+    """
+    Записи журнала по порядку seq, пачками по batch_size.
+    С poll_interval не останавливается на конце журнала, а ждёт новых записей.
+    CursorExpired — если after (или позиция чтения) отстала от horizon().
+
+        for change in iter_changes(after=saved_seq, models=["order"]):
+            apply(change)
+            saved_seq = change.id
+    """
+    while True:
+        # граница может сдвинуться и во время чтения, поэтому на каждой пачке
+        check_cursor(after)
+        batch = changes_after(after, batch_size, models)
+        yield from batch
+        if batch:
+            after = batch[-1].id
+        if len(batch) < batch_size:
+            if poll_interval is None:
+                return
+            time.sleep(poll_interval)
+
+
+def compact(before=None):
+    """
+    Удаляет записи, перекрытые более поздней записью о том же объекте.
+    before — не трогать записи с seq >= before (например, ещё не прочитанные).
+    """
+    latest = ChangeLog.objects.values("model", "object_id").annotate(last=Max("id")).values("last")
+    qs = ChangeLog.objects.exclude(id__in=latest)
+    if before is not None:
+        qs = qs.filter(id__lt=before)
+    return qs.delete()[0]
+
+
+def horizon():
+    """seq, до которого (включительно) журнал неполон; 0 — полон с начала."""
+    return ChangeLogHorizon.objects.values_list("seq", flat=True).first() or 0
+
+
+def expire_tombstones(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    qs = ChangeLog.objects.filter(action="delete", created_at__lt=cutoff)
+    with transaction.atomic():
+        last = qs.aggregate(last=Max("id"))["last"]
+        if last is None:
+            return 0
+        row, _ = ChangeLogHorizon.objects.select_for_update().get_or_create(pk=1)
+        if last > row.seq:
+            row.seq = last
+            row.save(update_fields=["seq"])
+        return qs.filter(id__lte=last).delete()[0]
+
+
+def changed_ids(model, since, until):
+    qs = ChangeLog.objects.filter(model=log_name(model), id__gt=since, id__lte=until)
+    return set(qs.values_list("object_id", flat=True))
+
+
+def rows(model, fields, qs, request=None):
+    """Строки как списки значений в порядке fields — без имён полей в каждой строке."""
+    data = []
+    picture = fields.index("picture") if "picture" in fields else None
+    for row in qs.order_by("id").values_list(*fields):
+        row = list(row)
+        if picture is not None and row[picture]:
+            url = model._meta.get_field("picture").storage.url(row[picture])
+            row[picture] = request.build_absolute_uri(url) if request is not None else url
+        if "price" in fields:
+            i = fields.index("price")
+            row[i] = str(row[i])
+        data.append(row)
+    return data
+
+
+def snapshot(request=None):
+    # seq берём до чтения таблиц: изменение, попавшее между ними,
+    # просто придёт ещё раз в следующей дельте.
+    seq = last_seq()
+    data = {"seq": seq, "full": True}
+    for name, (model, fields) in CATALOGUE.items():
+        data[name] = {
+            "fields": fields,
+            "rows": rows(model, fields, model.objects.all(), request),
+        }
+    return data
+
+
+def delta(since, request=None):
+    """
+    Изменения после since. Если с тех пор записи об удалении уже вычищены
+    (или since из другой базы — больше текущего seq), отдаётся полный снимок.
+    """
+    seq = last_seq()
+    if since < horizon() or since > seq:
+        return snapshot(request)
+    data = {"seq": seq, "full": False}
+    for name, (model, fields) in CATALOGUE.items():
+        ids = changed_ids(model, since, seq) if seq > since else set()
+        updated = rows(model, fields, model.objects.filter(id__in=ids), request) if ids else []
+        present = {row[0] for row in updated}
+        data[name] = {
+            "fields": fields,
+            "rows": updated,
+            "deleted": sorted(ids - present),
+        }
+    return data
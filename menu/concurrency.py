@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import F
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+WRITE_ACTIONS = ("update", "partial_update", "destroy")
+ETAG_ACTIONS = ("create", "retrieve", "update", "partial_update")
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "Объект был изменён другим пользователем. Обновите данные и повторите."
+    default_code = "precondition_failed"
+
+
+class PreconditionRequired(APIException):
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = "Для изменения требуется заголовок If-Match."
+    default_code = "precondition_required"
+
+
+def make_etag(version):
+    return f'"{version}"'
+
+
+def parse_if_match(value):
+    """
+    Разбирает If-Match в множество версий.
+    None означает «*» (подходит любая версия).
+    """
+    value = (value or "").strip()
+    if value == "*":
+        return None
+
+    versions = set()
+    for tag in value.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag.isdigit():
+            versions.add(int(tag))
+    return versions
+
+
+class OptimisticLockMixin:
+    """
+    Оптимистическая блокировка для ModelViewSet.
+
+    Модель должна иметь поле version. Версия отдаётся в ETag, а запись
+    проходит только если в UPDATE ... WHERE version = <ожидаемая> попала
+    ровно одна строка; иначе клиент сразу получает 412.
+    """
+
+    # Включается отдельно для каждого viewset.
+    require_if_match = False
+
+    def get_object(self):
+        instance = super().get_object()
+        if self.action in WRITE_ACTIONS:
+            self.check_if_match(instance)
+        return instance
+
+    def check_if_match(self, instance):
+        header = self.request.headers.get("If-Match")
+        if not header:
+            if self.require_if_match:
+                raise PreconditionRequired()
+            return
+
+        versions = parse_if_match(header)
+        if versions is not None and instance.version not in versions:
+            raise PreconditionFailed()
+
+    def bump_version(self, instance):
+        updated = (
+            type(instance)._default_manager
+            .filter(pk=instance.pk, version=instance.version)
+            .update(version=F("version") + 1)
+        )
+        if not updated:
+            raise PreconditionFailed()
+        return instance.version + 1
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            version = self.bump_version(serializer.instance)
+            serializer.save(version=version)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self.bump_version(instance)
+            instance.delete()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        data = getattr(response, "data", None)
+        if (
+            self.action in ETAG_ACTIONS
+            and response.status_code < 300
+            and isinstance(data, dict)
+            and "version" in data
+        ):
+            response["ETag"] = make_etag(data["version"])
+        return response
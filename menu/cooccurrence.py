@@ -0,0 +1,173 @@
+"""
+Индекс «часто заказывают вместе».
+
+MenuPair хранит, в скольких заказах встретились две позиции меню.
+Полностью строится командой build_cooccurrence (пачками заказов), а дальше
+поддерживается сигналами: добавление позиции в заказ увеличивает её пары
+со всеми остальными позициями заказа, удаление — уменьшает. Ответ для
+/api/menu/{id}/related/ — один проход по индексу (menu, -count).
+
+Массовое удаление позиций без удаления самого заказа
+(OrderItem.objects.filter(...).delete()) уменьшает только диагональ:
+после такого стоит перестроить индекс.
+"""
+import threading
+from collections import Counter
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ArchivedOrder, ArchivedOrderItem, MenuPair, Order, OrderItem
+
+
+BATCH_SIZE = 2000
+
+
+def order_pairs(menus):
+    """Все упорядоченные пары (включая диагональ) для набора позиций заказа."""
+    menus = sorted(set(menus))
+    for m in menus:
+        yield m, m
+    for a, b in combinations(menus, 2):
+        yield a, b
+        yield b, a
+
+
+def count_pairs(batch_size=BATCH_SIZE):
+    """
+    Counter{(menu, other): заказов} по всей истории, пачками заказов.
+    Архивные заказы (menu/archive.py) учитываются наравне с рабочими.
+    """
+    counts = Counter()
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        last = 0
+        while True:
+            ids = list(
+                order_model.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last = ids[-1]
+
+            menus = {}
+            items = item_model.objects.filter(order_id__in=ids, menu_id__isnull=False).values_list("order_id", "menu_id")
+            for order_id, menu_id in items.iterator():
+                menus.setdefault(order_id, set()).add(menu_id)
+            for order_menus in menus.values():
+                counts.update(order_pairs(order_menus))
+    return counts
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    counts = count_pairs(batch_size)
+    with transaction.atomic():
+        MenuPair.objects.all().delete()
+        MenuPair.objects.bulk_create(
+            [MenuPair(menu_id=a, other_id=b, count=n) for (a, b), n in counts.items()],
+            batch_size=5000,
+        )
+    return len(counts)
+
+
+def apply(pairs, delta):
+    pairs = list(pairs)
+    if not pairs:
+        return
+    # пустые строки создаются заранее, чтобы параллельные заказы
+    # не потеряли инкремент на гонке «нет строки -> INSERT»
+    if delta > 0:
+        MenuPair.objects.bulk_create(
+            [MenuPair(menu_id=a, other_id=b, count=0) for a, b in pairs],
+            ignore_conflicts=True,
+        )
+    by_menu = {}
+    for a, b in pairs:
+        by_menu.setdefault(a, []).append(b)
+    for menu_id, others in by_menu.items():
+        MenuPair.objects.filter(menu_id=menu_id, other_id__in=others).update(count=F("count") + delta)
+
+
+def menu_added(order_id, menu_id, item_id):
+    """Позиция появилась в заказе (новая строка или смена menu у строки)."""
+    lines = OrderItem.objects.filter(order_id=order_id, menu_id__isnull=False).exclude(pk=item_id)
+    others = set(lines.values_list("menu_id", flat=True))
+    if menu_id in others:
+        return  # уже была в заказе другой строкой
+    apply(_pairs_with(menu_id, others), +1)
+
+
+def menu_removed(order_id, menu_id, item_id):
+    lines = OrderItem.objects.filter(order_id=order_id, menu_id__isnull=False).exclude(pk=item_id)
+    others = set(lines.values_list("menu_id", flat=True))
+    if menu_id in others:
+        return
+    apply(_pairs_with(menu_id, others), -1)
+
+
+_deleting = threading.local()
+
+
+def order_removing(order_id):
+    """
+    Перед удалением заказа: вычесть все его пары разом. Каскадное удаление
+    позиций идёт следом, и их сигналы для этого заказа пропускаются.
+
+    Отметка привязана к atomic-блоку удаления (Collector.delete): если оно
+    откатилось и post_delete не пришёл, отметка перестаёт действовать вместе
+    с блоком и не глушит сигналы следующих удалений в этом потоке.
+    """
+    menus = OrderItem.objects.filter(order_id=order_id, menu_id__isnull=False).values_list("menu_id", flat=True)
+    apply(order_pairs(menus), -1)
+    marks = _orders_deleting()
+    for stale in [pk for pk, block in marks.items() if not _is_open(block)]:
+        del marks[stale]
+    blocks = transaction.get_connection().atomic_blocks
+    marks[order_id] = blocks[-1] if blocks else None
+
+
+def order_removed(order_id):
+    _orders_deleting().pop(order_id, None)
+
+
+def is_order_removing(order_id):
+    marks = _orders_deleting()
+    if order_id not in marks:
+        return False
+    if not _is_open(marks[order_id]):
+        del marks[order_id]
+        return False
+    return True
+
+
+def _is_open(block):
+    return block is not None and any(b is block for b in transaction.get_connection().atomic_blocks)
+
+
+def _orders_deleting():
+    if not hasattr(_deleting, "orders"):
+        _deleting.orders = {}
+    return _deleting.orders
+
+
+def _pairs_with(menu_id, others):
+    yield menu_id, menu_id
+    for other in others:
+        yield menu_id, other
+        yield other, menu_id
+
+
+def related(menu_id, limit=5):
+    """[(other_id, заказов вместе, доля заказов menu_id с other_id)] по убыванию."""
+    rows = list(
+        MenuPair.objects.filter(menu_id=menu_id, count__gt=0)
+        .order_by("-count", "other_id")
+        .values_list("other_id", "count")[:limit + 1]
+    )
+    total = next((n for other, n in rows if other == menu_id), None)
+    if total is None:
+        total = MenuPair.objects.filter(menu_id=menu_id, other_id=menu_id).values_list("count", flat=True).first() or 0
+    return [
+        (other, n, round(n / total, 4) if total else 0)
+        for other, n in rows if other != menu_id
+    ][:limit]
@@ -0,0 +1,192 @@
+"""
+Счётчики продаж за день и неделю для виджетов «топ позиций» и «топ клиентов».
+
+Считаются только готовые (DONE) заказы. Сигналы применяют дельты:
+заказ стал DONE — плюс все его позиции, перестал — минус; правка, добавление
+и удаление позиции готового заказа — разница. Выручка берётся по текущей
+цене меню в момент события; после смены цен или правок в обход сигналов
+(queryset.update) счётчики пересчитываются командой rebuild_counters.
+
+Топ периода отдаётся индексом (kind, period, start, -qty/-revenue) и
+кэшируется ограниченным списком на TOP_CAPACITY записей: рост счётчика
+обновляет список на месте, уменьшение у попавшего в список — сбрасывает его.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Menu, Order, OrderItem, SalesCounter
+
+
+TOP_CAPACITY = 50
+RANK_BY = {"menu": "qty", "customer": "revenue"}
+
+
+def period_starts(created_at):
+    day = timezone.localdate(created_at)
+    return {"day": day, "week": day - timedelta(days=day.weekday())}
+
+
+def _line_totals(lines):
+    """[(menu_id, qty)] -> {menu_id: (qty, revenue)} по текущим ценам."""
+    lines = [(m, q) for m, q in lines if m]
+    prices = dict(Menu.objects.filter(id__in={m for m, _ in lines}).values_list("id", "price"))
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for menu_id, qty in lines:
+        totals[menu_id][0] += qty
+        totals[menu_id][1] += qty * prices.get(menu_id, Decimal("0"))
+    return totals
+
+
+def apply(created_at, customer_id, lines, sign, orders=0):
+    """
+    Добавляет (sign=+1) или вычитает (-1) позиции заказа во все его периоды.
+    orders — на сколько изменить число заказов клиента (0 или 1).
+    """
+    totals = _line_totals(lines)
+    deltas = {("menu", m): (q, r, 0) for m, (q, r) in totals.items()}
+    if customer_id:
+        qty = sum(q for q, _ in totals.values())
+        revenue = sum((r for _, r in totals.values()), Decimal("0"))
+        if qty or orders:
+            deltas[("customer", customer_id)] = (qty, revenue, orders)
+    if not deltas:
+        return
+
+    for period, start in period_starts(created_at).items():
+        SalesCounter.objects.bulk_create(
+            [SalesCounter(period=period, start=start, kind=kind, key=key) for kind, key in deltas],
+            ignore_conflicts=True,
+        )
+        for (kind, key), (qty, revenue, n) in deltas.items():
+            SalesCounter.objects.filter(period=period, start=start, kind=kind, key=key).update(
+                qty=F("qty") + sign * qty,
+                revenue=F("revenue") + sign * revenue,
+                orders=F("orders") + sign * n,
+            )
+            transaction.on_commit(lambda p=period, s=start, k=kind, i=key: touch_top(k, p, s, i, sign))
+
+
+def order_lines(order_id):
+    return list(OrderItem.objects.filter(order_id=order_id).values_list("menu_id", "qty"))
+
+
+def order_done(order, sign, customer_id=None):
+    """Весь заказ целиком: стал DONE (+1) или перестал им быть (-1)."""
+    customer_id = order.customer_id if customer_id is None else customer_id
+    apply(order.created_at, customer_id, order_lines(order.pk), sign, orders=1)
+
+
+def line_changed(order_id, old_line, new_line):
+    """old_line/new_line — (menu_id, qty) или None."""
+    order = Order.objects.filter(pk=order_id).values("status", "customer_id", "created_at").first()
+    if order is None or order["status"] != "DONE":
+        return
+    if old_line:
+        apply(order["created_at"], order["customer_id"], [old_line], -1)
+    if new_line:
+        apply(order["created_at"], order["customer_id"], [new_line], +1)
+
+
+def rebuild():
+    """Пересчёт всех счётчиков по истории готовых заказов, включая архив."""
+    counters = defaultdict(lambda: [0, Decimal("0"), 0])
+    info = {}
+    items = []
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders = order_model.objects.filter(status="DONE").values_list("id", "created_at", "customer_id")
+        info.update((pk, (created, customer)) for pk, created, customer in orders.iterator())
+        items.append(
+            item_model.objects.filter(order__status="DONE", menu__isnull=False)
+            .values_list("order_id", "menu_id", "qty", "menu__price")
+            .order_by("order_id")
+        )
+
+    for pk, (created, customer) in info.items():
+        if customer:
+            for period, start in period_starts(created).items():
+                counters[(period, start, "customer", customer)][2] += 1
+
+    for order_id, menu_id, qty, price in chain.from_iterable(qs.iterator() for qs in items):
+        created, customer = info[order_id]
+        for period, start in period_starts(created).items():
+            for kind, key in (("menu", menu_id), ("customer", customer)):
+                if key:
+                    c = counters[(period, start, kind, key)]
+                    c[0] += qty
+                    c[1] += qty * price
+
+    periods = set(SalesCounter.objects.values_list("kind", "period", "start").distinct())
+    periods.update((k, p, s) for p, s, k, _ in counters)
+    with transaction.atomic():
+        SalesCounter.objects.all().delete()
+        SalesCounter.objects.bulk_create(
+            [
+                SalesCounter(period=p, start=s, kind=k, key=key, qty=q, revenue=r, orders=n)
+                for (p, s, k, key), (q, r, n) in counters.items()
+            ],
+            batch_size=5000,
+        )
+    cache.delete_many([_top_key(*period) for period in periods])
+    return len(counters)
+
+
+def _top_key(kind, period, start):
+    return f"sales:top:{kind}:{period}:{start.isoformat()}"
+
+
+def _load_top(kind, period, start):
+    order = f"-{RANK_BY[kind]}"
+    rows = (
+        SalesCounter.objects.filter(kind=kind, period=period, start=start)
+        .filter(**{f"{RANK_BY[kind]}__gt": 0})
+        .order_by(order, "key")
+        .values_list("key", "qty", "revenue", "orders")[:TOP_CAPACITY]
+    )
+    return list(rows)
+
+
+def top(kind, period, start, limit=10):
+    """[(key, qty, revenue, orders)] — лучшие за период, без прохода по истории."""
+    key = _top_key(kind, period, start)
+    rows = cache.get(key)
+    if rows is None:
+        rows = _load_top(kind, period, start)
+        cache.set(key, rows, settings.REPORTS_TOP_TIMEOUT)
+    return rows[:limit]
+
+
+def touch_top(kind, period, start, key, sign):
+    """Поддерживает кэшированный топ после изменения счётчика key."""
+    cache_key = _top_key(kind, period, start)
+    rows = cache.get(cache_key)
+    if rows is None:
+        return
+
+    listed = any(k == key for k, *_ in rows)
+    if sign < 0:
+        # вычитание могло пропустить вперёд того, кого нет в списке
+        if listed:
+            cache.delete(cache_key)
+        return
+
+    counter = (
+        SalesCounter.objects.filter(kind=kind, period=period, start=start, key=key)
+        .values_list("key", "qty", "revenue", "orders").first()
+    )
+    if counter is None:
+        return
+    rank = 1 if RANK_BY[kind] == "qty" else 2
+    if not listed and len(rows) >= TOP_CAPACITY and counter[rank] <= rows[-1][rank]:
+        return
+
+    rows = [r for r in rows if r[0] != key] + [counter]
+    rows.sort(key=lambda r: (-r[rank], r[0]))
+    cache.set(cache_key, rows[:TOP_CAPACITY], settings.REPORTS_TOP_TIMEOUT)
@@ -0,0 +1,267 @@
+"""
+Декларативные выгрузки: для каждой модели — список колонок (Report),
+один движок, который выбирает из БД ровно эти колонки через values_list(),
+и подключаемые форматы (WRITERS).
+
+?columns=id,title,price оставляет только перечисленные колонки — и в файле,
+и в SELECT. ?type=xlsx|docx|csv|columnar выбирает формат для /export/.
+columnar — типизированная выгрузка menu/columnar.py с её фиксированной
+схемой; есть только у отчётов с columnar=True (позиции заказов).
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import (
+    Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import columnar
+from .docx import docx_response
+from .models import OrderItem
+from .throttling import ExportThrottle
+
+try:
+    from openpyxl import Workbook
+except Exception:
+    Workbook = None
+
+
+CHUNK_SIZE = 2000
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class Column:
+    """
+    name — имя в ?columns= и заголовок; source — путь для values_list
+    (по умолчанию name); expression — вычисляемая колонка (annotate).
+    """
+
+    def __init__(self, name, source=None, expression=None, default=True):
+        self.name = name
+        self.source = source or name
+        self.expression = expression
+        self.default = default
+
+
+class Report:
+    def __init__(self, title, filename, columns, columnar=False):
+        self.title = title
+        self.filename = filename
+        self.columns = columns
+        self.columnar = columnar
+        self.by_name = {c.name: c for c in columns}
+
+    def select(self, names=None):
+        """Колонки по списку имён; без списка — колонки по умолчанию."""
+        if not names:
+            return [c for c in self.columns if c.default]
+        unknown = [n for n in names if n not in self.by_name]
+        if unknown:
+            raise ValueError(
+                f"Неизвестные колонки: {', '.join(unknown)}. Доступны: {', '.join(self.by_name)}"
+            )
+        return [self.by_name[n] for n in names]
+
+    def rows(self, qs, columns):
+        # под своим префиксом: имя колонки может совпасть с полем (Order.items)
+        annotations = {f"export_{c.name}": c.expression for c in columns if c.expression is not None}
+        if annotations:
+            qs = qs.annotate(**annotations)
+        fields = [f"export_{c.name}" if c.expression is not None else c.source for c in columns]
+        return qs.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def order_total():
+    totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum(ExpressionWrapper(F("qty") * F("menu__price"), output_field=MONEY)))
+        .values("total")
+    )
+    return Coalesce(Subquery(totals, output_field=MONEY), Value(0), output_field=MONEY)
+
+
+def order_items_count():
+    counts = OrderItem.objects.filter(order=OuterRef("pk")).values("order").annotate(n=Count("id")).values("n")
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+CATEGORIES = Report("Категории", "categories", [
+    Column("id"),
+    Column("name"),
+])
+
+MENU = Report("Меню", "menu", [
+    Column("id"),
+    Column("title"),
+    Column("group", "group_id"),
+    Column("price"),
+    Column("description"),
+    Column("group_name", "group__name", default=False),
+])
+
+CUSTOMERS = Report("Клиенты", "customers", [
+    Column("id"),
+    Column("name"),
+    Column("phone"),
+    Column("email", default=False),
+])
+
+ORDERS = Report("Заказы", "orders", [
+    Column("id"),
+    Column("customer", "customer_id"),
+    Column("status"),
+    Column("customer_name", "customer__name", default=False),
+    Column("user", "user__username", default=False),
+    Column("created_at", default=False),
+    Column("items", expression=order_items_count(), default=False),
+    Column("total", expression=order_total(), default=False),
+])
+
+ORDER_ITEMS = Report("Позиции заказов", "order_items", [
+    Column("id"),
+    Column("order", "order_id"),
+    Column("menu", "menu_id"),
+    Column("qty"),
+    Column("menu_title", "menu__title", default=False),
+    Column("price", "menu__price", default=False),
+    Column(
+        "line_total",
+        expression=ExpressionWrapper(F("qty") * F("menu__price"), output_field=MONEY),
+        default=False,
+    ),
+    Column("order_status", "order__status", default=False),
+    Column("created_at", "order__created_at", default=False),
+], columnar=True)
+
+
+def local(value):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def plain(value):
+    value = local(value)
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, Decimal):
+        # вычисленная в SQL сумма приходит без хвостовых нулей
+        return f"{value:.2f}"
+    return value
+
+
+def attachment(response, filename):
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_xlsx(report, columns, qs):
+    if Workbook is None:
+        return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
+
+    # write_only: строки сразу уходят во временный файл, а не копятся в памяти
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(report.title)
+    ws.append([c.name for c in columns])
+    for row in report.rows(qs, columns):
+        ws.append([local(v) for v in row])
+
+    resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    wb.save(resp)
+    return attachment(resp, f"{report.filename}.xlsx")
+
+
+def write_docx(report, columns, qs):
+    rows = ([plain(v) for v in row] for row in report.rows(qs, columns))
+    return docx_response(f"{report.filename}.docx", report.title, [c.name for c in columns], rows)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def write_csv(report, columns, qs):
+    writer = csv.writer(_Echo())
+
+    def stream():
+        # BOM — чтобы Excel открыл UTF-8 без мастера импорта
+        yield "\ufeff" + writer.writerow([c.name for c in columns])
+        for row in report.rows(qs, columns):
+            yield writer.writerow([plain(v) for v in row])
+
+    resp = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
+    return attachment(resp, f"{report.filename}.csv")
+
+
+def write_columnar(report, columns, qs):
+    """
+    Та же выгрузка, что /export-analytics/: Parquet (или .npz без pyarrow).
+    Схема фиксированная, поэтому ?columns= здесь не учитывается.
+    """
+    if not report.columnar:
+        return Response({"detail": "Формат columnar есть только для позиций заказов"}, status=400)
+    if columnar.numpy is None:
+        return Response({"detail": "numpy не установлен в этом окружении"}, status=500)
+
+    fmt = columnar.default_format()
+    content_type, ext = columnar.FORMATS[fmt]
+    return FileResponse(
+        columnar.export_file(qs, fmt),
+        as_attachment=True,
+        filename=f"{report.filename}.{ext}",
+        content_type=content_type,
+    )
+
+
+WRITERS = {
+    "xlsx": write_xlsx,
+    "docx": write_docx,
+    "csv": write_csv,
+    "columnar": write_columnar,
+}
+
+
+class ExportMixin:
+    """
+    Выгрузки для ModelViewSet по описанию export_report:
+    /export/?type=..., а также прежние /export-excel/ и /export-word/.
+    """
+
+    export_report = None
+
+    def export_response(self, request, fmt):
+        writer = WRITERS.get(fmt)
+        if writer is None:
+            return Response({"detail": f"Неизвестный формат: {fmt}. Доступны: {', '.join(WRITERS)}"}, status=400)
+
+        names = [n for n in request.query_params.get("columns", "").split(",") if n]
+        try:
+            columns = self.export_report.select(names)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        return writer(self.export_report, columns, self.get_queryset())
+
+    @action(detail=False, url_path="export", methods=["GET"], throttle_classes=[ExportThrottle])
+    def export(self, request, *args, **kwargs):
+        # не ?format=: этот параметр DRF забирает себе для выбора рендерера
+        return self.export_response(request, request.query_params.get("type", "xlsx"))
+
+    @action(detail=False, url_path="export-excel", methods=["GET"], throttle_classes=[ExportThrottle])
+    def export_excel(self, request, *args, **kwargs):
+        return self.export_response(request, "xlsx")
+
+    @action(detail=False, url_path="export-word", methods=["GET"], throttle_classes=[ExportThrottle])
+    def export_word(self, request, *args, **kwargs):
+        return self.export_response(request, "docx")
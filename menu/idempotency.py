@@ -0,0 +1,93 @@
+"""
+Заголовок Idempotency-Key для create: клиент может повторить POST после
+сетевой ошибки, не боясь создать дубликат.
+
+Ключ (в пределах пользователя и ресурса) вставляется в IdempotencyKey в той
+же транзакции, что и сама запись, поэтому параллельный повтор ждёт на
+уникальном индексе и затем получает сохранённый ответ. Сохраняются только
+успешные ответы: после 4xx ключ освобождается, и исправленный запрос можно
+отправить с ним же. Тот же ключ с другим телом запроса — 422.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(data):
+    body = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def expire(before=None, batch_size=5000):
+    """Удаляет истёкшие ключи пачками; -> сколько удалено."""
+    before = before or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=before).values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+
+class IdempotentCreateMixin:
+    """create() с поддержкой Idempotency-Key; ресурс — basename вьюсета."""
+
+    def idempotent_replay(self, record, digest):
+        if record.fingerprint != digest:
+            return Response(
+                {"detail": f"{HEADER} уже использован с другим телом запроса"},
+                status=422,
+            )
+        if record.status_code is None:
+            return Response({"detail": f"Запрос с этим {HEADER} ещё выполняется"}, status=409)
+        return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"detail": f"{HEADER} длиннее {MAX_KEY_LENGTH} символов"}, status=400)
+
+        lookup = {"user": request.user, "scope": self.basename, "key": key}
+        digest = fingerprint(request.data)
+        now = timezone.now()
+
+        # обычный повтор — одно чтение, без транзакции и записи
+        record = IdempotencyKey.objects.filter(**lookup, expires_at__gt=now).first()
+        if record is not None:
+            return self.idempotent_replay(record, digest)
+
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(**lookup, expires_at__lte=now).delete()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        **lookup,
+                        fingerprint=digest,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+                    )
+            except IntegrityError:
+                return self.idempotent_replay(IdempotencyKey.objects.get(**lookup), digest)
+
+            # ошибки валидации — исключение: транзакция откатится вместе с ключом
+            response = super().create(request, *args, **kwargs)
+            if response.status_code >= 300:
+                transaction.set_rollback(True)
+                return response
+
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+        return response
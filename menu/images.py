@@ -0,0 +1,151 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+FORMAT_EXTENSIONS = {
+    "webp": "webp",
+    "jpeg": "jpg",
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def file_sha256(fileobj, chunk_size=CHUNK_SIZE):
+    """SHA-256 файла, читается кусками, позиция в файле восстанавливается."""
+    h = hashlib.sha256()
+    pos = fileobj.tell() if hasattr(fileobj, "tell") else None
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        h.update(chunk)
+    if pos is not None:
+        fileobj.seek(pos)
+    return h.hexdigest()
+
+
+def variant_path(digest, width, fmt):
+    return f"thumbs/{digest[:2]}/{digest}-{width}.{FORMAT_EXTENSIONS[fmt]}"
+
+
+def variant_widths(original_width):
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    result = [w for w in widths if w < original_width]
+    if not result:
+        # Картинку меньше самого маленького варианта не увеличиваем,
+        # но один вариант (перекодированный) всё равно нужен.
+        result = [original_width]
+    return result
+
+
+def _encode(img, width, fmt):
+    height = max(1, round(img.height * width / img.width))
+    resized = img.resize((width, height), Image.LANCZOS) if width != img.width else img
+
+    if fmt == "jpeg" and resized.mode != "RGB":
+        resized = resized.convert("RGB")
+    elif fmt == "webp" and resized.mode not in ("RGB", "RGBA"):
+        resized = resized.convert("RGBA" if "A" in resized.getbands() else "RGB")
+
+    buf = io.BytesIO()
+    resized.save(buf, format=fmt.upper(), quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+    return buf.getvalue()
+
+
+def build_variants(field_file):
+    """
+    Строит уменьшенные копии изображения и возвращает описание для picture_variants.
+    Файлы кладутся в thumbs/ под именем из хэша содержимого, поэтому уже
+    существующие варианты повторно не считаются.
+    """
+    storage = field_file.storage
+    name = field_file.name
+
+    with storage.open(name, "rb") as f:
+        digest = file_sha256(f)
+        img = ImageOps.exif_transpose(Image.open(f))
+        img.load()
+
+    result = {
+        "source": name,
+        "hash": digest,
+        "width": img.width,
+        "height": img.height,
+    }
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        paths = {}
+        for width in variant_widths(img.width):
+            path = variant_path(digest, width, fmt)
+            if not storage.exists(path):
+                storage.save(path, ContentFile(_encode(img, width, fmt)))
+            paths[str(width)] = path
+        result[fmt] = paths
+    return result
+
+
+def generate_variants(model, pk):
+    obj = model._default_manager.filter(pk=pk).first()
+    if obj is None or not obj.picture:
+        return None
+
+    try:
+        variants = build_variants(obj.picture)
+    except Exception:
+        logger.exception("Не удалось построить варианты для %s #%s", model.__name__, pk)
+        return None
+
+    # Картинку могли заменить, пока варианты считались.
+    model._default_manager.filter(pk=pk, picture=obj.picture.name).update(picture_variants=variants)
+    return variants
+
+
+def _run_in_worker(model, pk):
+    close_old_connections()
+    try:
+        generate_variants(model, pk)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix="image-variants",
+            )
+    return _executor
+
+
+def schedule_variants(instance):
+    if Image is None:
+        return
+
+    model = type(instance)
+    pk = instance.pk
+
+    def run():
+        if settings.IMAGE_VARIANTS_SYNC:
+            generate_variants(model, pk)
+        else:
+            get_executor().submit(_run_in_worker, model, pk)
+
+    transaction.on_commit(run)
+
@@ -0,0 +1,273 @@
+"""
+Массовая загрузка меню и клиентов из CSV/XLSX: /api/menu/import/ и
+/api/customers/import/ (multipart, поле file).
+
+Первая строка файла — имена колонок (как в выгрузке: id, title, price...).
+Строки читаются потоком (csv.reader или openpyxl в режиме read_only),
+проверяются пачками по CHUNK_SIZE и сразу пишутся через bulk_create:
+строки без id создаются, строки с id обновляют существующие записи
+(bulk_create(update_conflicts=True)) с увеличением version.
+
+Весь импорт — одна транзакция: если хоть одна строка с ошибкой, ничего
+не записывается, а в ответе — отчёт по строкам (номер строки файла и
+ошибки по колонкам). ?dry_run=1 — только проверка, без записи.
+"""
+import csv
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import Category, Customer, Menu
+from .table_versions import bump_table_version
+
+try:
+    from openpyxl import load_workbook
+except Exception:
+    load_workbook = None
+
+
+CHUNK_SIZE = 2000
+MAX_ERRORS = 1000
+
+FORMATS = ("csv", "xlsx")
+
+
+class ImportSpec:
+    """
+    fields — колонки, которые можно загрузить; required — обязательные
+    в заголовке; foreign — {колонка: модель} для внешних ключей (проверяются
+    по множеству id, без запроса на каждую строку).
+    """
+
+    def __init__(self, model, fields, required, foreign=None):
+        self.model = model
+        self.fields = fields
+        self.required = required
+        self.foreign = foreign or {}
+
+    def model_field(self, name):
+        return self.model._meta.get_field(name)
+
+    def clean(self, name, value, known):
+        """Значение ячейки -> значение поля модели; ValidationError при ошибке."""
+        if isinstance(value, str):
+            value = value.strip()
+        field = self.model_field(name)
+        if value in ("", None):
+            if not field.blank:
+                raise ValidationError("Обязательное поле")
+            return None if field.null else field.get_default()
+
+        if name in self.foreign:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValidationError("Ожидается id")
+            if value not in known[name]:
+                raise ValidationError(f"Нет записи с id {value}")
+            return value
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # целые из XLSX приходят float, а телефону не нужен хвост ".0"
+        return field.clean(value, None)
+
+
+MENU = ImportSpec(
+    Menu,
+    fields=["id", "title", "group", "price", "description"],
+    required=["title"],
+    foreign={"group": Category},
+)
+
+CUSTOMERS = ImportSpec(
+    Customer,
+    fields=["id", "name", "phone", "email"],
+    required=["name"],
+)
+
+
+def _csv_rows(file):
+    yield from csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+
+def _xlsx_rows(file):
+    # read_only: строки разбираются по мере чтения, лист целиком в память не грузится
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def read_rows(file, fmt):
+    return _csv_rows(file) if fmt == "csv" else _xlsx_rows(file)
+
+
+class Importer:
+    def __init__(self, spec, header, dry_run=False):
+        self.spec = spec
+        self.dry_run = dry_run
+        self.header = [str(h).strip() if h is not None else "" for h in header]
+        unknown = [h for h in self.header if h and h not in spec.fields]
+        missing = [f for f in spec.required if f not in self.header]
+        if unknown or missing:
+            parts = []
+            if unknown:
+                parts.append(f"неизвестные колонки: {', '.join(unknown)}")
+            if missing:
+                parts.append(f"нет обязательных колонок: {', '.join(missing)}")
+            raise ValueError(f"Заголовок файла: {'; '.join(parts)}. Доступны: {', '.join(spec.fields)}")
+
+        self.columns = [(i, h) for i, h in enumerate(self.header) if h and h != "id"]
+        self.id_index = self.header.index("id") if "id" in self.header else None
+        self.known = {
+            name: set(model._default_manager.values_list("id", flat=True))
+            for name, model in spec.foreign.items() if name in self.header
+        }
+        self.seen = set()
+        self.created = self.updated = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"row": line, "errors": errors})
+
+    def parse(self, line, row):
+        """Строка файла -> (id или None, {поле: значение}) или None при ошибке."""
+        row = list(row) + [None] * (len(self.header) - len(row))
+        errors = {}
+        pk = None
+        if self.id_index is not None and row[self.id_index] not in ("", None):
+            try:
+                pk = int(row[self.id_index])
+            except (TypeError, ValueError):
+                errors["id"] = ["Ожидается целое число"]
+            else:
+                if pk in self.seen:
+                    errors["id"] = ["id повторяется в файле"]
+                self.seen.add(pk)
+
+        values = {}
+        for i, name in self.columns:
+            try:
+                values[name] = self.spec.clean(name, row[i], self.known)
+            except ValidationError as e:
+                errors[name] = e.messages
+
+        if errors:
+            self.error(line, errors)
+            return None
+        return pk, values
+
+    def write(self, chunk):
+        model = self.spec.model
+        attname = {name: model._meta.get_field(name).attname for _, name in self.columns}
+
+        versions = dict(
+            model._default_manager.filter(id__in=[pk for _, pk, _ in chunk if pk is not None])
+            .values_list("id", "version")
+        )
+        create, update = [], []
+        for line, pk, values in chunk:
+            fields = {attname[name]: value for name, value in values.items()}
+            if pk is None:
+                create.append(model(**fields))
+            elif pk not in versions:
+                self.error(line, {"id": [f"Нет записи с id {pk}"]})
+            else:
+                update.append(model(id=pk, version=versions[pk] + 1, **fields))
+
+        if self.error_count or self.dry_run:
+            # транзакция всё равно откатится — дальше только проверка
+            self.created += len(create)
+            self.updated += len(update)
+            return
+        if create:
+            model._default_manager.bulk_create(create, batch_size=CHUNK_SIZE)
+            self.created += len(create)
+        if update:
+            model._default_manager.bulk_create(
+                update,
+                batch_size=CHUNK_SIZE,
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=[attname[name] for _, name in self.columns] + ["version"],
+            )
+            self.updated += len(update)
+
+    def run(self, rows):
+        chunk = []
+        for line, row in enumerate(rows, start=2):
+            if not any(v not in ("", None) for v in row):
+                continue  # пустые строки (часто в конце XLSX)
+            parsed = self.parse(line, row)
+            if parsed is not None:
+                chunk.append((line, *parsed))
+            if len(chunk) >= CHUNK_SIZE:
+                self.write(chunk)
+                chunk = []
+        if chunk:
+            self.write(chunk)
+
+    def report(self):
+        """При dry_run created/updated — сколько было бы записано."""
+        return {
+            "created": 0 if self.error_count else self.created,
+            "updated": 0 if self.error_count else self.updated,
+            "dry_run": self.dry_run,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def run_import(spec, file, fmt, dry_run=False):
+    """-> (ответ, статус)."""
+    rows = read_rows(file, fmt)
+    header = next(rows, None)
+    if header is None:
+        return {"detail": "Пустой файл"}, 400
+    try:
+        importer = Importer(spec, header, dry_run)
+    except ValueError as e:
+        return {"detail": str(e)}, 400
+
+    with transaction.atomic():
+        importer.run(rows)
+        if importer.error_count or dry_run:
+            transaction.set_rollback(True)
+        else:
+            transaction.on_commit(lambda: bump_table_version(spec.model))
+
+    return importer.report(), 400 if importer.error_count else 200
+
+
+class ImportMixin:
+    """/import/ для ModelViewSet по описанию import_spec (см. модуль)."""
+
+    import_spec = None
+
+    @action(
+        detail=False, url_path="import", methods=["POST"],
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def import_file(self, request, *args, **kwargs):
+        file = request.FILES.get("file")
+        if file is None:
+            return Response({"detail": "Нужен файл в поле file"}, status=400)
+
+        ext = os.path.splitext(file.name)[1].lstrip(".").lower()
+        fmt = request.query_params.get("type") or ext
+        if fmt not in FORMATS:
+            return Response({"detail": f"Неизвестный формат: {fmt}. Доступны: {', '.join(FORMATS)}"}, status=400)
+        if fmt == "xlsx" and load_workbook is None:
+            return Response({"detail": "openpyxl не установлен в этом окружении"}, status=500)
+
+        dry_run = request.query_params.get("dry_run") in ("1", "true")
+        data, status = run_import(self.import_spec, file, fmt, dry_run)
+        return Response(data, status=status)
@@ -0,0 +1,337 @@
+"""
+Нагрузочный тест без внешних сервисов: asyncio + минимальный HTTP/1.1 клиент.
+Каждый «кассир» логинится через /api/user/csrf/ и /api/user/login/ и
+дальше гоняет смесь сценариев, пока не кончится время.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from http.cookies import SimpleCookie
+
+
+SCENARIOS = ("browse", "order", "item", "stats")
+DEFAULT_MIX = {"browse": 50, "order": 15, "item": 30, "stats": 5}
+LOGIN_ATTEMPTS = 8
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Пустая смесь сценариев")
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class HttpClient:
+    """Одно keep-alive соединение и свои cookies — как у одного браузера."""
+
+    def __init__(self, host, port, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, data=None, headers=None):
+        # POST повторять можно только с Idempotency-Key: иначе запрос, который
+        # сервер успел выполнить до обрыва, создаст второй заказ
+        retry = method in IDEMPOTENT_METHODS or "Idempotency-Key" in (headers or {})
+        for attempt in (1, 2):
+            if self.writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(
+                    self._request(method, path, data, headers), timeout=self.timeout
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # сервер закрыл keep-alive соединение — переподключаемся один раз
+                await self.close()
+                if attempt == 2 or not retry:
+                    raise
+            except BaseException:
+                # таймаут, отмена или ошибка разбора: ответ мог остаться
+                # недочитанным, и следующий запрос прочёл бы его как свой
+                await self.close()
+                raise
+
+    async def _request(self, method, path, data, headers):
+        body = b""
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Accept: application/json",
+            "Connection: keep-alive",
+        ]
+        if data is not None:
+            body = json.dumps(data).encode()
+            lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(body)}")
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if "csrftoken" in self.cookies and method not in ("GET", "HEAD"):
+            lines.append(f"X-CSRFToken: {self.cookies['csrftoken']}")
+            lines.append(f"Referer: http://{self.host}:{self.port}/")
+        for k, v in (headers or {}).items():
+            lines.append(f"{k}: {v}")
+
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("соединение закрыто")
+        status = int(status_line.split()[1])
+
+        resp_headers = defaultdict(list)
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers[name.strip().lower()].append(value.strip())
+
+        for cookie in resp_headers.get("set-cookie", []):
+            parsed = SimpleCookie()
+            parsed.load(cookie)
+            for key, morsel in parsed.items():
+                self.cookies[key] = morsel.value
+
+        if "chunked" in ",".join(resp_headers.get("transfer-encoding", [])):
+            content = bytearray()
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                content += await self.reader.readexactly(size)
+                await self.reader.readline()
+            content = bytes(content)
+        elif "content-length" in resp_headers:
+            content = await self.reader.readexactly(int(resp_headers["content-length"][0]))
+        else:
+            content = await self.reader.read()
+            await self.close()
+
+        if "close" in ",".join(resp_headers.get("connection", [])).lower():
+            await self.close()
+
+        return status, content
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def record(self, name, elapsed, ok, detail=""):
+        self.latencies[name].append(elapsed)
+        if not ok:
+            self.errors[name] += 1
+            if len(self.error_samples[name]) < 5:
+                self.error_samples[name].append(detail)
+
+    def report(self, duration):
+        total = sum(len(v) for v in self.latencies.values())
+        errors = sum(self.errors.values())
+        result = {
+            "duration_s": round(duration, 2),
+            "requests": total,
+            "throughput_rps": round(total / duration, 1) if duration else 0,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "scenarios": {},
+        }
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            result["scenarios"][name] = {
+                "requests": len(values),
+                "rps": round(len(values) / duration, 1) if duration else 0,
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                "errors": self.errors[name],
+                "error_samples": self.error_samples[name],
+            }
+        return result
+
+
+class Cashier:
+    def __init__(self, runner, index):
+        self.runner = runner
+        self.rnd = random.Random(runner.seed + index)
+        self.http = HttpClient(runner.host, runner.port)
+        self.orders = []
+        self.last_status = None
+
+    async def call(self, name, method, path, data=None, expect=(200, 201), headers=None):
+        start = time.perf_counter()
+        self.last_status = None
+        try:
+            status, body = await self.http.request(method, path, data, headers)
+        except Exception as e:
+            self.runner.stats.record(name, time.perf_counter() - start, False, repr(e))
+            return None
+        self.last_status = status
+        ok = status in expect
+        self.runner.stats.record(name, time.perf_counter() - start, ok, f"{method} {path}: HTTP {status}")
+        if not ok:
+            return None
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            return None
+
+    async def login(self):
+        await self.call("login", "GET", "/api/user/csrf/")
+        delay = 1.0
+        for _ in range(LOGIN_ATTEMPTS):
+            data = await self.call(
+                "login", "POST", "/api/user/login/",
+                {"username": self.runner.username, "password": self.runner.password},
+                expect=(200, 429),
+            )
+            if self.last_status != 429:
+                return bool(data and data.get("success"))
+            # все кассиры входят с одного IP и упираются в LoginThrottle
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+        return False
+
+    def idempotency_key(self):
+        # повтор после обрыва соединения вернёт сохранённый ответ (menu/idempotency.py)
+        return {"Idempotency-Key": uuid.uuid4().hex}
+
+    async def browse(self):
+        await self.call("browse", "GET", "/api/categories/")
+        await self.call("browse", "GET", "/api/menu/")
+
+    async def order(self):
+        customer = self.rnd.choice(self.runner.customers) if self.runner.customers else None
+        data = await self.call(
+            "order", "POST", "/api/orders/", {"customer": customer, "status": "NEW"},
+            headers=self.idempotency_key(),
+        )
+        if data and "id" in data:
+            self.orders.append(data["id"])
+            del self.orders[:-20]
+
+    async def item(self):
+        if not self.orders:
+            await self.order()
+        if not self.orders or not self.runner.menus:
+            return
+        await self.call("item", "POST", "/api/order-items/", {
+            "order": self.rnd.choice(self.orders),
+            "menu": self.rnd.choice(self.runner.menus),
+            "qty": self.rnd.randint(1, 3),
+        }, headers=self.idempotency_key())
+
+    async def stats(self):
+        await self.call("stats", "GET", "/api/orders/stats/")
+        await self.call("stats", "GET", "/api/menu/stats/")
+
+    async def run(self, deadline):
+        """Сценарии до deadline; вход — заранее, в LoadTest.login_all()."""
+        try:
+            names = list(self.runner.mix)
+            weights = [self.runner.mix[n] for n in names]
+            while time.monotonic() < deadline:
+                scenario = self.rnd.choices(names, weights)[0]
+                await getattr(self, scenario)()
+                if self.runner.think_time:
+                    await asyncio.sleep(self.rnd.expovariate(1 / self.runner.think_time))
+        finally:
+            await self.http.close()
+
+
+class LoadTest:
+    def __init__(self, host, port, username, password, cashiers=10, duration=30,
+                 mix=None, think_time=0.0, seed=1):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.cashiers = cashiers
+        self.duration = duration
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.think_time = think_time
+        self.seed = seed
+        self.stats = Stats()
+        self.menus = []
+        self.customers = []
+
+    async def prepare(self):
+        """Один раз забираем id позиций меню и клиентов для сценариев."""
+        probe = Cashier(self, -1)
+        try:
+            if not await probe.login():
+                raise RuntimeError("Не удалось войти: проверьте логин и пароль")
+            menus = await probe.call("prepare", "GET", "/api/menu/") or []
+            customers = await probe.call("prepare", "GET", "/api/customers/") or []
+        finally:
+            await probe.http.close()
+        self.menus = [m["id"] for m in menus]
+        self.customers = [c["id"] for c in customers]
+        self.stats = Stats()
+
+    async def login_all(self):
+        """
+        Вход всех кассиров до старта часов: LoginThrottle пропускает с одного
+        IP лишь несколько входов подряд, и ожидание в backoff иначе съело бы
+        окно теста. -> кассиры, которым удалось войти.
+        """
+        cashiers = [Cashier(self, i) for i in range(self.cashiers)]
+        results = await asyncio.gather(*(c.login() for c in cashiers))
+        for cashier, ok in zip(cashiers, results):
+            if not ok:
+                await cashier.http.close()
+        self.stats = Stats()
+        return [c for c, ok in zip(cashiers, results) if ok]
+
+    async def run(self):
+        await self.prepare()
+        cashiers = await self.login_all()
+        if not cashiers:
+            raise RuntimeError("Ни один кассир не смог войти")
+        start = time.monotonic()
+        deadline = start + self.duration
+        await asyncio.gather(*(c.run(deadline) for c in cashiers))
+        report = self.stats.report(time.monotonic() - start)
+        report["cashiers"] = len(cashiers)
+        report["cashiers_requested"] = self.cashiers
+        report["mix"] = self.mix
+        return report
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from menu import archive
+
+
+class Command(BaseCommand):
+    help = "Переносит завершённые и отменённые заказы старше N дней в архивные таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS, help="Старше скольких дней")
+        parser.add_argument("--batch", type=int, default=archive.BATCH_SIZE, help="Заказов в транзакции")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = archive.candidates(options["days"]).count()
+            self.stdout.write(f"К переносу заказов: {count}")
+            return
+
+        start = time.perf_counter()
+        orders, items = archive.archive_orders(options["days"], options["batch"])
+        self.stdout.write(self.style.SUCCESS(
+            f"В архиве заказов: {orders}, позиций: {items}, за {time.perf_counter() - start:.1f} с"
+        ))
@@ -0,0 +1,147 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from menu.bench import benchmark_database, measure, seed_dataset
+from menu.models import Category, Menu, Customer, Order, OrderItem
+
+
+# число позиций заказов для каждого масштаба
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+ITEMS_PER_ORDER = 3
+
+# префикс API -> (модель, параметры фильтра)
+VIEWSETS = {
+    "categories": (Category, {"name": "1"}),
+    "menu": (Menu, {"price_min": "100", "price_max": "300"}),
+    "customers": (Customer, {"name": "Клиент 1"}),
+    "orders": (Order, {"status": "DONE"}),
+    "order-items": (OrderItem, {"qty_min": "2"}),
+}
+
+ENDPOINTS = ["list", "retrieve", "filter", "stats", "export-excel", "export-word"]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return ""
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк REST API на воспроизводимом наборе данных; результат пишется в JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="10k")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--viewsets", default=",".join(VIEWSETS), help="Через запятую")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Через запятую")
+        parser.add_argument("--output", help="Куда записать JSON (по умолчанию stdout)")
+        parser.add_argument("--compare", help="JSON прошлого прогона: вывести изменение медиан")
+
+    def handle(self, *args, **options):
+        viewsets = [v for v in options["viewsets"].split(",") if v]
+        endpoints = [e for e in options["endpoints"].split(",") if e]
+        unknown = (set(viewsets) - set(VIEWSETS)) | (set(endpoints) - set(ENDPOINTS))
+        if unknown:
+            raise CommandError(f"Неизвестные значения: {', '.join(sorted(unknown))}")
+
+        items = SCALES[options["scale"]]
+        report = {
+            "meta": {
+                "scale": options["scale"],
+                "order_items": items,
+                "seed": options["seed"],
+                "repeat": options["repeat"],
+                "commit": git_revision(),
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "results": {},
+        }
+
+        # лимиты на экспорт мешают повторным замерам
+        with benchmark_database(), override_settings(THROTTLE_BUCKETS={}):
+            self.stderr.write(f"Заполняю базу: {items} позиций заказов...")
+            seed_dataset(items // ITEMS_PER_ORDER, items_per_order=ITEMS_PER_ORDER, seed=options["seed"])
+
+            user = User.objects.create_user("bench", password="bench", is_staff=True)
+            client = APIClient()
+            client.force_authenticate(user)
+
+            for prefix in viewsets:
+                model, filters = VIEWSETS[prefix]
+                pk = model.objects.order_by("id").values_list("id", flat=True).first()
+                urls = {
+                    "list": (f"/api/{prefix}/", {}),
+                    "retrieve": (f"/api/{prefix}/{pk}/", {}),
+                    "filter": (f"/api/{prefix}/", filters),
+                    "stats": (f"/api/{prefix}/stats/", {}),
+                    "export-excel": (f"/api/{prefix}/export-excel/", {}),
+                    "export-word": (f"/api/{prefix}/export-word/", {}),
+                }
+
+                results = report["results"][prefix] = {}
+                for name in endpoints:
+                    url, params = urls[name]
+                    self.stderr.write(f"  {prefix} {name}")
+                    results[name] = self.run_one(client, url, params, options["repeat"])
+
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
+
+        if options["compare"]:
+            self.compare(options["compare"], report)
+
+    def run_one(self, client, url, params, repeat):
+        size = 0
+
+        def call():
+            nonlocal size
+            r = client.get(url, params)
+            if r.status_code != 200:
+                raise CommandError(f"{url}: HTTP {r.status_code}")
+            content = b"".join(r.streaming_content) if r.streaming else r.content
+            size = len(content)
+
+        result = measure(call, repeat=repeat)
+        result["bytes"] = size
+        return result
+
+    def compare(self, path, report):
+        with open(path, encoding="utf-8") as f:
+            old = json.load(f)
+
+        self.stdout.write(f"\nСравнение с {path} ({old['meta'].get('commit') or '?'}):")
+        for prefix, endpoints in report["results"].items():
+            for name, new in endpoints.items():
+                prev = old.get("results", {}).get(prefix, {}).get(name)
+                if not prev:
+                    continue
+                ratio = new["median_ms"] / prev["median_ms"] if prev["median_ms"] else 0
+                flag = "  <-- медленнее" if ratio > 1.2 else ""
+                self.stdout.write(
+                    f"  {prefix:<12} {name:<13} {prev['median_ms']:>10.1f} -> {new['median_ms']:>10.1f} мс "
+                    f"(x{ratio:.2f}), запросов {prev['queries']} -> {new['queries']}{flag}"
+                )
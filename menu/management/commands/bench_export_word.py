@@ -0,0 +1,92 @@
+import io
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.bench import benchmark_database, seed_dataset
+from menu.docx import write_docx
+from menu.models import OrderItem
+
+
+HEADERS = ["id", "order", "menu", "qty"]
+
+
+def export_python_docx(out):
+    """Прежний путь OrderItemViewSet.export_word: объект модели и add_row() на строку."""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading("Позиции заказов", level=1)
+    table = doc.add_table(rows=1, cols=len(HEADERS))
+    for cell, name in zip(table.rows[0].cells, HEADERS):
+        cell.text = name
+    for it in OrderItem.objects.order_by("-id"):
+        row = table.add_row().cells
+        row[0].text = str(it.id)
+        row[1].text = str(it.order_id or "")
+        row[2].text = str(it.menu_id or "")
+        row[3].text = str(it.qty)
+    doc.save(out)
+
+
+def export_stream(out):
+    rows = OrderItem.objects.order_by("-id").values_list("id", "order_id", "menu_id", "qty")
+    write_docx(out, "Позиции заказов", HEADERS, rows.iterator(chunk_size=2000))
+
+
+WRITERS = {
+    "python-docx": export_python_docx,
+    "stream": export_stream,
+}
+
+
+class Command(BaseCommand):
+    help = "Сравнивает выгрузку позиций заказов в Word: python-docx и потоковая запись XML"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--writers", default=",".join(WRITERS), help="Через запятую")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        writers = [w for w in options["writers"].split(",") if w]
+        unknown = set(writers) - set(WRITERS)
+        if unknown:
+            raise CommandError(f"Неизвестные значения: {', '.join(sorted(unknown))}")
+
+        report = {}
+        with benchmark_database():
+            self.stderr.write(f"Заполняю базу: {options['rows']} позиций заказов...")
+            seed_dataset(options["rows"] // 3, items_per_order=3, seed=options["seed"])
+            rows = OrderItem.objects.count()
+
+            for name in writers:
+                self.stderr.write(f"  {name}")
+                out = io.BytesIO()
+                tracemalloc.start()
+                start = time.perf_counter()
+                WRITERS[name](out)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                report[name] = {
+                    "rows": rows,
+                    "seconds": round(elapsed, 3),
+                    "rows_per_second": round(rows / elapsed) if elapsed else 0,
+                    # tracemalloc видит только память Python: дерево lxml внутри
+                    # python-docx сюда не попадает, так что его пик занижен.
+                    # Размер самого файла вычитаем — он одинаково копится в BytesIO.
+                    "peak_mb": round((peak - out.getbuffer().nbytes) / 2**20, 2),
+                    "bytes": out.getbuffer().nbytes,
+                }
+
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        if "python-docx" in report and "stream" in report:
+            old, new = report["python-docx"], report["stream"]
+            self.stdout.write(
+                f"\nstream быстрее в x{new['rows_per_second'] / max(old['rows_per_second'], 1):.1f}, "
+                f"пик памяти {old['peak_mb']} -> {new['peak_mb']} МБ"
+            )
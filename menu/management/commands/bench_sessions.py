@@ -0,0 +1,49 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from menu.bench import benchmark_database, measure
+
+
+ENDPOINTS = ["/api/user/info/", "/api/categories/"]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает число SQL-запросов и время на запрос для разных SESSION_MODE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        report = {}
+        with benchmark_database():
+            User.objects.create_user("bench", password="bench", is_staff=True)
+
+            for mode, engine in settings.SESSION_ENGINES.items():
+                with override_settings(SESSION_MODE=mode, SESSION_ENGINE=engine):
+                    cache.clear()
+                    client = Client()
+                    client.login(username="bench", password="bench")
+
+                    report[mode] = {}
+                    for url in ENDPOINTS:
+                        def call():
+                            r = client.get(url)
+                            assert r.status_code == 200, r.status_code
+
+                        report[mode][url] = measure(call, repeat=options["repeat"])
+
+        baseline = report["db"]
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write("\nЗапросов к БД на один запрос (db -> режим):")
+        for mode, endpoints in report.items():
+            for url, r in endpoints.items():
+                saved = baseline[url]["queries"] - r["queries"]
+                self.stdout.write(
+                    f"  {mode:<15} {url:<20} {r['queries']:>3} запр., {r['median_ms']:>7.2f} мс "
+                    f"(экономия {saved} запр.)"
+                )
@@ -0,0 +1,46 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from menu.bench import benchmark_database, measure, seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Замеряет рендер главной страницы (ShowCafeView) на большом наборе заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            self.stderr.write(f"Заполняю базу: {options['orders']} заказов...")
+            seed_dataset(options["orders"], seed=options["seed"])
+
+            client = Client()
+
+            def cold():
+                cache.clear()
+                r = client.get("/")
+                assert r.status_code == 200, r.status_code
+
+            def warm():
+                r = client.get("/")
+                assert r.status_code == 200, r.status_code
+
+            def deep_page():
+                cache.clear()
+                r = client.get("/", {"orders_page": 1000, "items_page": 1000})
+                assert r.status_code == 200, r.status_code
+
+            result = {
+                "orders": options["orders"],
+                "cold": measure(cold, repeat=options["repeat"]),
+                "warm": measure(warm, repeat=options["repeat"]),
+                "deep_page_cold": measure(deep_page, repeat=options["repeat"]),
+            }
+
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
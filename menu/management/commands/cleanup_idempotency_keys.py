@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from menu import idempotency
+
+
+class Command(BaseCommand):
+    help = "Удаляет истёкшие ключи Idempotency-Key пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = idempotency.expire(batch_size=options["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Удалено истёкших ключей: {deleted}"))
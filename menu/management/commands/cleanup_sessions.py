@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Удаляет истёкшие сессии из django_session пачками, не блокируя таблицу надолго"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=5000)
+        parser.add_argument("--pause", type=float, default=0.0, help="Пауза между пачками, с")
+
+    def handle(self, *args, **options):
+        if settings.SESSION_MODE in ("cache", "signed_cookies"):
+            self.stdout.write(f"SESSION_MODE = {settings.SESSION_MODE!r}: строк в БД нет, чистить нечего.")
+            return
+
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list("session_key", flat=True)[:options["batch"]]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"Удалено истёкших сессий: {deleted}"))
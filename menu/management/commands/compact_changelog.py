@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from menu import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        "Сжимает журнал изменений: оставляет последнюю запись по каждому объекту "
+        "и удаляет старые записи об удалении"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before", type=int,
+            help="Не трогать записи с seq >= before (ещё не прочитанные потребителями)",
+        )
+        parser.add_argument("--tombstone-days", type=int, default=settings.CHANGELOG_TOMBSTONE_DAYS)
+
+    def handle(self, *args, **options):
+        compacted = changelog.compact(before=options["before"])
+        expired = changelog.expire_tombstones(options["tombstone_days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено перекрытых записей: {compacted}, старых удалений: {expired}"
+        ))
@@ -0,0 +1,112 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from menu.storage import PICTURE_FIELDS, get_media_storage, hashed_name, is_hashed_name
+
+
+class Command(BaseCommand):
+    help = "Переименовывает загруженные картинки по SHA-256 и удаляет дубликаты"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+        parser.add_argument(
+            "--delete-orphans",
+            action="store_true",
+            help="Удалить файлы в папках загрузок, на которые нет ссылок",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        storage = get_media_storage()
+
+        # имя файла -> имя по хэшу; каждый файл хэшируется один раз
+        targets = {}
+        renamed = merged = missing = 0
+        saved_bytes = 0
+        upload_dirs = set()
+
+        for label, field in PICTURE_FIELDS:
+            model = apps.get_model(label)
+            upload_dirs.add(model._meta.get_field(field).upload_to)
+
+            names = (
+                model._default_manager.exclude(**{field: ""})
+                .exclude(**{f"{field}__isnull": True})
+                .values_list(field, flat=True)
+                .distinct()
+            )
+            for name in names.iterator():
+                if name in targets or is_hashed_name(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f"Нет файла: {name}")
+                    continue
+
+                with storage.open(name, "rb") as f:
+                    target = hashed_name(name, f)
+                targets[name] = target
+
+        for name, target in targets.items():
+            if storage.exists(target):
+                merged += 1
+                saved_bytes += storage.size(name)
+                self.stdout.write(f"{name} -> {target} (дубликат)")
+            else:
+                renamed += 1
+                self.stdout.write(f"{name} -> {target}")
+
+            if dry_run:
+                continue
+
+            if not storage.exists(target):
+                with storage.open(name, "rb") as f:
+                    storage.save(target, f)
+            self.repoint(name, target)
+            storage.delete(name)
+
+        orphans = 0
+        if options["delete_orphans"]:
+            orphans, orphan_bytes = self.delete_orphans(storage, upload_dirs, dry_run)
+            saved_bytes += orphan_bytes
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Переименовано: {renamed}, объединено дубликатов: {merged}, "
+                f"удалено лишних файлов: {orphans}, нет на диске: {missing}, "
+                f"освобождено байт: {saved_bytes}"
+            )
+        )
+
+    def repoint(self, name, target):
+        for label, field in PICTURE_FIELDS:
+            model = apps.get_model(label)
+            qs = model._default_manager.filter(**{field: name})
+            for pk, variants in qs.values_list("pk", f"{field}_variants"):
+                if variants and variants.get("source") == name:
+                    variants["source"] = target
+                    model._default_manager.filter(pk=pk).update(**{f"{field}_variants": variants})
+            qs.update(**{field: target})
+
+    def delete_orphans(self, storage, upload_dirs, dry_run):
+        referenced = set()
+        for label, field in PICTURE_FIELDS:
+            model = apps.get_model(label)
+            referenced.update(model._default_manager.values_list(field, flat=True))
+
+        count = size = 0
+        for directory in sorted(upload_dirs):
+            if not storage.exists(directory):
+                continue
+            _, files = storage.listdir(directory)
+            for filename in files:
+                name = f"{directory}/{filename}"
+                if name in referenced:
+                    continue
+                count += 1
+                size += storage.size(name)
+                self.stdout.write(f"Лишний файл: {name}")
+                if not dry_run:
+                    storage.delete(name)
+        return count, size
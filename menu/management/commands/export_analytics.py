@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from menu import columnar
+from menu.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = "Колоночная выгрузка позиций заказов для BI (Parquet/Arrow при наличии pyarrow, иначе .npz)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Путь к файлу")
+        parser.add_argument("--type", choices=sorted(columnar.FORMATS), help="По умолчанию parquet или npz")
+        parser.add_argument("--chunk-size", type=int, default=columnar.CHUNK_SIZE)
+        parser.add_argument("--after", type=int, default=0, help="Только позиции с id больше указанного")
+
+    def handle(self, *args, **options):
+        fmt = options["type"] or columnar.default_format()
+        if columnar.numpy is None:
+            raise CommandError("numpy не установлен в этом окружении")
+        if fmt != "npz" and columnar.pyarrow is None:
+            raise CommandError("pyarrow не установлен в этом окружении")
+
+        qs = OrderItem.objects.filter(id__gt=options["after"])
+        start = time.perf_counter()
+        with open(options["output"], "wb") as out:
+            rows = columnar.write(qs, out, fmt, options["chunk_size"])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} строк -> {options['output']} ({fmt}) за {elapsed:.1f} с"
+        ))
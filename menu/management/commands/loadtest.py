@@ -0,0 +1,107 @@
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.loadtest import DEFAULT_MIX, LoadTest, parse_mix
+
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест API: N кассиров, смесь сценариев, p50/p95/p99 и доля ошибок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument("--cashiers", type=int, default=10, help="Число одновременных кассиров")
+        parser.add_argument("--duration", type=float, default=30, help="Длительность, с")
+        parser.add_argument(
+            "--mix",
+            default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+            help="Веса сценариев: browse=50,order=15,item=30,stats=5",
+        )
+        parser.add_argument("--think-time", type=float, default=0.0, help="Средняя пауза кассира, с")
+        parser.add_argument("--username", default="loadtest")
+        parser.add_argument("--password", default="loadtest")
+        parser.add_argument("--create-user", action="store_true", help="Создать staff-пользователя для теста")
+        parser.add_argument("--start-server", action="store_true", help="Запустить runserver на время теста")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--json", dest="json_path", help="Сохранить отчёт в JSON")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["create_user"]:
+            user, _ = User.objects.get_or_create(username=options["username"], defaults={"is_staff": True})
+            user.set_password(options["password"])
+            user.save()
+
+        server = None
+        if options["start_server"]:
+            server = subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / "manage.py"), "runserver",
+                 f"{options['host']}:{options['port']}", "--noreload"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            if not wait_for_port(options["host"], options["port"], timeout=30):
+                server.terminate()
+                raise CommandError("Сервер не поднялся за 30 секунд")
+
+        test = LoadTest(
+            options["host"],
+            options["port"],
+            options["username"],
+            options["password"],
+            cashiers=options["cashiers"],
+            duration=options["duration"],
+            mix=mix,
+            think_time=options["think_time"],
+            seed=options["seed"],
+        )
+        try:
+            report = asyncio.run(test.run())
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        self.print_report(report)
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def print_report(self, r):
+        self.stdout.write(
+            f"Кассиров: {r['cashiers']} из {r['cashiers_requested']}, время: {r['duration_s']} с, запросов: {r['requests']}, "
+            f"{r['throughput_rps']} rps, ошибок: {r['error_rate'] * 100:.2f}%"
+        )
+        self.stdout.write(f"{'сценарий':<10} {'n':>7} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'ошибки':>7}")
+        for name, s in r["scenarios"].items():
+            self.stdout.write(
+                f"{name:<10} {s['requests']:>7} {s['rps']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} "
+                f"{s['p99_ms']:>8} {s['max_ms']:>8} {s['errors']:>7}"
+            )
+            for sample in s["error_samples"]:
+                self.stdout.write(f"    {sample}")
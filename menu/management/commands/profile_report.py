@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from menu.profiling import load_snapshots
+
+
+SORT_KEYS = {
+    "p95": lambda s: s.histograms["request_duration_seconds"].quantile(0.95),
+    "total": lambda s: s.histograms["request_duration_seconds"].sum,
+    "queries": lambda s: s.histograms["sql_queries"].quantile(0.95),
+    "sql": lambda s: s.histograms["sql_duration_seconds"].sum,
+    "duplicates": lambda s: s.duplicate_queries,
+    "size": lambda s: s.histograms["response_size_bytes"].quantile(0.95),
+}
+
+
+class Command(BaseCommand):
+    help = "Показывает самые медленные маршруты API по данным ProfilingMiddleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="p95")
+        parser.add_argument("--dir", default=str(settings.API_PROFILING_DIR))
+        parser.add_argument("--signatures", action="store_true", help="Показать SQL, похожие на N+1")
+
+    def handle(self, *args, **options):
+        routes = load_snapshots(options["dir"])
+        if not routes:
+            self.stdout.write(
+                "Метрик нет. Включите API_PROFILING и дождитесь сброса "
+                f"(каждые {settings.API_PROFILING_FLUSH_EVERY} запросов)."
+            )
+            return
+
+        key = SORT_KEYS[options["sort"]]
+        ranked = sorted(routes.items(), key=lambda kv: key(kv[1]), reverse=True)[:options["top"]]
+
+        header = f"{'маршрут':<40} {'n':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'SQL p95':>8} {'SQL мс':>8} {'дубли':>7} {'N+1':>5} {'KB p95':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for route, s in ranked:
+            latency = s.histograms["request_duration_seconds"]
+            sql_time = s.histograms["sql_duration_seconds"]
+            queries = s.histograms["sql_queries"]
+            size = s.histograms["response_size_bytes"]
+            avg_sql = sql_time.sum / sql_time.count * 1000 if sql_time.count else 0
+            self.stdout.write(
+                f"{route[:40]:<40} {latency.count:>7} "
+                f"{latency.quantile(0.5) * 1000:>8.1f} {latency.quantile(0.95) * 1000:>8.1f} "
+                f"{latency.quantile(0.99) * 1000:>8.1f} {queries.quantile(0.95):>8.1f} "
+                f"{avg_sql:>8.1f} {s.duplicate_queries:>7} {s.n_plus_one_requests:>5} "
+                f"{size.quantile(0.95) / 1024:>8.1f}"
+            )
+            if options["signatures"]:
+                for sql, count in s.signatures.most_common():
+                    self.stdout.write(f"    {count:>5} × {sql[:150]}")
@@ -0,0 +1,141 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import HASHED_NAME_RE
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    Разбирает один диапазон из заголовка Range.
+    Возвращает (start, end) включительно, None если заголовок надо
+    проигнорировать, и False если диапазон невыполним (416).
+    """
+    m = RANGE_RE.match(header.strip())
+    if not m:
+        # Несколько диапазонов или другие единицы — отдаём файл целиком.
+        return None
+
+    first, last = m.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def iter_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def media_etag(name, stat):
+    m = HASHED_NAME_RE.search(name)
+    if m:
+        return f'"{m.group(0)[:32]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def set_cache_headers(response, name, etag, stat):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Accept-Ranges"] = "bytes"
+    if HASHED_NAME_RE.search(name):
+        response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Отдача MEDIA_ROOT с ETag/304, Range и долгим кэшем для файлов
+    с хэшем в имени. При MEDIA_OFFLOAD сама передача файла уходит
+    во фронтовой сервер (X-Sendfile / X-Accel-Redirect).
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Файл не найден")
+    if not os.path.isfile(fullpath):
+        raise Http404("Файл не найден")
+
+    stat = os.stat(fullpath)
+    name = os.path.basename(fullpath)
+    etag = media_etag(name, stat)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return set_cache_headers(not_modified, name, etag, stat)
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    offload = settings.MEDIA_OFFLOAD
+    if offload:
+        # Range и отдачу байтов делает nginx/apache.
+        response = HttpResponse(content_type=content_type)
+        if offload == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        else:
+            response["X-Sendfile"] = fullpath
+        return set_cache_headers(response, name, etag, stat)
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header:
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range == etag:
+            byte_range = parse_range(range_header, stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return set_cache_headers(response, name, etag, stat)
+
+    if byte_range is None:
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_range(fullpath, start, length), status=206, content_type=content_type
+        )
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return set_cache_headers(response, name, etag, stat)
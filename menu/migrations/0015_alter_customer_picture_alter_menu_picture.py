@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:17
+
+import menu.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0014_customer_picture_variants_menu_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='picture',
+            field=models.ImageField(blank=True, null=True, storage=menu.storage.get_media_storage, upload_to='customers', verbose_name='Аватар'),
+        ),
+        migrations.AlterField(
+            model_name='menu',
+            name='picture',
+            field=models.ImageField(blank=True, null=True, storage=menu.storage.get_media_storage, upload_to='menus', verbose_name='Изображение'),
+        ),
+    ]
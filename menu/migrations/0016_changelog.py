@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0015_alter_customer_picture_alter_menu_picture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('action', models.CharField(choices=[('save', 'Создание/изменение'), ('delete', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Когда')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'indexes': [models.Index(fields=['model', 'id'], name='menu_change_model_9a7b8a_idx')],
+            },
+        ),
+    ]
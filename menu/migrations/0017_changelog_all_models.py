@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0016_changelog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['model', 'object_id'], name='menu_change_model_6d0cf4_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0017_changelog_all_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('menu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pairs', to='menu.menu', verbose_name='Позиция меню')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='menu.menu', verbose_name='Вместе с')),
+            ],
+            options={
+                'verbose_name': 'Пара позиций',
+                'verbose_name_plural': 'Пары позиций',
+                'indexes': [models.Index(fields=['menu', '-count'], name='menu_pair_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('menu', 'other'), name='menu_pair_unique')],
+            },
+        ),
+    ]
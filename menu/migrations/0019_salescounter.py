@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0018_menupair'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'День'), ('week', 'Неделя')], max_length=8, verbose_name='Период')),
+                ('start', models.DateField(verbose_name='Начало периода')),
+                ('kind', models.CharField(choices=[('menu', 'Позиция меню'), ('customer', 'Клиент')], max_length=16, verbose_name='Что считаем')),
+                ('key', models.BigIntegerField(verbose_name='ID')),
+                ('qty', models.IntegerField(default=0, verbose_name='Количество')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Счётчик продаж',
+                'verbose_name_plural': 'Счётчики продаж',
+                'indexes': [models.Index(fields=['kind', 'period', 'start', '-qty'], name='sales_counter_qty_idx'), models.Index(fields=['kind', 'period', 'start', '-revenue'], name='sales_counter_revenue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'period', 'start', 'key'), name='sales_counter_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0020_order_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('status', models.CharField(choices=[('NEW', 'Новый'), ('IN_PROGRESS', 'В работе'), ('DONE', 'Готов'), ('CANCELLED', 'Отменён')], max_length=20, verbose_name='Статус')),
+                ('version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='В архиве с')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='menu.customer', verbose_name='Клиент')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Заказ в архиве',
+                'verbose_name_plural': 'Заказы в архиве',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('qty', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('version', models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')),
+                ('menu', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='menu.menu', verbose_name='Позиция меню')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='menu.archivedorder', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Позиция заказа в архиве',
+                'verbose_name_plural': 'Позиции заказов в архиве',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at', 'id'], name='archived_order_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0022_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(default=0, verbose_name='Неполон до seq')),
+            ],
+            options={
+                'verbose_name': 'Граница журнала',
+                'verbose_name_plural': 'Граница журнала',
+            },
+        ),
+    ]
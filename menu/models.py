@@ -1,9 +1,36 @@
-from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+
+from .storage import get_media_storage
+
+
+class ChangeLoggedQuerySet(models.QuerySet):
+    """
+    Массовые операции, которые не шлют post_save: пишут в ChangeLog сами.
+    bulk_update() идёт через update(), а delete() отдельно не нужен —
+    при подключённых сигналах Django удаляет по одному объекту и шлёт post_delete.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            ChangeLog.log(self.model, [obj.pk for obj in objs if obj.pk is not None])
+        return objs
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            ChangeLog.log(self.model, ids)
+        return rows
+
 
 class Category(models.Model):
     name = models.TextField("Название")
 
+    objects = ChangeLoggedQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
@@ -24,7 +51,11 @@ class Menu(models.Model):
     )
     price = models.DecimalField("Цена", max_digits=10, decimal_places=2, default=0)
     description = models.TextField("Описание", blank=True, default="")
-    picture = models.ImageField("Изображение", null=True, blank=True, upload_to="menus")
+    picture = models.ImageField("Изображение", null=True, blank=True, upload_to="menus", storage=get_media_storage)
+    picture_variants = models.JSONField("Варианты изображения", default=dict, blank=True, editable=False)
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    objects = ChangeLoggedQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Позиция меню"
@@ -38,7 +69,11 @@ class Customer(models.Model):
     name = models.TextField("ФИО")
     phone = models.TextField("Телефон", blank=True, null=True)
     email = models.EmailField("Email", blank=True, null=True)
-    picture = models.ImageField("Аватар", null=True, blank=True, upload_to="customers")
+    picture = models.ImageField("Аватар", null=True, blank=True, upload_to="customers", storage=get_media_storage)
+    picture_variants = models.JSONField("Варианты изображения", default=dict, blank=True, editable=False)
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    objects = ChangeLoggedQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Клиент"
@@ -79,10 +114,18 @@ class Order(models.Model):
         blank=True,
     )
 
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    objects = ChangeLoggedQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ("-id",)
+        indexes = [
+            # диапазоны ?created_from/?created_to и лента /timeline/
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Заказ #{self.id}"
@@ -106,6 +149,9 @@ class OrderItem(models.Model):
     )
 
     qty = models.PositiveIntegerField("Количество", default=1)
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    objects = ChangeLoggedQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Позиция заказа"
@@ -136,4 +182,217 @@ class Profile(models.Model):
         verbose_name_plural = "Профили"
 
     def __str__(self) -> str:
-        return f"Профиль {self.user.username}"
\ No newline at end of file
+        return f"Профиль {self.user.username}"
+
+class ChangeLog(models.Model):
+    """
+    Журнал изменений (только добавление) для Category, Menu, Customer, Order
+    и OrderItem. id — номер изменения (seq): потребитель запоминает последний
+    и дальше получает только то, что поменялось.
+    """
+
+    ACTION_CHOICES = [
+        ("save", "Создание/изменение"),
+        ("delete", "Удаление"),
+    ]
+
+    model = models.CharField("Модель", max_length=32)
+    object_id = models.BigIntegerField("ID объекта")
+    action = models.CharField("Действие", max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField("Когда", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Изменение"
+        verbose_name_plural = "Журнал изменений"
+        indexes = [
+            models.Index(fields=["model", "id"]),
+            models.Index(fields=["model", "object_id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.id} {self.model} {self.object_id} {self.action}"
+
+    @classmethod
+    def log(cls, model, ids, action="save"):
+        name = model._meta.model_name
+        cls.objects.bulk_create(
+            [cls(model=name, object_id=pk, action=action) for pk in ids],
+            batch_size=1000,
+        )
+
+
+class ChangeLogHorizon(models.Model):
+    """
+    Одна строка: до какого seq включительно журнал уже неполон (удалены
+    записи об удалении). Дельта от более раннего seq потеряла бы удаления.
+    """
+
+    seq = models.BigIntegerField("Неполон до seq", default=0)
+
+    class Meta:
+        verbose_name = "Граница журнала"
+        verbose_name_plural = "Граница журнала"
+
+    def __str__(self) -> str:
+        return f"до #{self.seq}"
+
+
+class MenuPair(models.Model):
+    """
+    Разреженная матрица «позиция × позиция»: в скольких заказах встретились
+    обе. Хранится в обе стороны, а на диагонали (menu = other) — число
+    заказов с этой позицией. Ведётся menu/cooccurrence.py.
+    """
+
+    menu = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name="pairs", verbose_name="Позиция меню")
+    other = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name="+", verbose_name="Вместе с")
+    count = models.IntegerField("Заказов", default=0)
+
+    class Meta:
+        verbose_name = "Пара позиций"
+        verbose_name_plural = "Пары позиций"
+        constraints = [
+            models.UniqueConstraint(fields=["menu", "other"], name="menu_pair_unique"),
+        ]
+        indexes = [models.Index(fields=["menu", "-count"], name="menu_pair_top_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.menu_id} + {self.other_id}: {self.count}"
+
+
+class SalesCounter(models.Model):
+    """
+    Продажи за день/неделю по позиции меню или клиенту — только по готовым
+    (DONE) заказам. Ведётся инкрементально menu/counters.py.
+    """
+
+    PERIOD_CHOICES = [
+        ("day", "День"),
+        ("week", "Неделя"),
+    ]
+    KIND_CHOICES = [
+        ("menu", "Позиция меню"),
+        ("customer", "Клиент"),
+    ]
+
+    period = models.CharField("Период", max_length=8, choices=PERIOD_CHOICES)
+    start = models.DateField("Начало периода")
+    kind = models.CharField("Что считаем", max_length=16, choices=KIND_CHOICES)
+    key = models.BigIntegerField("ID")
+    qty = models.IntegerField("Количество", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField("Заказов", default=0)
+
+    class Meta:
+        verbose_name = "Счётчик продаж"
+        verbose_name_plural = "Счётчики продаж"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "period", "start", "key"], name="sales_counter_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["kind", "period", "start", "-qty"], name="sales_counter_qty_idx"),
+            models.Index(fields=["kind", "period", "start", "-revenue"], name="sales_counter_revenue_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.key} {self.period} {self.start}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Холодная копия завершённого (DONE/CANCELLED) заказа, перенесённого
+    manage.py archive_orders. id совпадает с прежним id заказа.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField("Создан")
+    status = models.CharField("Статус", max_length=20, choices=Order.STATUS_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Пользователь",
+        null=True,
+        blank=True,
+    )
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        verbose_name="Клиент",
+        null=True,
+        blank=True,
+    )
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+    archived_at = models.DateTimeField("В архиве с", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Заказ в архиве"
+        verbose_name_plural = "Заказы в архиве"
+        ordering = ("-id",)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="archived_order_created_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Заказ #{self.id} (архив)"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name="items",
+        verbose_name="Заказ",
+    )
+    menu = models.ForeignKey(
+        Menu,
+        on_delete=models.PROTECT,
+        related_name="+",
+        verbose_name="Позиция меню",
+        null=True,
+        blank=True,
+    )
+    qty = models.PositiveIntegerField("Количество", default=1)
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    class Meta:
+        verbose_name = "Позиция заказа в архиве"
+        verbose_name_plural = "Позиции заказов в архиве"
+
+    def __str__(self) -> str:
+        return f"{self.menu.title if self.menu else '—'} × {self.qty}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на create с заголовком Idempotency-Key: повтор запроса с тем же
+    ключом получает сохранённый ответ, а запись не выполняется ещё раз.
+    Живёт IDEMPOTENCY_TTL секунд, чистится manage.py cleanup_idempotency_keys.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Пользователь",
+    )
+    scope = models.CharField("Ресурс", max_length=64)
+    key = models.CharField("Ключ", max_length=255)
+    fingerprint = models.CharField("Хэш тела запроса", max_length=64)
+    # пусты, пока запрос выполняется (в той же транзакции, снаружи не видно)
+    status_code = models.PositiveSmallIntegerField("HTTP-статус", null=True)
+    response = models.JSONField("Ответ", encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField("Создан", auto_now_add=True)
+    expires_at = models.DateTimeField("Истекает", db_index=True)
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="idempotency_key_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.scope}: {self.key}"
@@ -1,5 +1,29 @@
+import time
+
+from django.conf import settings
 from rest_framework import permissions
 
+from .auth_cache import get_auth_context
+from .tokens import token_claims
+
+
+def grant_second_factor(request):
+    # Срок хранится в самой сессии: при SESSION_MODE = "signed_cookies"
+    # старую cookie можно подсунуть повторно, а срок внутри подписан.
+    request.session["second"] = True
+    request.session["second_until"] = int(time.time()) + settings.SECOND_FACTOR_TTL
+
+
+def has_second_factor(request):
+    claims = token_claims(request)
+    if claims is not None:
+        return claims.get("second_until", 0) > time.time()
+
+    session = request.session
+    if not session.get("second"):
+        return False
+    return session.get("second_until", 0) > time.time()
+
 
 class IsStaffOrReadOnly(permissions.BasePermission):
   
@@ -13,7 +37,7 @@ class IsStaffOrReadOnly(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        return bool(request.user.is_staff)
+        return get_auth_context(request.user)["is_staff"]
 
 
 class OTPRequiredForDelete(permissions.BasePermission):
@@ -30,8 +54,7 @@ class OTPRequiredForDelete(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        if request.user.is_staff:
-            second = request.session.get("second")
-            return bool(second)
+        if get_auth_context(request.user)["is_staff"]:
+            return has_second_factor(request)
 
         return True
@@ -0,0 +1,342 @@
+"""
+Профилирование запросов: число и время SQL, повторяющиеся запросы (N+1),
+время рендера ответа и его размер. Включается настройкой API_PROFILING,
+метрики отдаются в формате Prometheus на /api/_metrics.
+"""
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMS = {
+    "request_duration_seconds": ("Полное время обработки запроса", DURATION_BUCKETS),
+    "sql_duration_seconds": ("Суммарное время SQL за запрос", DURATION_BUCKETS),
+    "sql_queries": ("Число SQL-запросов за запрос", QUERY_BUCKETS),
+    "render_duration_seconds": ("Время рендера (сериализации) ответа", DURATION_BUCKETS),
+    "response_size_bytes": ("Размер тела ответа", SIZE_BUCKETS),
+}
+
+# Сколько «подозрительных» SQL хранить на маршрут.
+TOP_SIGNATURES = 5
+
+NUMBER_RE = re.compile(r"\b\d+\b")
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def sql_signature(sql):
+    """SQL без литералов: одинаковые запросы с разными id дают одну сигнатуру."""
+    return NUMBER_RE.sub("?", STRING_RE.sub("?", sql))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / c
+            seen += c
+        return float(self.buckets[-1])
+
+    def to_dict(self):
+        return {"counts": self.counts, "sum": self.sum, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, buckets, data):
+        h = cls(buckets)
+        h.counts = list(data["counts"])
+        h.sum = data["sum"]
+        h.count = data["count"]
+        return h
+
+
+class RouteStats:
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()}
+        self.duplicate_queries = 0
+        self.n_plus_one_requests = 0
+        self.signatures = Counter()
+
+    def merge(self, other):
+        for name, h in other.histograms.items():
+            self.histograms[name].merge(h)
+        self.duplicate_queries += other.duplicate_queries
+        self.n_plus_one_requests += other.n_plus_one_requests
+        self.signatures.update(other.signatures)
+
+    def to_dict(self):
+        return {
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "duplicate_queries": self.duplicate_queries,
+            "n_plus_one_requests": self.n_plus_one_requests,
+            "signatures": dict(self.signatures.most_common(TOP_SIGNATURES)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name, h in data["histograms"].items():
+            stats.histograms[name] = Histogram.from_dict(HISTOGRAMS[name][1], h)
+        stats.duplicate_queries = data["duplicate_queries"]
+        stats.n_plus_one_requests = data["n_plus_one_requests"]
+        stats.signatures = Counter(data["signatures"])
+        return stats
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.requests_since_flush = 0
+
+    def observe(self, route, sample):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats()
+            for name, value in sample["values"].items():
+                stats.histograms[name].observe(value)
+            stats.duplicate_queries += sample["duplicate_queries"]
+            if sample["n_plus_one"]:
+                stats.n_plus_one_requests += 1
+                stats.signatures.update(sample["n_plus_one"])
+                # не даём счётчику сигнатур расти без границ
+                if len(stats.signatures) > TOP_SIGNATURES * 4:
+                    stats.signatures = Counter(dict(stats.signatures.most_common(TOP_SIGNATURES)))
+            self.requests_since_flush += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {route: stats.to_dict() for route, stats in self.routes.items()}
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.requests_since_flush = 0
+
+    def flush(self, directory):
+        data = self.snapshot()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        self.requests_since_flush = 0
+
+
+registry = MetricsRegistry()
+
+
+def load_snapshots(directory):
+    """Сводит метрики всех процессов, сброшенные в API_PROFILING_DIR."""
+    merged = {}
+    if not os.path.isdir(directory):
+        return merged
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith("metrics-") and filename.endswith(".json")):
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            data = json.load(f)
+        for route, stats in data.items():
+            stats = RouteStats.from_dict(stats)
+            if route in merged:
+                merged[route].merge(stats)
+            else:
+                merged[route] = stats
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+def render_prometheus(routes):
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = f"api_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for route in sorted(routes):
+            method, view = route.split(" ", 1)
+            labels = f'method="{_escape(method)}",route="{_escape(view)}"'
+            h = routes[route].histograms[name]
+            cumulative = 0
+            for bound, count in zip(buckets, h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {h.sum:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {h.count}")
+
+    counters = [
+        ("duplicate_queries_total", "Повторные SQL-запросы с одинаковой сигнатурой", "duplicate_queries"),
+        ("n_plus_one_requests_total", "Запросы с признаками N+1", "n_plus_one_requests"),
+    ]
+    for name, help_text, attr in counters:
+        metric = f"api_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for route in sorted(routes):
+            method, view = route.split(" ", 1)
+            labels = f'method="{_escape(method)}",route="{_escape(view)}"'
+            lines.append(f"{metric}{{{labels}}} {getattr(routes[route], attr)}")
+
+    return "\n".join(lines) + "\n"
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.signatures[sql_signature(sql)] += 1
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    return f"{request.method} {match.view_name or match._func_path}"
+
+
+def response_size(response):
+    if getattr(response, "streaming", False):
+        try:
+            return int(response.get("Content-Length") or 0)
+        except ValueError:
+            return 0
+    return len(response.content)
+
+
+class ProfilingMiddleware:
+    """
+    Ставится первым в MIDDLEWARE, чтобы учитывать и запросы сессий/авторизации.
+    При API_PROFILING = False Django просто выкидывает его из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.API_PROFILING:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorders = []
+        start = time.perf_counter()
+        request._profiling_render = 0.0
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                recorder = QueryRecorder()
+                recorders.append(recorder)
+                stack.enter_context(conn.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        route = route_name(request)
+        if route is None:
+            return response
+
+        elapsed = time.perf_counter() - start
+        queries = sum(r.count for r in recorders)
+        sql_time = sum(r.duration for r in recorders)
+        signatures = Counter()
+        for r in recorders:
+            signatures.update(r.signatures)
+
+        threshold = settings.API_PROFILING_DUPLICATE_THRESHOLD
+        duplicates = sum(c - 1 for c in signatures.values() if c > 1)
+        n_plus_one = {sig: c for sig, c in signatures.items() if c >= threshold}
+
+        registry.observe(route, {
+            "values": {
+                "request_duration_seconds": elapsed,
+                "sql_duration_seconds": sql_time,
+                "sql_queries": queries,
+                "render_duration_seconds": request._profiling_render,
+                "response_size_bytes": response_size(response),
+            },
+            "duplicate_queries": duplicates,
+            "n_plus_one": n_plus_one,
+        })
+
+        response["Server-Timing"] = (
+            f"total;dur={elapsed * 1000:.1f}, db;dur={sql_time * 1000:.1f};desc=\"{queries} queries\", "
+            f"render;dur={request._profiling_render * 1000:.1f}"
+        )
+
+        if registry.requests_since_flush >= settings.API_PROFILING_FLUSH_EVERY:
+            registry.flush(settings.API_PROFILING_DIR)
+
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF Response рендерится после всех process_template_response;
+        # замеряем от этой точки до post-render callback.
+        start = time.perf_counter()
+
+        def rendered(r):
+            request._profiling_render = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def metrics_view(request):
+    user = getattr(request, "user", None)
+    is_staff = bool(user and user.is_authenticated and user.is_staff)
+    if not is_staff and request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise PermissionDenied
+
+    routes = {route: RouteStats.from_dict(data) for route, data in registry.snapshot().items()}
+    return HttpResponse(
+        render_prometheus(routes),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,275 @@
+"""
+Отчёты о продажах на NumPy.
+
+Позиции заказов вместе с заказом и ценой меню держатся в памяти процесса
+как набор колонок (SalesSnapshot), а отчёты считаются векторно: группировки
+через np.unique/np.bincount, перцентили, корзины по часам и дням.
+
+Снимок обновляется инкрементально, не чаще раза в REPORTS_REFRESH_SECONDS:
+новые позиции дочитываются по водяному знаку id, а изменённые и удалённые
+находятся по журналу изменений (ChangeLog) — правка заказа, позиции или цены
+меню перечитывает только затронутые строки.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import changelog, columnar
+from .models import ChangeLog, OrderItem
+
+try:
+    import numpy
+except Exception:
+    numpy = None
+
+
+COLUMNS = [name for name in columnar.SCHEMA]
+
+# если изменений больше этой доли строк — дешевле перечитать всё
+FULL_RELOAD_RATIO = 0.3
+
+MICROSECONDS = {"hour": 3600 * 10**6, "day": 86400 * 10**6}
+
+
+class SalesSnapshot:
+    """Неизменяемый набор колонок; обновление создаёт новый объект."""
+
+    def __init__(self, arrays, watermark, seq, loaded_at):
+        self.arrays = arrays
+        self.watermark = watermark
+        self.seq = seq
+        self.loaded_at = loaded_at
+
+    def __len__(self):
+        return len(self.arrays["id"])
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+
+def _empty():
+    return {name: numpy.empty(0, dtype=dtype) for name, (dtype, _) in columnar.SCHEMA.items()}
+
+
+def _load(qs):
+    arrays = _empty()
+    parts = {name: [arrays[name]] for name in COLUMNS}
+    for chunk in columnar.iter_chunks(qs):
+        for name in COLUMNS:
+            parts[name].append(chunk[name])
+    return {name: numpy.concatenate(parts[name]) for name in COLUMNS}
+
+
+def _concat(a, b):
+    return {name: numpy.concatenate([a[name], b[name]]) for name in COLUMNS}
+
+
+def _take(arrays, mask):
+    return {name: values[mask] for name, values in arrays.items()}
+
+
+def build_snapshot():
+    seq = changelog.last_seq()
+    arrays = _load(OrderItem.objects.all())
+    watermark = int(arrays["id"].max()) if len(arrays["id"]) else 0
+    return SalesSnapshot(arrays, watermark, seq, time.monotonic())
+
+
+def refresh_snapshot(snapshot):
+    """Новый снимок: дочитывает новые строки и перечитывает изменённые."""
+    seq = changelog.last_seq()
+    if snapshot.seq < changelog.horizon():
+        return build_snapshot()  # часть удалений из журнала уже вычищена
+    changes = ChangeLog.objects.filter(
+        id__gt=snapshot.seq, id__lte=seq, model__in=["orderitem", "order", "menu"]
+    ).values_list("model", "object_id")
+
+    touched = {"orderitem": set(), "order": set(), "menu": set()}
+    for model, object_id in changes.iterator():
+        touched[model].add(object_id)
+    if sum(len(ids) for ids in touched.values()) > FULL_RELOAD_RATIO * max(len(snapshot), 1):
+        return build_snapshot()
+
+    arrays = snapshot.arrays
+    stale = Q(id__in=touched["orderitem"]) | Q(order_id__in=touched["order"]) | Q(menu_id__in=touched["menu"])
+    if any(touched.values()):
+        drop = (
+            numpy.isin(arrays["id"], list(touched["orderitem"]))
+            | numpy.isin(arrays["order_id"], list(touched["order"]))
+            | numpy.isin(arrays["menu_id"], list(touched["menu"]))
+        )
+        arrays = _take(arrays, ~drop)
+        qs = OrderItem.objects.filter(stale, id__lte=snapshot.watermark)
+        arrays = _concat(arrays, _load(qs))
+
+    fresh = _load(OrderItem.objects.filter(id__gt=snapshot.watermark))
+    arrays = _concat(arrays, fresh)
+    watermark = max(snapshot.watermark, int(fresh["id"].max()) if len(fresh["id"]) else 0)
+    return SalesSnapshot(arrays, watermark, seq, time.monotonic())
+
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def get_snapshot():
+    global _snapshot
+    with _lock:
+        if _snapshot is None:
+            _snapshot = build_snapshot()
+        elif time.monotonic() - _snapshot.loaded_at >= settings.REPORTS_REFRESH_SECONDS:
+            _snapshot = refresh_snapshot(_snapshot)
+        return _snapshot
+
+
+def reset():
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def select(snapshot, statuses=None, date_from=None, date_to=None):
+    """
+    Маска строк по статусам заказа и диапазону дат (локальных, включительно).
+    По умолчанию — все заказы, кроме отменённых.
+    """
+    codes = columnar.STATUS_CODES
+    if statuses is None:
+        statuses = [s for s in codes if s != "CANCELLED"]
+    mask = numpy.isin(snapshot["status"], [codes.index(s) for s in statuses])
+
+    tz = timezone.get_current_timezone()
+    if date_from is not None:
+        start = datetime.combine(date_from, datetime.min.time(), tz).astimezone(dt_timezone.utc)
+        mask &= snapshot["created_at"] >= numpy.datetime64(start.replace(tzinfo=None), "us")
+    if date_to is not None:
+        end = datetime.combine(date_to + timedelta(days=1), datetime.min.time(), tz).astimezone(dt_timezone.utc)
+        mask &= snapshot["created_at"] < numpy.datetime64(end.replace(tzinfo=None), "us")
+    return mask
+
+
+def local_buckets(created_at, bucket):
+    """
+    Начало локального часа/дня для каждой метки UTC (datetime64[us]).
+    Смещение часового пояса считается один раз на каждый час UTC,
+    а не на каждую строку.
+    """
+    us = created_at.astype("int64")
+    hour = MICROSECONDS["hour"]
+    utc_hours, inverse = numpy.unique(us // hour, return_inverse=True)
+
+    tz = timezone.get_current_timezone()
+    offsets = numpy.array([
+        datetime.fromtimestamp(int(h) * 3600, tz).utcoffset() // timedelta(microseconds=1)
+        for h in utc_hours
+    ], dtype="int64")
+
+    local = us + offsets[inverse]
+    step = MICROSECONDS[bucket]
+    return (local // step * step).astype("datetime64[us]")
+
+
+def money(cents):
+    return round(float(cents) / columnar.PRICE_SCALE, 2)
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not len(values):
+        return {f"p{p}": 0 for p in points}
+    result = numpy.percentile(values, points)
+    return {f"p{p}": float(v) for p, v in zip(points, result)}
+
+
+def revenue_by_time(snapshot, mask, bucket="hour", menu=None):
+    """Выручка и количество по (корзина времени, позиция меню)."""
+    if menu is not None:
+        mask = mask & (snapshot["menu_id"] == menu)
+    if not mask.any():
+        return []
+
+    buckets = local_buckets(snapshot["created_at"][mask], bucket)
+    menus = snapshot["menu_id"][mask]
+    keys, inverse = numpy.unique(
+        numpy.stack([buckets.astype("int64"), menus]), axis=1, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    revenue = numpy.bincount(inverse, weights=snapshot["line_total_cents"][mask])
+    qty = numpy.bincount(inverse, weights=snapshot["qty"][mask])
+
+    return [
+        {
+            "bucket": numpy.datetime64(int(b), "us").astype(datetime).isoformat(),
+            "menu": int(m) if m >= 0 else None,
+            "qty": int(q),
+            "revenue": money(r),
+        }
+        for b, m, q, r in zip(keys[0], keys[1], qty, revenue)
+    ]
+
+
+def order_totals(snapshot, mask):
+    """(id заказов, сумма, число позиций, количество) по каждому заказу."""
+    orders, inverse = numpy.unique(snapshot["order_id"][mask], return_inverse=True)
+    totals = numpy.bincount(inverse, weights=snapshot["line_total_cents"][mask])
+    lines = numpy.bincount(inverse)
+    qty = numpy.bincount(inverse, weights=snapshot["qty"][mask])
+    return orders, totals, lines, qty, inverse
+
+
+def customer_spend(snapshot, mask, limit=10):
+    mask = mask & (snapshot["customer_id"] >= 0)
+    if not mask.any():
+        return {"customers": 0, "top": [], "spend": percentiles([])}
+
+    customers, inverse = numpy.unique(snapshot["customer_id"][mask], return_inverse=True)
+    spend = numpy.bincount(inverse, weights=snapshot["line_total_cents"][mask])
+
+    # заказы клиента — уникальные пары (клиент, заказ)
+    pairs = numpy.unique(numpy.stack([inverse, snapshot["order_id"][mask]]), axis=1)
+    orders = numpy.bincount(pairs[0], minlength=len(customers))
+
+    top = numpy.argsort(-spend, kind="stable")[:limit]
+    return {
+        "customers": len(customers),
+        "top": [
+            {"customer": int(customers[i]), "orders": int(orders[i]), "spend": money(spend[i])}
+            for i in top
+        ],
+        "spend": {k: money(v) for k, v in percentiles(spend).items()},
+    }
+
+
+def basket_sizes(snapshot, mask):
+    if not mask.any():
+        return {"orders": 0, "histogram": [], "qty": percentiles([]), "value": percentiles([])}
+
+    _, totals, lines, qty, _ = order_totals(snapshot, mask)
+    sizes, counts = numpy.unique(qty.astype("int64"), return_counts=True)
+    return {
+        "orders": len(totals),
+        "avg_qty": round(float(qty.mean()), 2),
+        "avg_lines": round(float(lines.mean()), 2),
+        "histogram": [{"qty": int(s), "orders": int(c)} for s, c in zip(sizes, counts)],
+        "qty": percentiles(qty),
+        "value": {k: money(v) for k, v in percentiles(totals).items()},
+    }
+
+
+def summary(snapshot, mask):
+    if not mask.any():
+        return {"orders": 0, "items": 0, "qty": 0, "revenue": 0, "avg_order": 0, "order_value": percentiles([])}
+
+    _, totals, _, _, _ = order_totals(snapshot, mask)
+    revenue = snapshot["line_total_cents"][mask].sum()
+    return {
+        "orders": len(totals),
+        "items": int(mask.sum()),
+        "qty": int(snapshot["qty"][mask].sum()),
+        "revenue": money(revenue),
+        "avg_order": money(revenue / len(totals)),
+        "order_value": {k: money(v) for k, v in percentiles(totals).items()},
+    }
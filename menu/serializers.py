@@ -1,5 +1,45 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Category, Menu, Customer, Order, OrderItem
+from .models import ArchivedOrder, ArchivedOrderItem, Category, ChangeLog, Menu, Customer, Order, OrderItem
+
+
+class PictureVariantsField(serializers.Field):
+    """
+    Уменьшенные копии картинки в виде, готовом для <img srcset>.
+    Пока фоновая генерация не закончилась, возвращает None.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        picture = obj.picture
+        variants = obj.picture_variants or {}
+        if not picture or variants.get("source") != picture.name:
+            return None
+
+        request = self.context.get("request")
+
+        def url(path):
+            u = picture.storage.url(path)
+            return request.build_absolute_uri(u) if request is not None else u
+
+        data = {
+            "width": variants.get("width"),
+            "height": variants.get("height"),
+            "src": None,
+            "srcset": {},
+        }
+        for fmt in settings.IMAGE_VARIANT_FORMATS:
+            paths = sorted(variants.get(fmt, {}).items(), key=lambda kv: int(kv[0]))
+            if not paths:
+                continue
+            data["srcset"][fmt] = ", ".join(f"{url(p)} {w}w" for w, p in paths)
+            data["src"] = url(paths[-1][1])
+        return data
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,15 +48,19 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class MenuSerializer(serializers.ModelSerializer):
+    picture_variants = PictureVariantsField()
+
     class Meta:
         model = Menu
-        fields = ["id", "title", "group", "price", "description", "picture"]
+        fields = ["id", "title", "group", "price", "description", "picture", "picture_variants", "version"]
 
 
 class CustomerSerializer(serializers.ModelSerializer):
+    picture_variants = PictureVariantsField()
+
     class Meta:
         model = Customer
-        fields = ["id", "name", "phone", "email", "picture"]
+        fields = ["id", "name", "phone", "email", "picture", "picture_variants", "version"]
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -24,7 +68,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderItem
-        fields = ["id", "order", "menu", "qty", "line_price"]
+        fields = ["id", "order", "menu", "qty", "line_price", "version"]
 
     def get_line_price(self, obj):
         return float(obj.menu.price * obj.qty)
@@ -35,8 +79,8 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ["id", "user", "customer", "status", "created_at", "total_price"]
-        read_only_fields = ["created_at", "user", "total_price"]
+        fields = ["id", "user", "customer", "status", "created_at", "total_price", "version"]
+        read_only_fields = ["created_at", "user", "total_price", "version"]
 
     def get_total_price(self, obj):
         total = 0
@@ -44,6 +88,16 @@ class OrderSerializer(serializers.ModelSerializer):
             total += it.menu.price * it.qty
         return float(total)
 
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -52,4 +106,12 @@ class LoginSerializer(serializers.Serializer):
 class UserInfoSerializer(serializers.Serializer):
     is_authenticated = serializers.BooleanField()
     username = serializers.CharField(allow_blank=True, required=False)
-    is_staff = serializers.BooleanField()
\ No newline at end of file
+    is_staff = serializers.BooleanField()
+
+
+class ChangeLogSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source="id", read_only=True)
+
+    class Meta:
+        model = ChangeLog
+        fields = ["seq", "model", "object_id", "action", "created_at"]
@@ -0,0 +1,174 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Category, ChangeLog, Menu, Customer, Order, OrderItem, Profile
+from . import archive, changelog, cooccurrence, counters, images
+from .auth_cache import invalidate_user
+from .storage import release_picture
+from .table_versions import bump_table_version
+
+
+VERSIONED_MODELS = [Category, Menu, Customer, Order, OrderItem, get_user_model()]
+
+
+@receiver(post_init, sender=Menu)
+@receiver(post_init, sender=Customer)
+def remember_picture(sender, instance, **kwargs):
+    instance._loaded_picture = instance.picture.name if instance.picture else ""
+    instance._loaded_picture_variants = instance.picture_variants
+
+
+def release_on_commit(storage, name, variants):
+    if name:
+        transaction.on_commit(lambda: release_picture(storage, name, variants))
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_save, sender=Customer)
+def picture_saved(sender, instance, **kwargs):
+    picture = instance.picture
+    name = picture.name if picture else ""
+
+    old_name = getattr(instance, "_loaded_picture", "")
+    if old_name and old_name != name:
+        release_on_commit(picture.storage, old_name, instance._loaded_picture_variants)
+    instance._loaded_picture = name
+    instance._loaded_picture_variants = instance.picture_variants
+
+    if not picture:
+        return
+    if (instance.picture_variants or {}).get("source") == name:
+        return
+    images.schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Menu)
+@receiver(post_delete, sender=Customer)
+def picture_deleted(sender, instance, **kwargs):
+    if instance.picture:
+        release_on_commit(instance.picture.storage, instance.picture.name, instance.picture_variants)
+
+
+def table_changed(sender, **kwargs):
+    # После коммита: иначе параллельный запрос успеет закэшировать
+    # старые данные уже под новой версией.
+    transaction.on_commit(lambda: bump_table_version(sender))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(table_changed, sender=model, dispatch_uid=f"table-version-save-{model._meta.label_lower}")
+    post_delete.connect(table_changed, sender=model, dispatch_uid=f"table-version-delete-{model._meta.label_lower}")
+
+
+def logged_saved(sender, instance, **kwargs):
+    changelog.record(sender, instance.pk, "save")
+
+
+def logged_deleted(sender, instance, **kwargs):
+    changelog.record(sender, instance.pk, "delete")
+
+
+for model in changelog.LOGGED_MODELS:
+    post_save.connect(logged_saved, sender=model, dispatch_uid=f"changelog-save-{model._meta.label_lower}")
+    post_delete.connect(logged_deleted, sender=model, dispatch_uid=f"changelog-delete-{model._meta.label_lower}")
+
+
+@receiver(pre_delete, sender=Customer)
+def customer_deleting(sender, instance, **kwargs):
+    # SET_NULL обнуляет Order.customer одним UPDATE без сигналов
+    ids = Order.objects.filter(customer_id=instance.pk).values_list("id", flat=True)
+    ChangeLog.log(Order, list(ids))
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_menu(sender, instance, **kwargs):
+    instance._loaded_menu = (instance.order_id, instance.menu_id) if instance.pk else (None, None)
+    # своё состояние для счётчиков: order_item_saved перезаписывает _loaded_menu
+    instance._loaded_line = (instance.order_id, instance.menu_id, instance.qty) if instance.pk else (None, None, 0)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, **kwargs):
+    old_order, old_menu = getattr(instance, "_loaded_menu", (None, None))
+    new = (instance.order_id, instance.menu_id)
+    if (old_order, old_menu) == new:
+        return
+    if old_menu:
+        cooccurrence.menu_removed(old_order, old_menu, instance.pk)
+    if instance.menu_id:
+        cooccurrence.menu_added(instance.order_id, instance.menu_id, instance.pk)
+    instance._loaded_menu = new
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_counted(sender, instance, **kwargs):
+    # отдельно от order_item_saved: там важна только смена menu, здесь и qty
+    old_order, old_menu, old_qty = instance._loaded_line
+    old = (old_menu, old_qty) if old_menu else None
+    new = (instance.menu_id, instance.qty) if instance.menu_id else None
+    if old_order == instance.order_id:
+        if old != new:
+            counters.line_changed(instance.order_id, old, new)
+    else:
+        if old_order:
+            counters.line_changed(old_order, old, None)
+        counters.line_changed(instance.order_id, None, new)
+    instance._loaded_line = (instance.order_id, instance.menu_id, instance.qty)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    # при архивации накопленное остаётся в счётчиках
+    if archive.is_archiving() or cooccurrence.is_order_removing(instance.order_id):
+        return
+    if instance.menu_id:
+        cooccurrence.menu_removed(instance.order_id, instance.menu_id, instance.pk)
+        counters.line_changed(instance.order_id, (instance.menu_id, instance.qty), None)
+
+
+@receiver(post_init, sender=Order)
+def remember_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.status if instance.pk else None
+    instance._loaded_customer = instance.customer_id if instance.pk else None
+
+
+@receiver(post_save, sender=Order)
+def order_counted(sender, instance, **kwargs):
+    old_status, old_customer = instance._loaded_status, instance._loaded_customer
+    was_done, done = old_status == "DONE", instance.status == "DONE"
+    if was_done and (not done or old_customer != instance.customer_id):
+        counters.order_done(instance, -1, customer_id=old_customer)
+    if done and (not was_done or old_customer != instance.customer_id):
+        counters.order_done(instance, +1)
+    instance._loaded_status = instance.status
+    instance._loaded_customer = instance.customer_id
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    # позиции заказа сигналами уже не учитываются (is_order_removing),
+    # поэтому счётчики вычитаются здесь целиком
+    if archive.is_archiving():
+        return
+    if instance.status == "DONE":
+        counters.order_done(instance, -1)
+    cooccurrence.order_removing(instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    cooccurrence.order_removed(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils.deconstruct import deconstructible
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+from .images import file_sha256
+
+
+HASHED_NAME_RE = re.compile(r"[0-9a-f]{64}")
+
+# Поля, которые ссылаются на файлы в общем хранилище картинок.
+PICTURE_FIELDS = [
+    ("menu.Menu", "picture"),
+    ("menu.Customer", "picture"),
+]
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(os.path.basename(name)))
+
+
+def name_digest(name):
+    match = HASHED_NAME_RE.search(os.path.basename(name))
+    return match.group(0) if match else None
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def content_lock(storage, name):
+    """
+    Взаимоисключение для файлов одного содержимого: повторная загрузка тех же
+    байтов (save) и удаление (release_picture) не идут одновременно.
+    Между процессами — flock на файле в MEDIA_ROOT/.locks/.
+    """
+    key = (name_digest(name) or "00")[:2]
+    with _thread_locks_guard:
+        lock = _thread_locks.setdefault(key, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        path = storage.path(os.path.join(".locks", f"{key}.lock"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def hashed_name(name, content):
+    dirname, basename = os.path.split(name)
+    ext = os.path.splitext(basename)[1].lower()
+    return os.path.join(dirname, file_sha256(content) + ext).replace("\\", "/")
+
+
+@deconstructible
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Хранилище с адресацией по содержимому: menus/photo.png сохраняется как
+    menus/<sha256>.png. Одинаковые файлы хранятся один раз, а URL никогда
+    не меняет содержимое, поэтому его можно кэшировать навсегда.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not is_hashed_name(name):
+            name = hashed_name(name, content)
+        with content_lock(self, name):
+            if self.exists(name):
+                # Такой файл уже есть — это те же байты. Строка, которая на него
+                # сошлётся, ещё не закоммичена, поэтому отмечаем файл как только
+                # что использованный: release_picture не удалит его PICTURE_RELEASE_GRACE секунд.
+                os.utime(self.path(name))
+                return name
+            return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        if is_hashed_name(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_hashed_name(name):
+            return super()._save(name, content)
+
+        # Параллельная загрузка того же файла не должна давать photo_xYz.png:
+        # пишем во временный файл и атомарно подменяем.
+        tmp_name = f"{name}.{uuid.uuid4().hex}.tmp"
+        tmp_name = super()._save(tmp_name, content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+def picture_references(name):
+    """Сколько строк во всех моделях ссылается на файл."""
+    total = 0
+    for label, field in PICTURE_FIELDS:
+        model = apps.get_model(label)
+        total += model._default_manager.filter(**{field: name}).count()
+    return total
+
+
+def digest_references(digest):
+    """
+    Сколько строк ссылается на содержимое с этим хэшем: те же байты лежат
+    под разными именами (menus/<sha>.png, customers/<sha>.png, другое
+    расширение), а копии в thumbs/ у них общие.
+    """
+    total = 0
+    for label, field in PICTURE_FIELDS:
+        model = apps.get_model(label)
+        lookup = Q(**{f"{field}__contains": digest}) | Q(picture_variants__hash=digest)
+        total += model._default_manager.filter(lookup).count()
+    return total
+
+
+def recently_used(storage, name):
+    try:
+        mtime = os.path.getmtime(storage.path(name))
+    except OSError:
+        return False
+    return time.time() - mtime < settings.PICTURE_RELEASE_GRACE
+
+
+def release_picture(storage, name, variants=None):
+    """
+    Удаляет файл (и его уменьшенные копии), если на него больше никто
+    не ссылается. Счётчиком ссылок служат сами строки в БД; файл, который
+    только что переиспользовала параллельная загрузка, не трогается.
+    """
+    if not name:
+        return False
+
+    with content_lock(storage, name):
+        if picture_references(name) or recently_used(storage, name):
+            return False
+        storage.delete(name)
+
+        # Копии в thumbs/ названы по хэшу содержимого и общие для всех его владельцев.
+        variants = variants or {}
+        digest = variants.get("hash")
+        if digest and variants.get("source") == name and not digest_references(digest):
+            for paths in variants.values():
+                if isinstance(paths, dict):
+                    for path in paths.values():
+                        storage.delete(path)
+    return True
+
+
+_media_storage = None
+
+
+def get_media_storage():
+    global _media_storage
+    if _media_storage is None:
+        _media_storage = HashedMediaStorage()
+    return _media_storage
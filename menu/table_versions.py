@@ -0,0 +1,42 @@
+import time
+
+from django.core.cache import cache
+
+
+KEY = "table-version:{}"
+
+
+def table_key(model):
+    return KEY.format(model._meta.label_lower)
+
+
+def _initial():
+    # Если кэш сбросили, счётчик не должен начаться с уже виденного значения.
+    return int(time.time() * 1000)
+
+
+def get_table_versions(*models):
+    """
+    Текущие версии таблиц: {"menu": 1700000000123, ...}.
+    Любая запись в таблицу меняет её версию, поэтому версия годится
+    в ключ кэша для всего, что построено по этой таблице.
+    """
+    keys = {table_key(m): m._meta.model_name for m in models}
+    found = cache.get_many(keys)
+
+    missing = {k: _initial() for k in keys if k not in found}
+    for key, value in missing.items():
+        if cache.add(key, value, timeout=None):
+            found[key] = value
+        else:
+            found[key] = cache.get(key, value)
+
+    return {keys[k]: v for k, v in found.items()}
+
+
+def bump_table_version(model):
+    key = table_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial(), timeout=None)
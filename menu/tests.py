@@ -1,9 +1,34 @@
 
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+import pyotp
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
 from model_bakery import baker
 
-from menu.models import Category, Menu, Customer, Order, OrderItem
+from menu import changelog, columnar, cooccurrence, counters, loadtest, profiling, reports, throttling, tokens
+from menu.api import MenuViewSet
+from menu.storage import get_media_storage
+from menu.models import (
+    ArchivedOrder, ArchivedOrderItem, Category, ChangeLog, IdempotencyKey, Menu, MenuPair, Customer, Order, OrderItem,
+    Profile, SalesCounter,
+)
 
 
 class CategoryCRUDTests(TestCase):
@@ -230,3 +255,1417 @@ class OrderItemCRUDTests(TestCase):
         r = self.client.delete(f"/api/order-items/{oi.id}/")
         self.assertEqual(r.status_code, 204)
         self.assertEqual(OrderItem.objects.count(), 0)
+
+
+class OptimisticLockTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.menu = baker.make(Menu, title="Латте", price=100)
+
+    def test_etag_and_version_bump(self):
+        r = self.client.get(f"/api/menu/{self.menu.id}/")
+        self.assertEqual(r["ETag"], '"1"')
+
+        r = self.client.patch(
+            f"/api/menu/{self.menu.id}/", {"price": "120"}, format="json", HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["ETag"], '"2"')
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.version, 2)
+
+    def test_stale_if_match_is_rejected(self):
+        Menu.objects.filter(pk=self.menu.pk).update(version=5)
+        r = self.client.patch(
+            f"/api/menu/{self.menu.id}/", {"price": "1"}, format="json", HTTP_IF_MATCH='"4"'
+        )
+        self.assertEqual(r.status_code, 412)
+        self.menu.refresh_from_db()
+        self.assertEqual(self.menu.price, 100)
+
+    def test_if_match_required_when_enabled(self):
+        with mock.patch.object(MenuViewSet, "require_if_match", True):
+            r = self.client.patch(f"/api/menu/{self.menu.id}/", {"price": "1"}, format="json")
+        self.assertEqual(r.status_code, 428)
+
+
+@override_settings(IMAGE_VARIANTS_SYNC=True, IMAGE_VARIANT_WIDTHS=[32, 64])
+class PictureVariantsTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+
+    def make_png(self, size=(100, 50)):
+        buf = io.BytesIO()
+        Image.new("RGB", size, "red").save(buf, format="PNG")
+        return SimpleUploadedFile("photo.png", buf.getvalue(), content_type="image/png")
+
+    def test_variants_are_generated_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            menu = Menu.objects.create(title="Латте", picture=self.make_png())
+
+        menu.refresh_from_db()
+        self.assertEqual(menu.picture_variants["source"], menu.picture.name)
+        self.assertEqual(sorted(menu.picture_variants["webp"]), ["32", "64"])
+        for path in menu.picture_variants["jpeg"].values():
+            self.assertTrue(os.path.exists(os.path.join(self.media, path)))
+
+        r = self.client.get(f"/api/menu/{menu.id}/")
+        srcset = r.json()["picture_variants"]["srcset"]
+        self.assertIn(" 32w, ", srcset["webp"])
+        self.assertTrue(srcset["jpeg"].endswith(" 64w"))
+
+    def test_small_picture_is_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name="Алия", picture=self.make_png((20, 20)))
+
+        customer.refresh_from_db()
+        self.assertEqual(list(customer.picture_variants["jpeg"]), ["20"])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+        self.digest = "a" * 64
+        os.makedirs(os.path.join(self.media, "menus"))
+        with open(os.path.join(self.media, "menus", f"{self.digest}.png"), "wb") as f:
+            f.write(b"0123456789")
+        with open(os.path.join(self.media, "menus", "old.png"), "wb") as f:
+            f.write(b"old")
+
+    def test_upload_gets_hashed_name(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buf, format="PNG")
+        menu = Menu.objects.create(
+            title="Латте", picture=SimpleUploadedFile("photo.PNG", buf.getvalue())
+        )
+        self.assertRegex(menu.picture.name, r"^menus/[0-9a-f]{64}\.png$")
+
+    def test_hashed_file_is_immutable_and_revalidates(self):
+        r = self.client.get(f"/media/menus/{self.digest}.png")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(b"".join(r.streaming_content), b"0123456789")
+        self.assertIn("immutable", r["Cache-Control"])
+
+        r = self.client.get(f"/media/menus/{self.digest}.png", HTTP_IF_NONE_MATCH=r["ETag"])
+        self.assertEqual(r.status_code, 304)
+
+        r = self.client.get("/media/menus/old.png")
+        self.assertEqual(r["Cache-Control"], "public, max-age=0, must-revalidate")
+
+    def test_range_requests(self):
+        r = self.client.get(f"/media/menus/{self.digest}.png", HTTP_RANGE="bytes=2-4")
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r["Content-Range"], "bytes 2-4/10")
+        self.assertEqual(b"".join(r.streaming_content), b"234")
+
+        r = self.client.get(f"/media/menus/{self.digest}.png", HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(r.streaming_content), b"789")
+
+        r = self.client.get(f"/media/menus/{self.digest}.png", HTTP_RANGE="bytes=50-")
+        self.assertEqual(r.status_code, 416)
+
+    @override_settings(MEDIA_OFFLOAD="x-accel-redirect")
+    def test_accel_redirect_offload(self):
+        r = self.client.get(f"/media/menus/{self.digest}.png")
+        self.assertEqual(r["X-Accel-Redirect"], f"/protected-media/menus/{self.digest}.png")
+        self.assertEqual(r.content, b"")
+
+    def test_path_traversal_is_rejected(self):
+        r = self.client.get("/media/../app/settings.py")
+        self.assertEqual(r.status_code, 404)
+
+
+class PictureDedupTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+        buf = io.BytesIO()
+        Image.new("RGB", (4, 4), "blue").save(buf, format="PNG")
+        self.png = buf.getvalue()
+
+    def upload(self):
+        return SimpleUploadedFile("photo.png", self.png)
+
+    @override_settings(PICTURE_RELEASE_GRACE=0)
+    def test_same_upload_is_stored_once_and_refcounted(self):
+        with mock.patch("menu.images.schedule_variants"):
+            with self.captureOnCommitCallbacks(execute=True):
+                a = Menu.objects.create(title="A", picture=self.upload())
+                b = Menu.objects.create(title="B", picture=self.upload())
+                c = Customer.objects.create(name="C", picture=self.upload())
+        self.assertEqual(a.picture.name, b.picture.name)
+        self.assertEqual(os.listdir(os.path.join(self.media, "menus")), [os.path.basename(a.picture.name)])
+
+        path = a.picture.path
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            b.picture = None
+            b.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(c.picture.path))
+
+    def test_reused_file_survives_release(self):
+        # параллельная загрузка тех же байтов переиспользовала файл, но ещё не закоммитила строку
+        with mock.patch("menu.images.schedule_variants"):
+            with self.captureOnCommitCallbacks(execute=True):
+                a = Menu.objects.create(title="A", picture=self.upload())
+        path = a.picture.path
+        get_media_storage().save("menus/photo.png", io.BytesIO(self.png))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertTrue(os.path.exists(path))
+
+    @override_settings(PICTURE_RELEASE_GRACE=0, IMAGE_VARIANTS_SYNC=True, IMAGE_VARIANT_WIDTHS=[2])
+    def test_shared_thumbnails_are_kept_for_other_owner(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            menu = Menu.objects.create(title="A", picture=self.upload())
+            customer = Customer.objects.create(name="C", picture=self.upload())
+        menu.refresh_from_db()
+        customer.refresh_from_db()
+        self.assertNotEqual(menu.picture.name, customer.picture.name)
+        thumbs = [os.path.join(self.media, p) for p in customer.picture_variants["jpeg"].values()]
+        self.assertEqual(thumbs, [os.path.join(self.media, p) for p in menu.picture_variants["jpeg"].values()])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu.delete()
+        self.assertTrue(all(os.path.exists(p) for p in thumbs))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.delete()
+        self.assertFalse(any(os.path.exists(p) for p in thumbs))
+
+    def test_dedupe_media_command(self):
+        os.makedirs(os.path.join(self.media, "menus"))
+        for name in ("one.png", "two.png", "orphan.png"):
+            with open(os.path.join(self.media, "menus", name), "wb") as f:
+                f.write(self.png)
+        Menu.objects.bulk_create([
+            Menu(title="A", picture="menus/one.png"),
+            Menu(title="B", picture="menus/two.png"),
+        ])
+
+        call_command("dedupe_media", "--delete-orphans", stdout=io.StringIO())
+
+        names = set(Menu.objects.values_list("picture", flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(os.listdir(os.path.join(self.media, "menus")), [os.path.basename(names.pop())])
+
+
+class ShowCafeViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.menu = baker.make(Menu, title="Латте")
+        orders = baker.make(Order, _quantity=30)
+        for o in orders:
+            baker.make(OrderItem, order=o, menu=self.menu)
+
+    def test_fixed_query_count_and_fragment_cache(self):
+        with self.assertNumQueries(5):
+            r = self.client.get("/")
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, "orders_page=2")
+
+        with self.assertNumQueries(0):
+            self.client.get("/")
+
+    def test_fragment_is_invalidated_on_write(self):
+        self.client.get("/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu.title = "Капучино"
+            self.menu.save()
+
+        r = self.client.get("/")
+        self.assertContains(r, "Капучино")
+
+
+@override_settings(API_PROFILING=True, API_PROFILING_FLUSH_EVERY=1)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.override = override_settings(API_PROFILING_DIR=self.dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        profiling.registry.reset()
+        self.addCleanup(profiling.registry.reset)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+
+    def test_records_queries_and_n_plus_one(self):
+        order = baker.make(Order)
+        menu = baker.make(Menu, price=10)
+        baker.make(OrderItem, order=order, menu=menu, _quantity=4)
+
+        r = self.client.get("/api/order-items/")
+        self.assertIn("db;dur=", r["Server-Timing"])
+
+        stats = profiling.registry.routes["GET order-items-list"]
+        self.assertEqual(stats.histograms["sql_queries"].count, 1)
+        self.assertGreaterEqual(stats.histograms["sql_queries"].sum, 5)
+        self.assertEqual(stats.n_plus_one_requests, 1)
+        self.assertGreater(stats.histograms["response_size_bytes"].sum, 0)
+
+    def test_metrics_endpoint_and_report(self):
+        self.client.get("/api/menu/stats/")
+
+        r = self.client.get("/api/_metrics")
+        self.assertEqual(r.status_code, 200)
+        body = r.content.decode()
+        self.assertIn('api_sql_queries_count{method="GET",route="menu-stats"} 1', body)
+        self.assertIn('api_request_duration_seconds_bucket{method="GET",route="menu-stats",le="+Inf"} 1', body)
+
+        out = io.StringIO()
+        call_command("profile_report", "--dir", self.dir, stdout=out)
+        self.assertIn("GET menu-stats", out.getvalue())
+
+
+class LoadTestHelpersTests(TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix("browse=3, stats=1"), {"browse": 3.0, "stats": 1.0})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("dance=1")
+
+    def test_report_percentiles(self):
+        stats = loadtest.Stats()
+        for i in range(1, 101):
+            stats.record("browse", i / 1000, ok=i != 100, detail="HTTP 500")
+        report = stats.report(duration=10)
+        browse = report["scenarios"]["browse"]
+        self.assertEqual(report["throughput_rps"], 10.0)
+        self.assertEqual(report["error_rate"], 0.01)
+        self.assertEqual((browse["p50_ms"], browse["p95_ms"], browse["p99_ms"]), (50.0, 95.0, 99.0))
+
+    def test_report_counts_only_logged_in_cashiers(self):
+        test = loadtest.LoadTest("127.0.0.1", 1, "u", "p", cashiers=3, duration=0)
+        with mock.patch.object(loadtest.LoadTest, "prepare", mock.AsyncMock()), \
+                mock.patch.object(loadtest.Cashier, "login", mock.AsyncMock(side_effect=[True, False, True])):
+            report = asyncio.run(test.run())
+        self.assertEqual((report["cashiers"], report["cashiers_requested"]), (2, 3))
+
+    def test_only_safe_requests_are_retried(self):
+        async def attempts(method, headers=None):
+            seen = []
+
+            async def hang_up(reader, writer):
+                seen.append(await reader.read(1))  # запрос принят, соединение рвётся
+                writer.close()
+
+            server = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+            client = loadtest.HttpClient("127.0.0.1", server.sockets[0].getsockname()[1], timeout=5)
+            try:
+                with self.assertRaises((ConnectionError, asyncio.IncompleteReadError)):
+                    await client.request(method, "/api/orders/", {} if method == "POST" else None, headers)
+            finally:
+                await client.close()
+                server.close()
+            return len(seen)
+
+        self.assertEqual(asyncio.run(attempts("GET")), 2)
+        self.assertEqual(asyncio.run(attempts("POST")), 1)
+        self.assertEqual(asyncio.run(attempts("POST", {"Idempotency-Key": "k"})), 2)
+
+    def test_timeout_drops_connection(self):
+        async def scenario():
+            async def silent(reader, writer):
+                await reader.read(1)  # запрос принят, ответа нет
+
+            server = await asyncio.start_server(silent, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            client = loadtest.HttpClient("127.0.0.1", port, timeout=0.1)
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.request("GET", "/api/menu/")
+                self.assertIsNone(client.writer)
+            finally:
+                await client.close()
+                server.close()
+
+        asyncio.run(scenario())
+
+
+class SessionModeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.category = baker.make(Category)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_second_factor_expires_inside_signed_cookie(self):
+        self.client.login(username="admin", password="pass")
+        session = self.client.session
+        session["second"] = True
+        session["second_until"] = int(time.time()) - 1
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        self.assertFalse(self.client.get("/api/user/info/").json()["second"])
+        r = self.client.delete(f"/api/categories/{self.category.id}/")
+        self.assertEqual(r.status_code, 403)
+
+    def test_info_queries_with_default_cache(self):
+        Profile.objects.create(user=self.user, role="ADMIN")
+        self.client.login(username="admin", password="pass")
+        with self.assertNumQueries(2):  # сессия и пользователь вместе с профилем
+            r = self.client.get("/api/user/info/")
+        self.assertEqual(r.json()["role"], "ADMIN")
+        with self.assertNumQueries(2):  # IsStaffOrReadOnly берёт is_staff из того же контекста
+            r = self.client.delete(f"/api/categories/{self.category.id}/")
+        self.assertEqual(r.status_code, 403)
+
+    def test_cleanup_sessions_removes_only_expired(self):
+        now = timezone.now()
+        Session.objects.create(session_key="old", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="new", session_data="", expire_date=now + timedelta(days=1))
+
+        call_command("cleanup_sessions", "--batch", "1", stdout=io.StringIO())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["new"])
+
+
+class AuthContextCacheTests(TestCase):
+    def setUp(self):
+        # кэш включается только с общим бэкендом; файловый общий для процессов
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.override = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": self.dir},
+        })
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.login(username="admin", password="pass")
+
+    def test_info_reads_only_session_when_warm(self):
+        self.client.get("/api/user/info/")
+        with self.assertNumQueries(1):  # сама сессия (SESSION_MODE = "db")
+            r = self.client.get("/api/user/info/")
+        self.assertEqual(r.json()["username"], "admin")
+        self.assertTrue(r.json()["is_staff"])
+
+    def test_profile_and_user_changes_invalidate(self):
+        self.client.get("/api/user/info/")
+        Profile.objects.create(user=self.user, role="ADMIN")
+        self.assertEqual(self.client.get("/api/user/info/").json()["role"], "ADMIN")
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertFalse(self.client.get("/api/user/info/").json()["is_staff"])
+
+    def test_second_login_without_key_skips_profile_lookup(self):
+        self.client.get("/api/user/info/")
+        with self.assertNumQueries(1):  # сама сессия
+            r = self.client.post("/api/user/second-login/", {"key": "123456"})
+        self.assertFalse(r.json()["success"])
+
+    def test_local_cache_is_bypassed(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.client.get("/api/user/info/")
+            # правка в обход сигналов — как будто сделана в другом воркере
+            User.objects.filter(pk=self.user.pk).update(is_staff=False)
+            self.assertFalse(self.client.get("/api/user/info/").json()["is_staff"])
+
+
+class TokenAuthTests(TestCase):
+    def setUp(self):
+        throttling.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.profile = Profile.objects.create(user=self.user, opt_key=pyotp.random_base32())
+        self.category = baker.make(Category)
+
+    def obtain(self):
+        r = self.client.post("/api/user/token/", {"username": "admin", "password": "pass"}, format="json")
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def test_access_token_authenticates_without_queries(self):
+        access = self.obtain()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.assertNumQueries(0):
+            r = self.client.get("/api/user/info/")
+        self.assertEqual(r.json()["username"], "admin")
+        self.assertTrue(r.json()["is_staff"])
+
+    def test_bad_tokens_are_rejected(self):
+        access = self.obtain()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access[:-2]}xx")
+        self.assertEqual(self.client.get("/api/categories/").status_code, 401)
+
+        self.client.credentials()
+        with override_settings(TOKEN_ACCESS_TTL=-1):
+            access = self.obtain()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/api/categories/").status_code, 401)
+
+    def test_malformed_json_parts_are_rejected(self):
+        for token in (
+            "WzFd.e30.abc",  # заголовок — список
+            tokens.encode([1]),  # подписанное тело — не объект
+            tokens.encode({"typ": "access", "exp": "завтра"}),
+        ):
+            with self.assertRaises(tokens.TokenError):
+                tokens.decode(token)
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(self.client.get("/api/categories/").status_code, 401)
+
+    def test_refresh_and_second_factor_claim(self):
+        pair = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.client.delete(f"/api/categories/{self.category.id}/").status_code, 403)
+
+        code = pyotp.TOTP(self.profile.opt_key).now()
+        r = self.client.post("/api/user/token-second/", {"key": code}, format="json")
+        self.assertTrue(r.json()["success"])
+
+        r = self.client.post("/api/user/token-refresh/", {"refresh": r.json()["refresh"]}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {r.json()['access']}")
+        self.assertEqual(self.client.delete(f"/api/categories/{self.category.id}/").status_code, 204)
+
+        r = self.client.post("/api/user/token-refresh/", {"refresh": pair["access"]}, format="json")
+        self.assertEqual(r.status_code, 401)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        throttling.reset()
+        self.addCleanup(throttling.reset)
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+
+    def test_token_bucket_refills(self):
+        store = throttling.MemoryBucketStore()
+        self.assertEqual(store.consume("k", 2, 1, now=0), (True, 0))
+        self.assertEqual(store.consume("k", 2, 1, now=0), (True, 0))
+        self.assertEqual(store.consume("k", 2, 1, now=0), (False, 1))
+        self.assertEqual(store.consume("k", 2, 1, now=1)[0], True)
+
+    @override_settings(THROTTLE_BUCKETS={"login": {"rate": "2/min", "keys": ["ip", "username"]}})
+    def test_login_is_throttled_before_password_check(self):
+        for _ in range(2):
+            r = self.client.post("/api/user/login/", {"username": "admin", "password": "bad"}, format="json")
+            self.assertEqual(r.status_code, 200)
+
+        with mock.patch("menu.api.authenticate") as auth:
+            r = self.client.post("/api/user/login/", {"username": "admin", "password": "pass"}, format="json")
+        self.assertEqual(r.status_code, 429)
+        self.assertIn("Retry-After", r)
+        auth.assert_not_called()
+
+    def login_status(self, username, ip, **extra):
+        return self.client.post(
+            "/api/user/login/", {"username": username, "password": "bad"}, format="json", REMOTE_ADDR=ip, **extra
+        ).status_code
+
+    @override_settings(THROTTLE_BUCKETS={"login": {"rate": "2/min", "keys": ["ip", "username"]}})
+    def test_rejected_login_does_not_spend_ip_bucket(self):
+        self.assertEqual([self.login_status("admin", "10.0.0.1") for _ in range(2)], [200, 200])
+        # username исчерпан; отказы по нему не тратят корзину второго IP
+        self.assertEqual([self.login_status("admin", "10.0.0.2") for _ in range(3)], [429, 429, 429])
+        self.assertEqual(self.login_status("other", "10.0.0.2"), 200)
+
+    @override_settings(THROTTLE_BUCKETS={"login": {"rate": "2/min", "keys": ["ip"]}})
+    def test_forwarded_for_does_not_change_ip(self):
+        statuses = [
+            self.login_status("admin", "10.0.0.1", HTTP_X_FORWARDED_FOR=f"192.0.2.{i}") for i in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    @override_settings(THROTTLE_BUCKETS={"export": {"rate": "1/min", "keys": ["user"]}})
+    def test_exports_are_throttled_per_user(self):
+        other = User.objects.create_user("other", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get("/api/categories/export-excel/").status_code, 200)
+        self.assertEqual(self.client.get("/api/menu/export-word/").status_code, 429)
+
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get("/api/menu/export-word/").status_code, 200)
+
+
+class CatalogueSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Напитки")
+        self.tea = Menu.objects.create(title="Чай", group=self.category, price=100)
+        self.coffee = Menu.objects.create(title="Кофе", group=self.category, price=150)
+
+    def test_snapshot_is_compact(self):
+        r = self.client.get("/api/catalogue/")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.data["full"])
+        self.assertEqual(r.data["seq"], ChangeLog.objects.order_by("-id").first().id)
+
+        menu = r.data["menu"]
+        self.assertEqual(menu["fields"][:4], ["id", "title", "group", "price"])
+        self.assertEqual(menu["rows"][0][:4], [self.tea.id, "Чай", self.category.id, "100.00"])
+        self.assertEqual(r.data["categories"]["rows"], [[self.category.id, "Напитки"]])
+
+    def test_delta_returns_only_changes(self):
+        seq = self.client.get("/api/catalogue/").data["seq"]
+
+        r = self.client.get("/api/catalogue/", {"since": seq})
+        self.assertFalse(r.data["full"])
+        self.assertEqual(r.data["seq"], seq)
+        self.assertEqual(r.data["menu"]["rows"], [])
+
+        self.tea.title = "Чай зелёный"
+        self.tea.save()
+        coffee_id = self.coffee.id
+        self.coffee.delete()
+        cake = Menu.objects.create(title="Торт", price=300)
+
+        r = self.client.get("/api/catalogue/", {"since": seq})
+        self.assertGreater(r.data["seq"], seq)
+        self.assertEqual([row[1] for row in r.data["menu"]["rows"]], ["Чай зелёный", "Торт"])
+        self.assertEqual(r.data["menu"]["deleted"], [coffee_id])
+        self.assertEqual(r.data["categories"]["rows"], [])
+        self.assertNotIn(cake.id, r.data["menu"]["deleted"])
+
+    def test_bad_since(self):
+        r = self.client.get("/api/catalogue/", {"since": "abc"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_snapshot_after_tombstones_expire(self):
+        old_seq = self.client.get("/api/catalogue/").data["seq"]
+        self.coffee.delete()
+        seq = self.client.get("/api/catalogue/").data["seq"]
+        ChangeLog.objects.filter(action="delete").update(created_at=timezone.now() - timedelta(days=60))
+        call_command("compact_changelog", "--tombstone-days", "30", stdout=io.StringIO())
+
+        # отставший клиент не увидел бы удаления — получает полный снимок
+        r = self.client.get("/api/catalogue/", {"since": old_seq})
+        self.assertTrue(r.data["full"])
+        self.assertEqual([row[1] for row in r.data["menu"]["rows"]], ["Чай"])
+
+        r = self.client.get("/api/catalogue/", {"since": seq})
+        self.assertFalse(r.data["full"])
+
+        r = self.client.get("/api/catalogue/", {"since": seq + 1000})
+        self.assertTrue(r.data["full"])
+
+
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("admin", password="pass", is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.customer = Customer.objects.create(name="Иван")
+
+    def log(self, model):
+        return list(
+            ChangeLog.objects.filter(model=model).order_by("id").values_list("object_id", "action")
+        )
+
+    def test_signals_and_bulk_operations_are_logged(self):
+        order = Order.objects.create(customer=self.customer)
+        Order.objects.filter(pk=order.pk).update(status="DONE")
+        items = OrderItem.objects.bulk_create([OrderItem(order=order, qty=q) for q in (1, 2)])
+        for item in items:
+            item.qty += 1
+        OrderItem.objects.bulk_update(items, ["qty"])
+        customer_pk = self.customer.pk
+        self.customer.delete()
+
+        self.assertEqual(self.log("order"), [(order.pk, "save")] * 3)
+        ids = [item.pk for item in items]
+        self.assertEqual(self.log("orderitem"), [(pk, "save") for pk in ids * 2])
+        self.assertEqual(self.log("customer"), [(customer_pk, "save"), (customer_pk, "delete")])
+
+    def test_feed_pages_by_seq(self):
+        orders = [Order.objects.create() for _ in range(3)]
+
+        r = self.client.get("/api/changes/", {"after": 0, "limit": 2})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([c["model"] for c in r.data["results"]], ["customer", "order"])
+        self.assertTrue(r.data["has_more"])
+
+        r = self.client.get("/api/changes/", {"after": r.data["after"], "model": "order"})
+        self.assertEqual([c["object_id"] for c in r.data["results"]], [o.pk for o in orders[1:]])
+        self.assertFalse(r.data["has_more"])
+
+    def test_feed_is_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user("cashier", password="pass"))
+        self.assertEqual(self.client.get("/api/changes/").status_code, 403)
+
+    def test_iter_changes_streams_in_batches(self):
+        for _ in range(5):
+            Order.objects.create()
+        seqs = [c.id for c in changelog.iter_changes(models=["order"], batch_size=2)]
+        self.assertEqual(len(seqs), 5)
+        self.assertEqual(seqs, sorted(seqs))
+
+    def test_expired_cursor_requires_resync(self):
+        after = self.client.get("/api/changes/").data["after"]
+        self.customer.delete()
+        ChangeLog.objects.filter(action="delete").update(created_at=timezone.now() - timedelta(days=60))
+        call_command("compact_changelog", "--tombstone-days", "30", stdout=io.StringIO())
+
+        r = self.client.get("/api/changes/", {"after": after})
+        self.assertEqual(r.status_code, 410)
+        self.assertTrue(r.data["resync"])
+        with self.assertRaises(changelog.CursorExpired):
+            list(changelog.iter_changes(after=after))
+
+        self.assertEqual(self.client.get("/api/changes/", {"after": r.data["seq"]}).status_code, 200)
+
+    def test_compaction_keeps_latest_entry(self):
+        self.customer.name = "Пётр"
+        self.customer.save()
+        order = Order.objects.create()
+        order_pk = order.pk
+        order.delete()
+
+        call_command("compact_changelog", stdout=io.StringIO())
+        self.assertEqual(self.log("customer"), [(self.customer.pk, "save")])
+        self.assertEqual(self.log("order"), [(order_pk, "delete")])
+
+        ChangeLog.objects.filter(action="delete").update(created_at=timezone.now() - timedelta(days=31))
+        call_command("compact_changelog", stdout=io.StringIO())
+        self.assertEqual(self.log("order"), [])
+
+
+class AdminQueryTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("root", password="pass")
+        self.client.force_login(self.admin)
+        self.customer = Customer.objects.create(name="Иван")
+        self.menus = [Menu.objects.create(title=f"Позиция {i}", price=10 * (i + 1)) for i in range(6)]
+        # первый запрос кладёт пользователя и сессию в кэш
+        self.client.get("/admin/")
+
+    def make_order(self, items):
+        order = Order.objects.create(user=self.admin, customer=self.customer)
+        for menu in self.menus[:items]:
+            OrderItem.objects.create(order=order, menu=menu, qty=2)
+        return order
+
+    def queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        self.make_order(2)
+        few = self.queries("/admin/menu/order/"), self.queries("/admin/menu/orderitem/")
+        for _ in range(5):
+            self.make_order(3)
+        many = self.queries("/admin/menu/order/"), self.queries("/admin/menu/orderitem/")
+        self.assertEqual(few, many)
+
+    def test_change_page_does_not_grow_with_items(self):
+        self.queries(f"/admin/menu/order/{self.make_order(1).pk}/change/")
+        few = self.queries(f"/admin/menu/order/{self.make_order(2).pk}/change/")
+        many = self.queries(f"/admin/menu/order/{self.make_order(6).pk}/change/")
+        self.assertEqual(few, many)
+
+    def test_total_column_and_id_search(self):
+        order = self.make_order(3)
+        self.make_order(1)
+        r = self.client.get("/admin/menu/order/", {"q": str(order.pk)})
+        self.assertEqual(list(r.context["cl"].result_list), [order])
+        self.assertEqual(r.context["cl"].result_list[0].total, 2 * (10 + 20 + 30))
+
+    def test_changelist_count_is_estimated_on_sqlite(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from menu.admin import EstimatedCountPaginator
+
+        self.menus[0].delete()
+        with mock.patch("menu.admin.ESTIMATE_THRESHOLD", 1), CaptureQueriesContext(connection) as ctx:
+            count = EstimatedCountPaginator(Menu.objects.order_by("id"), 100).count
+        self.assertEqual(count, 6)  # MAX(rowid): удалённая строка не вычтена
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        with mock.patch("menu.admin.ESTIMATE_THRESHOLD", 1):
+            self.assertEqual(EstimatedCountPaginator(Menu.objects.order_by("id"), 100).count, 5)
+        self.assertEqual(EstimatedCountPaginator(Menu.objects.order_by("id"), 100).count, 5)
+
+    def test_labelled_widget_ignores_invalid_values(self):
+        from django.contrib import admin as django_admin
+        from menu.admin import LabelledAutocompleteSelect
+
+        menu = self.menus[0]
+        db_field = OrderItem._meta.get_field("menu")
+        for labels in ({menu.pk: menu.title}, None):
+            widget = LabelledAutocompleteSelect(db_field, django_admin.site, labels=labels)
+            widget = db_field.formfield(widget=widget).widget
+            html = widget.render("menu", "abc")
+            self.assertNotIn("abc", html)
+            self.assertIn(menu.title, widget.render("menu", str(menu.pk)))
+
+
+class DocxExportTests(TestCase):
+    def setUp(self):
+        throttling.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin", password="pass", is_staff=True))
+
+    def open(self, url):
+        import docx
+
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        return docx.Document(io.BytesIO(b"".join(r.streaming_content)))
+
+    def test_order_items_export(self):
+        menu = Menu.objects.create(title="Чай", price=100)
+        order = Order.objects.create()
+        items = [OrderItem.objects.create(order=order, menu=menu, qty=q) for q in (1, 2, 3)]
+
+        doc = self.open("/api/order-items/export-word/")
+        self.assertEqual(doc.paragraphs[0].text, "Позиции заказов")
+        table = [[c.text for c in row.cells] for row in doc.tables[0].rows]
+        self.assertEqual(table[0], ["id", "order", "menu", "qty"])
+        self.assertEqual(table[1:], [[str(i.id), str(order.id), str(menu.id), str(i.qty)] for i in reversed(items)])
+
+    def test_text_is_escaped(self):
+        Customer.objects.create(name="<Ооо & \"Ромашка\">\x07", phone=None)
+        doc = self.open("/api/customers/export-word/")
+        self.assertEqual([c.text for c in doc.tables[0].rows[1].cells][1:], ["<Ооо & \"Ромашка\">", ""])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        throttling.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin", password="pass", is_staff=True))
+        self.menu = Menu.objects.create(title="Чай", price="120.50")
+        self.order = Order.objects.create()
+        OrderItem.objects.create(order=self.order, menu=self.menu, qty=2)
+
+    def csv_rows(self, url, params):
+        import csv
+
+        r = self.client.get(url, params)
+        self.assertEqual(r.status_code, 200)
+        text = b"".join(r.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(io.StringIO(text)))
+
+    def test_columns_shrink_projection(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            rows = self.csv_rows("/api/order-items/export/", {"type": "csv", "columns": "menu_title,line_total"})
+        self.assertEqual(rows, [["menu_title", "line_total"], ["Чай", "241.00"]])
+        select = ctx.captured_queries[-1]["sql"]
+        self.assertIn('"menu_menu"."title"', select)
+        self.assertNotIn('"menu_orderitem"."qty",', select)
+
+    def test_computed_order_total(self):
+        rows = self.csv_rows("/api/orders/export/", {"type": "csv", "columns": "id,items,total"})
+        self.assertEqual(rows[1], [str(self.order.id), "1", "241.00"])
+
+    def test_excel_keeps_default_columns(self):
+        from openpyxl import load_workbook
+
+        r = self.client.get("/api/menu/export-excel/")
+        ws = load_workbook(io.BytesIO(r.content)).active
+        self.assertEqual([c.value for c in ws[1]], ["id", "title", "group", "price", "description"])
+        self.assertEqual(ws[2][1].value, "Чай")
+
+    @mock.patch.object(columnar, "pyarrow", None)
+    def test_columnar(self):
+        import numpy
+
+        r = self.client.get("/api/order-items/export/", {"type": "columnar"})
+        self.assertEqual(r.status_code, 200)
+        data = numpy.load(io.BytesIO(b"".join(r.streaming_content)))
+        self.assertEqual(data["qty"].dtype, numpy.int32)
+        self.assertEqual(data["qty"].tolist(), [2])
+        self.assertEqual(data["customer_id"].tolist(), [-1])  # тот же null, что в /export-analytics/
+
+        self.assertEqual(self.client.get("/api/menu/export/", {"type": "columnar"}).status_code, 400)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/menu/export/", {"type": "pdf"}).status_code, 400)
+        r = self.client.get("/api/menu/export/", {"columns": "id,secret"})
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("secret", r.data["detail"])
+
+
+class ColumnarExportTests(TestCase):
+    def setUp(self):
+        throttling.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin", password="pass", is_staff=True))
+        customer = Customer.objects.create(name="Иван")
+        self.menu = Menu.objects.create(title="Чай", price="0.29")
+        self.order = Order.objects.create(customer=customer, status="DONE")
+        self.items = [OrderItem.objects.create(order=self.order, menu=self.menu, qty=q) for q in (1, 3)]
+        self.items.append(OrderItem.objects.create(order=Order.objects.create(), menu=None, qty=2))
+
+    def test_npz_has_typed_columns(self):
+        import json
+        import numpy
+
+        r = self.client.get("/api/order-items/export-analytics/", {"type": "npz"})
+        self.assertEqual(r.status_code, 200)
+        data = numpy.load(io.BytesIO(b"".join(r.streaming_content)))
+
+        self.assertEqual(data["id"].dtype, numpy.int64)
+        self.assertEqual(data["id"].tolist(), [i.id for i in self.items])
+        # 0.29 * 100 в float даёт 28.999..., поэтому в SQL округление, а не усечение
+        self.assertEqual(data["price_cents"].tolist(), [29, 29, 0])
+        self.assertEqual(data["line_total_cents"].tolist(), [29, 87, 0])
+        self.assertEqual(data["menu_id"].tolist(), [self.menu.id, self.menu.id, -1])
+        self.assertEqual(data["customer_id"][-1], -1)
+        self.assertEqual(data["created_at"].dtype, numpy.dtype("datetime64[us]"))
+
+        meta = json.loads(str(data["_meta"]))
+        self.assertEqual([meta["status_codes"][s] for s in data["status"]], ["DONE", "DONE", "NEW"])
+
+    def test_chunks_cover_all_rows(self):
+        chunks = list(columnar.iter_chunks(OrderItem.objects.all(), chunk_size=2))
+        self.assertEqual([len(c["id"]) for c in chunks], [2, 1])
+
+    def test_unknown_type(self):
+        r = self.client.get("/api/order-items/export-analytics/", {"type": "xlsx"})
+        self.assertEqual(r.status_code, 400)
+
+
+@override_settings(REPORTS_REFRESH_SECONDS=0)
+class ReportsTests(TestCase):
+    def setUp(self):
+        reports.reset()
+        self.addCleanup(reports.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin", password="pass", is_staff=True))
+
+        self.tea = Menu.objects.create(title="Чай", price=100)
+        self.cake = Menu.objects.create(title="Торт", price=250)
+        self.ivan = Customer.objects.create(name="Иван")
+        self.olga = Customer.objects.create(name="Ольга")
+
+        self.o1 = self.order(self.ivan, "2026-03-01 09:15", [(self.tea, 2), (self.cake, 1)])
+        self.o2 = self.order(self.olga, "2026-03-01 09:40", [(self.tea, 1)])
+        self.o3 = self.order(self.ivan, "2026-03-01 23:30", [(self.cake, 2)])
+        self.order(self.olga, "2026-03-01 10:00", [(self.cake, 5)], status="CANCELLED")
+
+    def order(self, customer, local_time, lines, status="DONE"):
+        from datetime import datetime
+
+        order = Order.objects.create(customer=customer, status=status)
+        created = timezone.make_aware(datetime.fromisoformat(local_time))
+        Order.objects.filter(pk=order.pk).update(created_at=created)
+        for menu, qty in lines:
+            OrderItem.objects.create(order=order, menu=menu, qty=qty)
+        return order
+
+    def get(self, name, **params):
+        r = self.client.get(f"/api/reports/{name}/", params)
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.data
+
+    def test_revenue_by_hour_uses_local_time(self):
+        rows = self.get("revenue-by-hour")
+        self.assertEqual(
+            [(r["bucket"], r["menu"], r["qty"], r["revenue"]) for r in rows],
+            [
+                ("2026-03-01T09:00:00", self.tea.id, 3, 300.0),
+                ("2026-03-01T09:00:00", self.cake.id, 1, 250.0),
+                ("2026-03-01T23:00:00", self.cake.id, 2, 500.0),
+            ],
+        )
+        days = self.get("revenue-by-hour", bucket="day", menu=self.cake.id)
+        self.assertEqual([(r["bucket"], r["revenue"]) for r in days], [("2026-03-01T00:00:00", 750.0)])
+
+    def test_customer_spend_and_baskets(self):
+        spend = self.get("customer-spend")
+        self.assertEqual(spend["top"][0], {"customer": self.ivan.id, "orders": 2, "spend": 950.0})
+        self.assertEqual(spend["top"][1]["spend"], 100.0)
+
+        baskets = self.get("basket-sizes")
+        self.assertEqual(baskets["orders"], 3)
+        self.assertEqual(baskets["histogram"], [{"qty": 1, "orders": 1}, {"qty": 2, "orders": 1}, {"qty": 3, "orders": 1}])
+
+        cancelled = self.get("summary", status="CANCELLED")
+        self.assertEqual((cancelled["orders"], cancelled["revenue"]), (1, 1250.0))
+
+    def test_incremental_refresh(self):
+        self.assertEqual(self.get("summary")["revenue"], 1050.0)
+        first = reports.get_snapshot()
+
+        self.o2.status = "CANCELLED"
+        self.o2.save()
+        self.tea.price = 200
+        self.tea.save()
+        self.order(self.olga, "2026-03-02 12:00", [(self.tea, 1)])
+
+        data = self.get("summary")
+        self.assertEqual((data["orders"], data["revenue"]), (3, 400 + 250 + 500 + 200))
+        self.assertGreater(reports.get_snapshot().watermark, first.watermark)
+
+    def test_refresh_matches_full_build(self):
+        before = reports.build_snapshot()
+
+        self.o1.delete()  # позиции удаляются каскадом
+        item = self.o2.items.get()
+        item.order, item.menu = self.o3, self.cake
+        item.save()
+        self.tea.price = 200
+        self.tea.save()
+        self.order(self.olga, "2026-03-02 12:00", [(self.tea, 1)])
+
+        with mock.patch.object(reports, "FULL_RELOAD_RATIO", 100):
+            refreshed = reports.refresh_snapshot(before)
+        built = reports.build_snapshot()
+        self.assertEqual(len(refreshed), len(built))
+        a, b = refreshed["id"].argsort(), built["id"].argsort()
+        for name in reports.COLUMNS:
+            self.assertEqual(refreshed[name][a].tolist(), built[name][b].tolist(), name)
+
+    def test_date_filter_and_validation(self):
+        self.assertEqual(self.get("summary", date_from="2026-03-02")["orders"], 0)
+        self.assertEqual(self.client.get("/api/reports/summary/", {"status": "LOST"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/summary/", {"date_to": "2026-02-30"}).status_code, 400)
+
+    def test_missing_numpy_is_unavailable(self):
+        with mock.patch.object(reports, "numpy", None):
+            r = self.client.get("/api/reports/summary/")
+        self.assertEqual(r.status_code, 503)
+
+
+class CooccurrenceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("cashier", password="pass"))
+        self.tea, self.cake, self.bun, self.soup = [
+            Menu.objects.create(title=t, price=100) for t in ("Чай", "Торт", "Булка", "Суп")
+        ]
+
+    def order(self, *menus):
+        order = Order.objects.create()
+        items = [OrderItem.objects.create(order=order, menu=m) for m in menus]
+        return order, items
+
+    def matrix(self):
+        return {(p.menu_id, p.other_id): p.count for p in MenuPair.objects.filter(count__gt=0)}
+
+    def test_incremental_matches_rebuild(self):
+        self.order(self.tea, self.cake)
+        self.order(self.tea, self.cake, self.tea)
+        order, items = self.order(self.tea, self.bun, self.soup)
+        self.order(self.soup)
+
+        items[1].menu = self.cake
+        items[1].save()
+        items[2].delete()
+        order2, _ = self.order(self.bun, self.soup)
+        order2.delete()
+
+        incremental = self.matrix()
+        cooccurrence.rebuild(batch_size=2)
+        self.assertEqual(incremental, self.matrix())
+        self.assertEqual(incremental[(self.tea.id, self.cake.id)], 3)
+        self.assertEqual(incremental[(self.tea.id, self.tea.id)], 3)
+
+    def test_rolled_back_order_delete_does_not_mute_item_signals(self):
+        from django.db import transaction
+        from django.db.models.signals import pre_delete
+
+        order, items = self.order(self.tea, self.cake)
+
+        def fail(sender, **kwargs):
+            raise RuntimeError("сбой посреди удаления")
+
+        pre_delete.connect(fail, sender=Order)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                order.delete()
+        finally:
+            pre_delete.disconnect(fail, sender=Order)
+
+        items[1].delete()
+        self.assertEqual(self.matrix(), {(self.tea.id, self.tea.id): 1})
+
+    def test_related_action(self):
+        self.order(self.tea, self.cake)
+        self.order(self.tea, self.cake, self.bun)
+        self.order(self.tea, self.bun)
+        self.order(self.tea, self.soup, self.cake)
+
+        r = self.client.get(f"/api/menu/{self.tea.id}/related/", {"limit": 2})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(
+            [(x["title"], x["orders"], x["confidence"]) for x in r.data],
+            [("Торт", 3, 0.75), ("Булка", 2, 0.5)],
+        )
+        self.assertEqual(self.client.get("/api/menu/999999/related/").status_code, 404)
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("boss", password="pass"))
+        self.tea, self.cake, self.bun = [
+            Menu.objects.create(title=t, price=p) for t, p in (("Чай", 50), ("Торт", 200), ("Булка", 30))
+        ]
+        self.ann, self.bob = [Customer.objects.create(name=n, phone=f"+7900000000{i}") for i, n in enumerate(("Анна", "Боб"))]
+
+    def order(self, customer, *lines, status="DONE"):
+        order = Order.objects.create(customer=customer)
+        for menu, qty in lines:
+            OrderItem.objects.create(order=order, menu=menu, qty=qty)
+        order.status = status
+        order.save()
+        return order
+
+    def counts(self):
+        return {
+            (c.kind, c.period, c.start, c.key): (c.qty, c.revenue, c.orders)
+            for c in SalesCounter.objects.exclude(qty=0, orders=0)
+        }
+
+    def test_incremental_matches_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order(self.ann, (self.tea, 2), (self.cake, 1))
+            self.order(self.bob, (self.tea, 1))
+            cancelled = self.order(self.ann, (self.bun, 5))
+            cancelled.status = "CANCELLED"
+            cancelled.save()
+            self.order(self.bob, (self.cake, 3), status="NEW")
+
+            done = self.order(self.bob, (self.bun, 1), (self.cake, 1))
+            item = done.items.get(menu=self.bun)
+            item.qty = 4
+            item.save()
+            done.items.get(menu=self.cake).delete()
+            OrderItem.objects.create(order=done, menu=self.tea, qty=1)
+            done.customer = self.ann
+            done.save()
+
+            self.order(self.bob, (self.cake, 2)).delete()
+
+        incremental = self.counts()
+        counters.rebuild()
+        self.assertEqual(incremental, self.counts())
+
+        today = timezone.localdate()
+        self.assertEqual(incremental[("menu", "day", today, self.tea.id)], (4, 200, 0))
+        self.assertEqual(incremental[("customer", "day", today, self.ann.id)], (8, 470, 2))
+        # незавершённый и удалённый заказы не считаются
+        self.assertEqual(incremental[("menu", "week", today - timedelta(days=today.weekday()), self.cake.id)], (1, 200, 0))
+
+    def test_item_moves_between_menus_and_orders(self):
+        first = self.order(self.ann, (self.tea, 2))
+        second = self.order(self.bob, (self.bun, 1))
+
+        item = first.items.get()
+        item.menu = self.cake
+        item.save()
+        item.order = second
+        item.save()
+
+        incremental = self.counts()
+        counters.rebuild()
+        self.assertEqual(incremental, self.counts())
+
+        today = timezone.localdate()
+        self.assertEqual(incremental[("menu", "day", today, self.cake.id)], (2, 400, 0))
+        self.assertNotIn(("menu", "day", today, self.tea.id), incremental)
+        self.assertEqual(incremental[("customer", "day", today, self.bob.id)], (3, 430, 1))
+        self.assertEqual(incremental[("customer", "day", today, self.ann.id)], (0, 0, 1))
+
+    def test_top_actions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order(self.ann, (self.tea, 3), (self.cake, 1))
+            self.order(self.bob, (self.cake, 2))
+
+        r = self.client.get("/api/reports/top-items/", {"limit": 2})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([(x["title"], x["qty"]) for x in r.data["results"]], [("Чай", 3), ("Торт", 3)])
+
+        # кэшированный топ обновляется на месте, без перечитывания
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order(self.ann, (self.bun, 10))
+        with self.assertNumQueries(1):  # только названия позиций
+            r = self.client.get("/api/reports/top-items/", {"limit": 1})
+        self.assertEqual(r.data["results"][0]["title"], "Булка")
+
+        r = self.client.get("/api/reports/top-customers/", {"period": "week"})
+        self.assertEqual(
+            [(x["name"], x["orders"], x["spend"]) for x in r.data["results"]],
+            [("Анна", 2, "650.00"), ("Боб", 1, "400.00")],
+        )
+
+        self.assertEqual(self.client.get("/api/reports/top-items/", {"period": "month"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/top-items/", {"date": "2026-02-30"}).status_code, 400)
+        self.client.force_authenticate(User.objects.create_user("cashier", password="pass"))
+        self.assertEqual(self.client.get("/api/reports/top-items/").status_code, 403)
+
+
+class OrderTimelineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("boss", password="pass"))
+        self.tea = Menu.objects.create(title="Чай", price=50)
+
+    def order(self, utc, qty=0):
+        order = Order.objects.create()
+        if qty:
+            OrderItem.objects.create(order=order, menu=self.tea, qty=qty)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.datetime.fromisoformat(utc))
+        return order
+
+    def test_created_range(self):
+        early = self.order("2024-05-01T15:00:00+00:00")  # 23:00 по Иркутску, 1 мая
+        late = self.order("2024-05-01T16:30:00+00:00")  # 00:30 по Иркутску, уже 2 мая
+
+        ids = lambda params: {o["id"] for o in self.client.get("/api/orders/", params).data}
+        self.assertEqual(ids({"created_to": "2024-05-01"}), {early.id})
+        self.assertEqual(ids({"created_from": "2024-05-02"}), {late.id})
+        self.assertEqual(ids({"created_from": "2024-05-01T15:00:00Z", "created_to": "2024-05-01T16:00:00Z"}), {early.id})
+        for value in ("вчера", "2024-02-30", "2024-13-01T00:00"):
+            self.assertEqual(self.client.get("/api/orders/", {"created_from": value}).status_code, 400)
+            self.assertEqual(self.client.get("/api/orders/timeline/", {"created_to": value}).status_code, 400)
+
+    def test_timeline_local_buckets(self):
+        self.order("2024-05-01T15:00:00+00:00", qty=2)
+        self.order("2024-05-01T16:30:00+00:00", qty=1)
+        self.order("2024-05-01T17:00:00+00:00")
+        self.order("2024-05-05T17:00:00+00:00", qty=4)  # понедельник 6 мая по Иркутску
+
+        with self.assertNumQueries(1):
+            r = self.client.get("/api/orders/timeline/", {"bucket": "day"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data, [
+            {"bucket": "2024-05-01T00:00:00+08:00", "orders": 1, "revenue": "100.00"},
+            {"bucket": "2024-05-02T00:00:00+08:00", "orders": 2, "revenue": "50.00"},
+            {"bucket": "2024-05-06T00:00:00+08:00", "orders": 1, "revenue": "200.00"},
+        ])
+
+        r = self.client.get("/api/orders/timeline/", {"bucket": "week", "created_to": "2024-05-05"})
+        self.assertEqual(r.data, [{"bucket": "2024-04-29T00:00:00+08:00", "orders": 3, "revenue": "150.00"}])
+
+        r = self.client.get("/api/orders/timeline/", {"bucket": "hour", "created_from": "2024-05-02", "created_to": "2024-05-02"})
+        self.assertEqual([x["bucket"] for x in r.data], ["2024-05-02T00:00:00+08:00", "2024-05-02T01:00:00+08:00"])
+        self.assertEqual(self.client.get("/api/orders/timeline/", {"bucket": "month"}).status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("boss", password="pass"))
+        self.tea, self.cake = Menu.objects.create(title="Чай", price=50), Menu.objects.create(title="Торт", price=200)
+
+    def order(self, status, days_ago, *menus):
+        order = Order.objects.create()
+        for menu in menus:
+            OrderItem.objects.create(order=order, menu=menu, qty=2)
+        order.status = status
+        order.save()
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_archive_keeps_rollups(self):
+        old = self.order("DONE", 400, self.tea, self.cake)
+        cancelled = self.order("CANCELLED", 500, self.tea)
+        active = self.order("NEW", 500, self.cake)
+        recent = self.order("DONE", 10, self.tea)
+
+        counts = list(SalesCounter.objects.order_by("id").values_list("qty", "revenue", "orders"))
+        pairs = list(MenuPair.objects.order_by("id").values_list("count", flat=True))
+
+        call_command("archive_orders", "--days", "365", "--batch", "1", stdout=io.StringIO())
+
+        self.assertEqual(set(Order.objects.values_list("id", flat=True)), {active.id, recent.id})
+        self.assertEqual(set(ArchivedOrder.objects.values_list("id", flat=True)), {old.id, cancelled.id})
+        self.assertEqual(ArchivedOrderItem.objects.filter(order_id=old.id).count(), 2)
+        self.assertEqual(list(SalesCounter.objects.order_by("id").values_list("qty", "revenue", "orders")), counts)
+        self.assertEqual(list(MenuPair.objects.order_by("id").values_list("count", flat=True)), pairs)
+        self.assertTrue(ChangeLog.objects.filter(model="order", object_id=old.id, action="delete").exists())
+
+    def test_rebuild_counts_archived_orders(self):
+        self.order("DONE", 400, self.tea, self.cake)
+        self.order("DONE", 10, self.tea)
+        counters.rebuild()  # created_at сдвинут в обход сигналов
+        cooccurrence.rebuild()
+        counts = set(SalesCounter.objects.values_list("kind", "key", "period", "start", "qty", "revenue", "orders"))
+        pairs = set(MenuPair.objects.values_list("menu_id", "other_id", "count"))
+
+        call_command("archive_orders", "--days", "365", stdout=io.StringIO())
+        counters.rebuild()
+        cooccurrence.rebuild()
+        self.assertEqual(set(SalesCounter.objects.values_list("kind", "key", "period", "start", "qty", "revenue", "orders")), counts)
+        self.assertEqual(set(MenuPair.objects.values_list("menu_id", "other_id", "count")), pairs)
+
+    def test_include_archived(self):
+        old = self.order("DONE", 400, self.tea, self.cake)
+        recent = self.order("DONE", 10, self.tea)
+        call_command("archive_orders", "--days", "365", stdout=io.StringIO())
+
+        ids = lambda url, params: [o["id"] for o in self.client.get(url, params).data]
+        self.assertEqual(ids("/api/orders/", {}), [recent.id])
+        with self.assertNumQueries(2):  # без флага архив не читается
+            self.client.get("/api/orders/", {"status": "DONE"})
+        self.assertEqual(ids("/api/orders/", {"include_archived": 1}), [recent.id, old.id])
+        self.assertEqual(ids("/api/orders/", {"include_archived": 1, "created_to": str(timezone.localdate() - timedelta(days=100))}), [old.id])
+        self.assertEqual(len(ids("/api/order-items/", {"include_archived": 1, "order": old.id})), 2)
+
+        self.assertEqual(self.client.get(f"/api/orders/{old.id}/").status_code, 404)
+        r = self.client.get(f"/api/orders/{old.id}/", {"include_archived": 1})
+        self.assertEqual((r.status_code, r.data["total_price"]), (200, 500.0))
+
+        for url in ("/api/orders/stats/", "/api/orders/timeline/", "/api/order-items/export/"):
+            self.assertEqual(self.client.get(url, {"include_archived": 1}).status_code, 400, url)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("boss", password="pass"))
+        self.drinks = Category.objects.create(name="Напитки")
+
+    def upload(self, url, name, content, **params):
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        return self.client.post(url, {"file": SimpleUploadedFile(name, content)}, format="multipart")
+
+    def test_csv_upsert(self):
+        tea = Menu.objects.create(title="Чай", price=50)
+        content = (
+            "id,title,group,price\n"
+            f"{tea.id},Чай чёрный,{self.drinks.id},60.50\n"
+            ",Кофе,,120\n"
+            "\n"
+            ",Морс,,80\n"
+        ).encode()
+
+        r = self.upload("/api/menu/import/", "menu.csv", content)
+        self.assertEqual(r.status_code, 200, r.data)
+        self.assertEqual((r.data["created"], r.data["updated"]), (2, 1))
+        tea.refresh_from_db()
+        self.assertEqual((tea.title, tea.group_id, str(tea.price), tea.version), ("Чай чёрный", self.drinks.id, "60.50", 2))
+        self.assertEqual(set(Menu.objects.values_list("title", flat=True)), {"Чай чёрный", "Кофе", "Морс"})
+        self.assertEqual(ChangeLog.objects.filter(model="menu").count(), 4)
+
+    def test_errors_roll_back(self):
+        content = (
+            "title,price,group\n"
+            "Кофе,120,\n"
+            ",100,\n"
+            "Торт,дорого,999999\n"
+        ).encode()
+        r = self.upload("/api/menu/import/", "menu.csv", content)
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.data["error_count"], 2)
+        self.assertEqual([e["row"] for e in r.data["errors"]], [3, 4])
+        self.assertEqual(set(r.data["errors"][1]["errors"]), {"price", "group"})
+        self.assertFalse(Menu.objects.exists())
+
+        r = self.upload("/api/menu/import/", "menu.csv", "title,colour\nКофе,red\n".encode())
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("colour", r.data["detail"])
+
+        r = self.upload("/api/menu/import/", "menu.csv", "id,title\n999999,Кофе\n".encode())
+        self.assertEqual(r.data["errors"], [{"row": 2, "errors": {"id": ["Нет записи с id 999999"]}}])
+
+    def test_xlsx_customers(self):
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["name", "phone", "email"])
+        ws.append(["Анна", 79001234567, "anna@example.com"])
+        ws.append(["Боб", None, None])
+        buf = io.BytesIO()
+        wb.save(buf)
+
+        r = self.upload("/api/customers/import/", "customers.xlsx", buf.getvalue(), dry_run=1)
+        self.assertEqual((r.status_code, r.data["created"], r.data["dry_run"]), (200, 2, True))
+        self.assertFalse(Customer.objects.exists())
+
+        r = self.upload("/api/customers/import/", "customers.xlsx", buf.getvalue())
+        self.assertEqual(r.data["created"], 2)
+        self.assertEqual(Customer.objects.get(name="Анна").phone, "79001234567")
+        self.assertIsNone(Customer.objects.get(name="Боб").email)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user("cashier", password="pass"))
+        r = self.upload("/api/menu/import/", "menu.csv", "title\nКофе\n".encode())
+        self.assertEqual(r.status_code, 403)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("cashier", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tea = Menu.objects.create(title="Чай", price=50)
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_returns_original(self):
+        first = self.post("/api/orders/", {"status": "NEW"}, "k-1")
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):
+            retry = self.post("/api/orders/", {"status": "NEW"}, "k-1")
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+        order = first.data["id"]
+        item = self.post("/api/order-items/", {"order": order, "menu": self.tea.id, "qty": 2}, "k-1")
+        self.assertEqual(item.status_code, 201)  # другой ресурс — другой ключ
+        self.post("/api/order-items/", {"order": order, "menu": self.tea.id, "qty": 2}, "k-1")
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+        conflict = self.post("/api/orders/", {"status": "DONE"}, "k-1")
+        self.assertEqual(conflict.status_code, 422)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user("other", password="pass"))
+        r = other.post("/api/orders/", {"status": "NEW"}, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(r.status_code, 201)
+        self.assertNotEqual(r.data["id"], order)
+
+    def test_errors_release_key_and_expiry(self):
+        bad = self.post("/api/orders/", {"status": "LOST"}, "k-2")
+        self.assertEqual(bad.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post("/api/orders/", {"status": "NEW"}, "k-2").status_code, 201)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.post("/api/orders/", {"status": "NEW"}, "k-2").status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = io.StringIO()
+        call_command("cleanup_idempotency_keys", stdout=out)
+        self.assertIn("1", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
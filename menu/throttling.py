@@ -0,0 +1,170 @@
+"""
+Ограничение частоты запросов по алгоритму token bucket.
+
+Корзины настраиваются в THROTTLE_BUCKETS по имени (scope), хранятся в памяти
+процесса или, при THROTTLE_BACKEND = "cache", в общем кэше Django.
+Проверка идёт в DRF до вызова action, то есть раньше хэширования пароля
+и запросов к БД.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600,
+    "d": 86400, "day": 86400,
+}
+
+
+def parse_rate(rate):
+    """"10/min" -> (10, 60)"""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period.strip().lower()]
+
+
+def refill(tokens, updated, now, capacity, per_second):
+    return min(capacity, tokens + (now - updated) * per_second)
+
+
+class MemoryBucketStore:
+    """Корзины в памяти процесса; самые старые вытесняются при max_keys."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def consume(self, key, capacity, per_second, cost=1, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = refill(tokens, updated, now, capacity, per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        wait = 0 if allowed else (cost - tokens) / per_second
+        return allowed, wait
+
+    def refund(self, key, capacity, per_second, cost=1):
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated = self.buckets[key]
+                self.buckets[key] = (min(capacity, tokens + cost), updated)
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Корзины в общем кэше (Redis/Memcached) — общий лимит для всех узлов.
+    Чтение и запись не атомарны, поэтому при гонке лимит может слегка
+    превыситься; для защиты от перебора этого достаточно.
+    """
+
+    prefix = "throttle:"
+
+    def consume(self, key, capacity, per_second, cost=1, now=None):
+        now = time.time() if now is None else now
+        cache_key = self.prefix + key
+        tokens, updated = cache.get(cache_key) or (capacity, now)
+        tokens = refill(tokens, updated, now, capacity, per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        # корзина полностью наполнится за capacity / per_second — дольше хранить незачем
+        cache.set(cache_key, (tokens, now), timeout=int(capacity / per_second) + 1)
+        wait = 0 if allowed else (cost - tokens) / per_second
+        return allowed, wait
+
+    def refund(self, key, capacity, per_second, cost=1):
+        cache_key = self.prefix + key
+        bucket = cache.get(cache_key)
+        if bucket is not None:
+            tokens, updated = bucket
+            cache.set(cache_key, (min(capacity, tokens + cost), updated), timeout=int(capacity / per_second) + 1)
+
+    def reset(self):
+        pass
+
+
+memory_store = MemoryBucketStore()
+cache_store = CacheBucketStore()
+
+
+def get_store():
+    return cache_store if settings.THROTTLE_BACKEND == "cache" else memory_store
+
+
+def reset():
+    memory_store.reset()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_idents(self, request, keys):
+        for key in keys:
+            if key == "user":
+                if request.user and request.user.is_authenticated:
+                    yield f"user:{request.user.pk}"
+                else:
+                    yield f"ip:{self.get_ident(request)}"
+            elif key == "ip":
+                yield f"ip:{self.get_ident(request)}"
+            elif key == "username":
+                username = request.data.get("username") if hasattr(request, "data") else None
+                if username:
+                    yield f"username:{str(username).strip().lower()[:150]}"
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        conf = settings.THROTTLE_BUCKETS.get(self.scope)
+        if not conf:
+            return True
+
+        count, period = parse_rate(conf["rate"])
+        capacity = conf.get("burst", count)
+        per_second = count / period
+        keys = conf.get("keys", ["ip"])
+
+        store = get_store()
+        taken = []
+        for ident in self.get_idents(request, keys):
+            key = f"{self.scope}:{ident}"
+            allowed, wait = store.consume(key, capacity, per_second)
+            if not allowed:
+                # отклонённый запрос не должен тратить и остальные корзины:
+                # иначе один упёршийся username выедает лимит всего IP
+                for key in taken:
+                    store.refund(key, capacity, per_second)
+                self.wait_seconds = wait
+                return False
+            taken.append(key)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = "login"
+
+
+class SecondFactorThrottle(TokenBucketThrottle):
+    scope = "totp"
+
+
+class ExportThrottle(TokenBucketThrottle):
+    scope = "export"
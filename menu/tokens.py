@@ -0,0 +1,106 @@
+"""
+Подписанные токены без состояния (JWT, HS256). Любой узел проверяет
+access-токен одним HMAC — без БД, сессий и кэша.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(signing_input):
+    key = settings.TOKEN_SECRET_KEY.encode()
+    return hmac.new(key, signing_input, hashlib.sha256).digest()
+
+
+def _json_object(part):
+    obj = json.loads(_b64decode(part))
+    if not isinstance(obj, dict):
+        raise TokenError("Неверный формат токена")
+    return obj
+
+
+def encode(payload):
+    header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    signing_input = f"{header}.{body}".encode("ascii")
+    return f"{header}.{body}.{_b64encode(_sign(signing_input))}"
+
+
+def decode(token, typ=None):
+    try:
+        header, body, signature = token.split(".")
+        signing_input = f"{header}.{body}".encode("ascii")
+        header = _json_object(header)
+        if header.get("alg") != "HS256":
+            raise TokenError("Неподдерживаемый алгоритм токена")
+        if not hmac.compare_digest(_b64decode(signature), _sign(signing_input)):
+            raise TokenError("Неверная подпись токена")
+        payload = _json_object(body)
+    except TokenError:
+        raise
+    except (ValueError, UnicodeError):
+        raise TokenError("Неверный формат токена")
+
+    exp = payload.get("exp", 0)
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        raise TokenError("Срок действия токена истёк")
+    if typ is not None and payload.get("typ") != typ:
+        raise TokenError("Неверный тип токена")
+    return payload
+
+
+def issue_tokens(user, context, second_until=None):
+    """
+    Пара access/refresh. В access лежит всё, что нужно правам доступа:
+    is_staff, роль и срок 2FA (second_until) вместо request.session["second"].
+    """
+    now = int(time.time())
+    access = {
+        "typ": "access",
+        "sub": user.pk,
+        "username": user.get_username(),
+        "is_staff": user.is_staff,
+        "role": context["role"],
+        "has_otp": context["has_otp"],
+        "iat": now,
+        "exp": now + settings.TOKEN_ACCESS_TTL,
+    }
+    refresh = {
+        "typ": "refresh",
+        "sub": user.pk,
+        "iat": now,
+        "exp": now + settings.TOKEN_REFRESH_TTL,
+    }
+    if second_until and second_until > now:
+        access["second_until"] = second_until
+        refresh["second_until"] = second_until
+
+    return {
+        "access": encode(access),
+        "refresh": encode(refresh),
+        "expires_in": settings.TOKEN_ACCESS_TTL,
+    }
+
+
+def token_claims(request):
+    """Claims access-токена, если запрос аутентифицирован токеном."""
+    auth = getattr(request, "auth", None)
+    if isinstance(auth, dict) and auth.get("typ") == "access":
+        return auth
+    return None
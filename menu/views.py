@@ -1,5 +1,54 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
 from django.views.generic import TemplateView
+
 from .models import Category, Menu, Customer, Order, OrderItem
+from .table_versions import get_table_versions
+
+
+class LazyPage:
+    """
+    Страница без COUNT(*): берём на одну строку больше, чтобы узнать,
+    есть ли следующая. Запрос выполняется только при обращении из шаблона,
+    то есть только если фрагмент не нашёлся в кэше.
+    """
+
+    def __init__(self, queryset, number, per_page):
+        self.queryset = queryset
+        self.number = number
+        self.per_page = per_page
+
+    @cached_property
+    def _rows(self):
+        offset = (self.number - 1) * self.per_page
+        return list(self.queryset[offset:offset + self.per_page + 1])
+
+    @property
+    def object_list(self):
+        return self._rows[:self.per_page]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return len(self._rows) > self.per_page
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def page_number(request, name):
+    try:
+        return max(1, int(request.GET.get(name, 1)))
+    except (TypeError, ValueError):
+        return 1
 
 
 class ShowCafeView(TemplateView):
@@ -7,9 +56,26 @@ class ShowCafeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["categories"] = Category.objects.all()
-        context["menu_items"] = Menu.objects.all().select_related("group")
-        context["customers"] = Customer.objects.all()
-        context["orders"] = Order.objects.all().select_related("user", "customer")
-        context["orderitems"] = OrderItem.objects.all().select_related("order", "menu")
+        limit = settings.SHOW_CAFE_SECTION_LIMIT
+        per_page = settings.SHOW_CAFE_PAGE_SIZE
+
+        context["versions"] = get_table_versions(
+            Category, Menu, Customer, Order, OrderItem, get_user_model()
+        )
+        context["cache_timeout"] = settings.SHOW_CAFE_CACHE_TIMEOUT
+        context["section_limit"] = limit
+
+        context["categories"] = Category.objects.order_by("id")[:limit]
+        context["menu_items"] = Menu.objects.select_related("group").order_by("id")[:limit]
+        context["customers"] = Customer.objects.order_by("-id")[:limit]
+        context["orders"] = LazyPage(
+            Order.objects.select_related("user", "customer").order_by("-id"),
+            page_number(self.request, "orders_page"),
+            per_page,
+        )
+        context["orderitems"] = LazyPage(
+            OrderItem.objects.select_related("order", "menu").order_by("-id"),
+            page_number(self.request, "items_page"),
+            per_page,
+        )
         return context